@@ -0,0 +1,120 @@
+import os
+import sys
+import asyncio
+import argparse
+import pytz
+from datetime import datetime, timedelta
+from pymongo import ReplaceOne, DeleteOne
+from starlette.concurrency import run_in_threadpool
+from api.db import get_collection, get_lead_collection, get_archive_collection, DEPARTMENTS, ARCHIVE_STATE_COLLECTION
+from api.shift_totals import TZ_KARACHI, SHIFT_START_HOUR, TOTALS_COLLECTION, shift_start_for, finalize_closed_shifts
+
+# ==========================================
+# HOT / COLD LEAD TIERS (ARCHIVAL)
+# ==========================================
+# Leads older than ARCHIVE_AFTER_SHIFTS shifts move from the department
+# collection (hot: tables, stats, search, manager sync) to
+# "<collection>_archive" (cold), so the hot working set stops growing with
+# the history. A shift is only archived once its rollup is finalized; the
+# rollups themselves stay, so history totals never need the archive.
+#
+# Reads that can reach back that far include the cold tier only when needed:
+#   get-lead         by id / row_index: archive when the hot tier has no match;
+#                    recent pages: continue into the archive past the last hot row
+#   export           when `start` is before the department's archived_before mark
+#   shift_totals     compute_from_leads (finalize / reconcile / rebuild), same rule
+# Archived leads are read-only: status updates, edits and deletes see hot leads only.
+#
+# Moves are copy-then-delete, and a hot lead is deleted only if it was not
+# edited since it was copied, so a crash or a concurrent edit leaves it hot for
+# the next run. The archived_before mark is raised before anything moves, so a
+# reader never misses a lead in flight.
+#
+# With ARCHIVE_AFTER_SHIFTS set, the app archives every ARCHIVE_INTERVAL_HOURS;
+# otherwise run `python -m api.archive run --shifts 90` (or `--dry-run`).
+
+ARCHIVE_AFTER_SHIFTS = int(os.getenv("ARCHIVE_AFTER_SHIFTS", "0"))
+ARCHIVE_INTERVAL_HOURS = float(os.getenv("ARCHIVE_INTERVAL_HOURS", "6"))
+ARCHIVE_BATCH_SIZE = 1000
+
+
+def shift_start_of(shift_date):
+    return TZ_KARACHI.localize(datetime.strptime(shift_date, "%Y-%m-%d").replace(hour=SHIFT_START_HOUR))
+
+def archive_cutoff(after_shifts, now=None):
+    """Start of the oldest shift kept hot, held back to the oldest closed shift whose rollup is not finalized (sync)."""
+    cutoff = shift_start_for(now or datetime.now(TZ_KARACHI)) - timedelta(days=after_shifts)
+    unfinalized = get_collection(TOTALS_COLLECTION).col.find_one(
+        {"finalized_at": {"$exists": False}, "shift_date": {"$lt": cutoff.strftime("%Y-%m-%d")}},
+        {"shift_date": 1}, sort=[("shift_date", 1)]
+    )
+    return shift_start_of(unfinalized["shift_date"]) if unfinalized else cutoff
+
+def mark_archived(dept, cutoff):
+    """Raises dept's archived_before mark (never lowers it) (sync)."""
+    get_collection(ARCHIVE_STATE_COLLECTION).col.update_one(
+        {"_id": dept},
+        {"$max": {"archived_before": cutoff.astimezone(pytz.utc)}, "$set": {"updated_at": datetime.now(pytz.utc)}},
+        upsert=True
+    )
+
+def archive_dept(dept, cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """Moves dept's leads created before cutoff to its archive collection. Returns how many moved (sync)."""
+    hot = get_lead_collection(dept).col
+    cold = get_archive_collection(dept).col
+    query = {"created_at": {"$lt": cutoff}}
+    moved = 0
+    while True:
+        docs = list(hot.find(query).sort([("created_at", 1), ("_id", 1)]).limit(batch_size))
+        if not docs: return moved
+        archived_at = datetime.now(pytz.utc)
+        cold.bulk_write([ReplaceOne({"_id": d["_id"]}, {**d, "archived_at": archived_at}, upsert=True) for d in docs], ordered=False)
+        # updated_at as copied: a lead edited in between stays hot (and is copied again next run)
+        deleted = hot.bulk_write([DeleteOne({"_id": d["_id"], "updated_at": d.get("updated_at")}) for d in docs], ordered=False).deleted_count
+        moved += deleted
+        if not deleted: return moved
+
+def run_archive(after_shifts, depts=None, dry_run=False, now=None):
+    """Finalizes closed shifts, then archives every department. Returns (cutoff, {dept: moved or eligible})."""
+    if after_shifts < 1: raise ValueError("after_shifts must be at least 1")
+    finalize_closed_shifts(now)
+    cutoff = archive_cutoff(after_shifts, now)
+    moved = {}
+    for dept in depts or list(DEPARTMENTS):
+        if dry_run:
+            moved[dept] = get_lead_collection(dept).col.count_documents({"created_at": {"$lt": cutoff}})
+            continue
+        mark_archived(dept, cutoff)
+        moved[dept] = archive_dept(dept, cutoff)
+    return cutoff, moved
+
+
+async def run_archiver():
+    """Lifespan loop: archives every ARCHIVE_INTERVAL_HOURS while ARCHIVE_AFTER_SHIFTS is set. Cancel to stop."""
+    while True:
+        try:
+            cutoff, moved = await run_in_threadpool(run_archive, ARCHIVE_AFTER_SHIFTS)
+            if any(moved.values()): print(f"Archived {moved} (created before {cutoff.isoformat()})")
+        except Exception as e:
+            print(f"Archive Error: {e}")
+        await asyncio.sleep(ARCHIVE_INTERVAL_HOURS * 3600)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move old leads to the archive tier")
+    parser.add_argument("command", choices=["run"])
+    parser.add_argument("--shifts", type=int, default=ARCHIVE_AFTER_SHIFTS or None, required=not ARCHIVE_AFTER_SHIFTS,
+                        help="Keep this many recent shifts hot (default: ARCHIVE_AFTER_SHIFTS)")
+    parser.add_argument("--dept", choices=list(DEPARTMENTS), action="append", help="Limit to a department (repeatable)")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the leads that would move")
+    args = parser.parse_args(argv)
+    cutoff, moved = run_archive(args.shifts, args.dept, args.dry_run)
+    verb = "would move" if args.dry_run else "moved"
+    for dept, count in moved.items():
+        print(f"{dept}: {count} lead(s) {verb}")
+    print(f"Cutoff: leads created before {cutoff.isoformat()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+import os
+import sys
+import hmac
+import time
+import base64
+import hashlib
+import logging
+import secrets
+import getpass
+
+# ==========================================
+# MANAGER AUTH
+# ==========================================
+# Passwords in the auth sheet may be stored as:
+#   pbkdf2_sha256$<iterations>$<salt>$<hash>   (preferred; `python -m api.auth hash-password`)
+#   64-char sha256 hex or plaintext            (legacy, still accepted)
+# Login issues a signed, expiring token "<user_id>.<expires>.<signature>" that
+# any instance can check with AUTH_SECRET alone, no sheet or database lookup.
+# Without AUTH_SECRET auth fails closed: login is refused and every token is
+# rejected (a per-instance key would log managers out on every cold start).
+
+logger = logging.getLogger(__name__)
+
+PBKDF2_ITERATIONS = int(os.getenv("AUTH_PBKDF2_ITERATIONS", "600000"))
+TOKEN_TTL_SECONDS = int(os.getenv("AUTH_TOKEN_TTL", str(12 * 3600)))
+
+AUTH_SECRET = os.getenv("AUTH_SECRET")
+if not AUTH_SECRET:
+    logger.error("AUTH_SECRET is not set: manager login is disabled until it is configured.")
+
+def auth_configured():
+    return bool(AUTH_SECRET)
+
+
+def _b64(raw):
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def hash_password(password, iterations=None):
+    iterations = iterations or PBKDF2_ITERATIONS
+    salt = secrets.token_bytes(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+    return f"pbkdf2_sha256${iterations}${_b64(salt)}${_b64(digest)}"
+
+def verify_password(password, stored):
+    """Constant-time check against any supported stored format. CPU-bound: call off the event loop."""
+    stored = str(stored)
+    if stored.startswith("pbkdf2_sha256$"):
+        try:
+            _, iterations, salt, expected = stored.split("$")
+            salt = base64.urlsafe_b64decode(salt + "=" * (-len(salt) % 4))
+            digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, int(iterations))
+        except Exception:
+            return False
+        return hmac.compare_digest(_b64(digest), expected)
+    hashed_input = hashlib.sha256(password.encode()).hexdigest()
+    return hmac.compare_digest(hashed_input, stored) or hmac.compare_digest(password.encode(), stored.encode())
+
+
+def _sign(message):
+    if not AUTH_SECRET: raise RuntimeError("AUTH_SECRET is not set")
+    return _b64(hmac.new(AUTH_SECRET.encode(), message.encode(), hashlib.sha256).digest())
+
+def issue_token(user_id, ttl=None):
+    expires = int(time.time()) + (ttl or TOKEN_TTL_SECONDS)
+    payload = f"{_b64(str(user_id).encode())}.{expires}"
+    return f"{payload}.{_sign(payload)}"
+
+def verify_token(token):
+    """Returns the user id for a valid, unexpired token, else None."""
+    try:
+        user_part, expires, signature = str(token).split(".")
+        if not hmac.compare_digest(_sign(f"{user_part}.{expires}"), signature): return None
+        if int(expires) < time.time(): return None
+        return base64.urlsafe_b64decode(user_part + "=" * (-len(user_part) % 4)).decode()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] != ["hash-password"]:
+        print("usage: python -m api.auth hash-password")
+        return 2
+    password = getpass.getpass("Password: ")
+    print(hash_password(password))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+import time
+import asyncio
+
+# ==========================================
+# IN-PROCESS TTL CACHE
+# ==========================================
+
+class TTLCache:
+    """
+    Small keyed cache with expiry. Concurrent misses on one key compute once.
+    A compute that an invalidate() overtook is returned to its caller but not stored.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._data = {}
+        self._locks = {}
+        # Bumped by invalidate(): per key, and for everything at once
+        self._generations = {}
+        self._epoch = 0
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if not entry: return None
+        value, expires = entry
+        if time.monotonic() >= expires:
+            self._data.pop(key, None)
+            return None
+        return value
+
+    def set(self, key, value):
+        self._data[key] = (value, time.monotonic() + self.ttl)
+
+    def invalidate(self, key=None):
+        if key is None:
+            self._data.clear()
+            self._epoch += 1
+        else:
+            self._data.pop(key, None)
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+    def _generation(self, key):
+        return self._epoch, self._generations.get(key, 0)
+
+    async def get_or_set(self, key, compute):
+        value = self.get(key)
+        if value is not None: return value
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Another request may have filled it while we waited
+            value = self.get(key)
+            if value is None:
+                generation = self._generation(key)
+                value = await compute()
+                # Computed from data an invalidation has since superseded: don't keep it
+                if self._generation(key) == generation: self.set(key, value)
+        return value
@@ -0,0 +1,197 @@
+import asyncio
+import threading
+from collections import deque
+from pymongo.errors import PyMongoError
+from api.db import get_db, DEPARTMENTS
+from api.models import dumps
+
+# ==========================================
+# CHANGE STREAM DELTA FEED (SSE)
+# ==========================================
+# One database-level change stream per process, filtered to the lead
+# collections and twh_chargebacks, so every delta arrives in oplog order with
+# its own resume token. The token is sent as the SSE event id; the browser's
+# EventSource replays it as Last-Event-ID on reconnect.
+#
+# The stream is read on its own thread (never the shared threadpool that
+# serves Mongo calls for requests) and fanned out to every connected manager
+# tab through a bounded queue per tab, like api/hub.py. The last
+# CHANGE_BUFFER_SIZE changes are kept, so a tab reconnecting with a recent
+# token gets what it missed; an older token gets `reset` (reload everything).
+# The thread opens with the first tab and stops after the last one leaves.
+# Change streams need a replica set (Atlas, or a local single-node `--replSet`).
+
+WATCHED_COLLECTIONS = list(DEPARTMENTS.values()) + ["twh_chargebacks"]
+DELTA_OPS = ["insert", "update", "replace", "delete"]
+
+# How long one getMore waits server-side (and a tab waits before a keepalive)
+AWAIT_MS = 10000
+CHANGE_BUFFER_SIZE = 1000
+FEED_QUEUE_SIZE = 256
+
+
+def sse(event, data, event_id=None):
+    frame = f"event: {event}\n"
+    if event_id: frame += f"id: {event_id}\n"
+    return frame + f"data: {dumps(data).decode()}\n\n"
+
+def open_change_stream(resume_token=None):
+    pipeline = [{"$match": {"ns.coll": {"$in": WATCHED_COLLECTIONS}, "operationType": {"$in": DELTA_OPS}}}]
+    return get_db().watch(
+        pipeline,
+        full_document="updateLookup",
+        resume_after={"_data": resume_token} if resume_token else None,
+        max_await_time_ms=AWAIT_MS
+    )
+
+def to_delta(change, format_doc):
+    """Compact delta: {op, coll, id, doc?}. doc is already shaped for the client."""
+    op = change["operationType"]
+    coll = change["ns"]["coll"]
+    delta = {
+        "op": "insert" if op == "insert" else ("delete" if op == "delete" else "update"),
+        "coll": coll,
+        "id": str(change["documentKey"]["_id"])
+    }
+    # updateLookup returns None when the document was deleted after the change
+    doc = change.get("fullDocument")
+    if op != "delete" and doc: delta["doc"] = format_doc(coll, doc)
+    return delta
+
+
+class ChangeFeed:
+    """
+    The process's change stream and its subscribers. Subscriber queues carry
+    (kind, payload) with kind ready | change | reset | unavailable. Everything
+    but _run happens on the event loop thread.
+    """
+
+    def __init__(self, open_stream=open_change_stream, buffer_size=CHANGE_BUFFER_SIZE, queue_size=FEED_QUEUE_SIZE):
+        self.open_stream = open_stream
+        self.queue_size = queue_size
+        self.buffer = deque(maxlen=buffer_size)
+        self.subscribers = set()
+        self.token = None
+        self.loop = None
+        self.thread = None
+        self.stopping = None
+        self.start_token = None
+
+    def subscribe(self, resume_token=None):
+        self.loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(self.queue_size)
+        if self.thread is None:
+            # First tab: the stream opens where it asked to resume
+            self.buffer.clear()
+            self.token = None
+            self._start(resume_token)
+        elif self.token is None:
+            # Still opening: its `ready` reaches this queue too, but only a tab
+            # resuming from the same point can skip the reload
+            if resume_token and resume_token != self.start_token:
+                queue.put_nowait(("reset", {"reason": "Resume token is no longer buffered"}))
+                return queue
+        else:
+            tokens = [t for t, _ in self.buffer]
+            if resume_token and resume_token != self.token and resume_token not in tokens:
+                queue.put_nowait(("reset", {"reason": "Resume token is no longer buffered"}))
+                return queue
+            queue.put_nowait(("ready", self.token))
+            if resume_token in tokens:
+                for _, change in list(self.buffer)[tokens.index(resume_token) + 1:]:
+                    queue.put_nowait(("change", change))
+        self.stopping.clear()
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+        if not self.subscribers and self.stopping: self.stopping.set()
+
+    def _start(self, resume_token):
+        self.start_token = resume_token
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(resume_token, self.stopping), name="change-feed", daemon=True)
+        self.thread.start()
+
+    def _post(self, kind, payload):
+        self.loop.call_soon_threadsafe(self._dispatch, kind, payload)
+
+    def _run(self, resume_token, stopping):
+        """Reader thread: blocks on the stream so no request worker has to."""
+        try:
+            stream = self.open_stream(resume_token)
+        except PyMongoError as e:
+            self._post("failed", ("reset" if resume_token else "unavailable", str(e)))
+            return
+        try:
+            self._post("ready", (stream.resume_token or {}).get("_data"))
+            while not stopping.is_set():
+                change = stream.try_next()
+                if change is not None: self._post("change", change)
+            self._post("stopped", None)
+        except PyMongoError as e:
+            # History lost mid-stream (oplog rolled past us): every tab must reload
+            print(f"Change Stream Error: {e}")
+            self._post("failed", ("reset", str(e)))
+        finally:
+            stream.close()
+
+    def _send(self, queue, item):
+        try:
+            queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # A tab that stopped reading: drop it, it reconnects and reloads
+            self.unsubscribe(queue)
+            while not queue.empty(): queue.get_nowait()
+            queue.put_nowait(("reset", {"reason": "Too far behind"}))
+
+    def _dispatch(self, kind, payload):
+        if kind == "ready":
+            self.token = payload
+        elif kind == "change":
+            self.token = payload["_id"]["_data"]
+            self.buffer.append((self.token, payload))
+        elif kind == "stopped":
+            self.thread = None
+            # A tab arrived while the thread was winding down: carry on from where it stopped
+            if self.subscribers: self._start(self.token)
+            return
+        else:
+            self.thread, self.token = None, None
+            self.buffer.clear()
+            event, reason = payload
+            for queue in list(self.subscribers): self._send(queue, (event, {"reason": reason}))
+            self.subscribers.clear()
+            return
+        for queue in list(self.subscribers): self._send(queue, (kind, payload))
+
+
+FEED = ChangeFeed()
+
+
+async def delta_events(request, resume_token, format_doc, feed=FEED):
+    """
+    Yields SSE frames until the client disconnects.
+    - `ready`:       stream is open (carries the starting token as its id)
+    - `delta`:       one change
+    - `reset`:       the resume token can no longer be honoured; reload everything
+    - `unavailable`: change streams are not supported here (e.g. standalone mongod)
+    """
+    queue = feed.subscribe(resume_token)
+    try:
+        while not await request.is_disconnected():
+            try:
+                kind, payload = await asyncio.wait_for(queue.get(), timeout=AWAIT_MS / 1000)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if kind == "ready":
+                yield sse("ready", {"token": payload}, event_id=payload)
+            elif kind == "change":
+                yield sse("delta", to_delta(payload, format_doc), event_id=payload["_id"]["_data"])
+            else:
+                yield sse(kind, payload)
+                return
+    finally:
+        feed.unsubscribe(queue)
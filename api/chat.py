@@ -0,0 +1,155 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from pymongo import ReturnDocument
+from pymongo.errors import CollectionInvalid, DuplicateKeyError
+from starlette.concurrency import run_in_threadpool
+from api.db import get_db, get_collection
+
+# ==========================================
+# CHAT STORE + RATE LIMITER
+# ==========================================
+# Shared across workers/instances via Mongo (CHAT_BACKEND=mongo, the default):
+#   chat_messages  capped collection, messages carry a monotonically increasing `seq`
+#   counters       {_id: "chat_seq", value}
+#   rate_limits    {_id: key, hits: [epoch seconds inside the window]}
+# CHAT_BACKEND=memory keeps everything in-process (tests, local runs).
+
+CHAT_BACKEND = os.getenv("CHAT_BACKEND", "mongo")
+CHAT_HISTORY_SIZE = int(os.getenv("CHAT_HISTORY_SIZE", "50"))
+CHAT_CAPPED_MAX = 1000
+CHAT_CAPPED_BYTES = 1024 * 1024
+
+# Sliding windows: (max messages, window seconds). A limit of 0 disables it.
+CHAT_GLOBAL_LIMIT = (int(os.getenv("CHAT_GLOBAL_LIMIT", "30")), int(os.getenv("CHAT_GLOBAL_WINDOW", "3600")))
+CHAT_SENDER_LIMIT = (int(os.getenv("CHAT_SENDER_LIMIT", "0")), int(os.getenv("CHAT_SENDER_WINDOW", "3600")))
+
+MESSAGES_COLLECTION = "chat_messages"
+# While capped-collection setup keeps failing, appends retry it at most this often
+CHAT_SETUP_RETRY_SECONDS = 60
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryChatStore:
+    def __init__(self, size=CHAT_HISTORY_SIZE):
+        self.messages = deque(maxlen=size)
+        self.seq = 0
+
+    async def append(self, msg):
+        self.seq += 1
+        msg = {**msg, "seq": self.seq}
+        self.messages.append(msg)
+        return msg
+
+    async def history(self, since=None, limit=CHAT_HISTORY_SIZE):
+        msgs = [m for m in self.messages if since is None or m["seq"] > since]
+        return msgs[-limit:]
+
+
+class MongoChatStore:
+    def __init__(self, size=CHAT_HISTORY_SIZE):
+        self.size = size
+        self.messages = get_collection(MESSAGES_COLLECTION)
+        self.counters = get_collection("counters")
+        self.ready = False
+        self._setup_lock = threading.Lock()
+        self._setup_failed_at = None
+
+    def ensure_collection(self):
+        """
+        Creates the capped collection once (sync; started at startup and awaited by
+        the first append). A chat_messages left uncapped, e.g. auto-created by an
+        insert before this ran, is converted.
+        """
+        with self._setup_lock:
+            if self.ready: return
+            db = get_db()
+            try:
+                db.create_collection(MESSAGES_COLLECTION, capped=True, size=CHAT_CAPPED_BYTES, max=CHAT_CAPPED_MAX)
+            except CollectionInvalid:
+                if not db[MESSAGES_COLLECTION].options().get("capped"):
+                    # convertToCapped takes a byte size only: the document cap does not apply to a converted collection
+                    db.command("convertToCapped", MESSAGES_COLLECTION, size=CHAT_CAPPED_BYTES)
+            db[MESSAGES_COLLECTION].create_index("seq")
+            self.ready = True
+
+    async def append(self, msg):
+        # An insert that ran first would create chat_messages as a normal collection
+        retry_due = self._setup_failed_at is None or time.time() - self._setup_failed_at >= CHAT_SETUP_RETRY_SECONDS
+        if not self.ready and retry_due:
+            try:
+                await run_in_threadpool(self.ensure_collection)
+            except Exception as e:
+                # Chat stays up; a later append retries and converts what this insert creates
+                self._setup_failed_at = time.time()
+                logger.warning("Chat setup failed, retrying in %ss: %s", CHAT_SETUP_RETRY_SECONDS, e)
+        counter = await self.counters.find_one_and_update(
+            {"_id": "chat_seq"}, {"$inc": {"value": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        msg = {**msg, "seq": counter["value"]}
+        await self.messages.insert_one(dict(msg))
+        return msg
+
+    async def history(self, since=None, limit=CHAT_HISTORY_SIZE):
+        query = {"seq": {"$gt": since}} if since is not None else {}
+        docs = await self.messages.find(query, {"_id": 0}, sort=[("seq", -1)], limit=limit)
+        return list(reversed(docs))
+
+
+class MemoryRateLimiter:
+    def __init__(self):
+        self.hits = {}
+
+    async def hit(self, key, limit, window):
+        """Records a hit and returns True if `key` is still within `limit` per `window` seconds."""
+        now = time.time()
+        hits = self.hits.setdefault(key, deque())
+        while hits and hits[0] <= now - window: hits.popleft()
+        if len(hits) >= limit: return False
+        hits.append(now)
+        return True
+
+
+class MongoRateLimiter:
+    def __init__(self):
+        self.col = get_collection("rate_limits")
+
+    async def hit(self, key, limit, window):
+        """Same contract as MemoryRateLimiter; one atomic pipeline update per call."""
+        now = time.time()
+        try:
+            doc = await self._hit(key, limit, window, now)
+        except DuplicateKeyError:
+            # Two first hits on a key both tried the upsert; the loser now finds the document
+            doc = await self._hit(key, limit, window, now)
+        return bool(doc.get("allowed"))
+
+    async def _hit(self, key, limit, window, now):
+        return await self.col.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"hits": {"$filter": {"input": {"$ifNull": ["$hits", []]}, "cond": {"$gt": ["$$this", now - window]}}}}},
+                {"$set": {"allowed": {"$lt": [{"$size": "$hits"}, limit]}}},
+                {"$set": {"hits": {"$cond": ["$allowed", {"$concatArrays": ["$hits", [now]]}, "$hits"]}}}
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+
+def create_chat_backend(kind=CHAT_BACKEND):
+    if kind == "memory": return MemoryChatStore(), MemoryRateLimiter()
+    return MongoChatStore(), MongoRateLimiter()
+
+async def allow_message(limiter, sender):
+    """Applies the per-sender then the global sliding window. Returns an error message or None."""
+    sender_limit, sender_window = CHAT_SENDER_LIMIT
+    if sender_limit and not await limiter.hit(f"chat:sender:{sender}", sender_limit, sender_window):
+        return "You are sending messages too fast."
+    global_limit, global_window = CHAT_GLOBAL_LIMIT
+    if global_limit and not await limiter.hit("chat:global", global_limit, global_window):
+        return "Global chat limit reached."
+    return None
@@ -0,0 +1,140 @@
+import os
+from datetime import timezone
+from dotenv import load_dotenv
+from pymongo import MongoClient
+from starlette.concurrency import run_in_threadpool
+from api.metrics import MONGO_LISTENER
+
+load_dotenv()
+
+# ==========================================
+# DATA ACCESS LAYER
+# ==========================================
+# pymongo is synchronous. Every call below is pushed onto the threadpool so an
+# `async def` route never blocks the event loop while waiting on Atlas.
+
+MONGO_URI = os.getenv("MONGO_URI")
+# Overridable so benchmarks can run against a scratch database
+DB_NAME = os.getenv("MONGO_DB", "twh_portal")
+
+# Department -> collection name. Routes resolve collections from here only.
+DEPARTMENTS = {
+    "billing": "billing",
+    "telecom": "telecom",
+    "insurance": "insurance",
+    "design": "design",
+    "ebook": "ebook",
+}
+
+# Billing/Insurance/Telecom count 'Charged' only | Design/Ebook count everything
+CHARGED_ONLY_DEPTS = ["billing", "insurance", "telecom"]
+
+# Leads moved out of the hot tier by api/archive.py: "<collection>_archive",
+# plus one {_id: dept, archived_before} marker per department
+ARCHIVE_SUFFIX = "_archive"
+ARCHIVE_STATE_COLLECTION = "archive_state"
+
+
+class AsyncCollection:
+    """Awaitable wrapper around a pymongo collection, resolved on first use."""
+
+    def __init__(self, name):
+        self.name = name
+        self._col = None
+
+    @property
+    def col(self):
+        if self._col is None: self._col = get_db()[self.name]
+        return self._col
+
+    async def find(self, filter=None, projection=None, sort=None, limit=0, skip=0):
+        def _run():
+            cursor = self.col.find(filter or {}, projection)
+            if sort: cursor = cursor.sort(sort)
+            if skip: cursor = cursor.skip(skip)
+            if limit: cursor = cursor.limit(limit)
+            return list(cursor)
+        return await run_in_threadpool(_run)
+
+    async def find_one(self, filter, projection=None, **kwargs):
+        return await run_in_threadpool(self.col.find_one, filter, projection, **kwargs)
+
+    async def insert_one(self, doc):
+        return await run_in_threadpool(self.col.insert_one, doc)
+
+    async def insert_many(self, docs, ordered=True):
+        return await run_in_threadpool(self.col.insert_many, docs, ordered=ordered)
+
+    async def update_one(self, filter, update, upsert=False):
+        return await run_in_threadpool(self.col.update_one, filter, update, upsert=upsert)
+
+    async def update_many(self, filter, update, upsert=False):
+        return await run_in_threadpool(self.col.update_many, filter, update, upsert=upsert)
+
+    async def find_one_and_update(self, filter, update, **kwargs):
+        return await run_in_threadpool(self.col.find_one_and_update, filter, update, **kwargs)
+
+    async def find_one_and_delete(self, filter, **kwargs):
+        return await run_in_threadpool(self.col.find_one_and_delete, filter, **kwargs)
+
+    async def delete_one(self, filter):
+        return await run_in_threadpool(self.col.delete_one, filter)
+
+    async def delete_many(self, filter):
+        return await run_in_threadpool(self.col.delete_many, filter)
+
+    async def count_documents(self, filter):
+        return await run_in_threadpool(self.col.count_documents, filter)
+
+    async def aggregate(self, pipeline):
+        return await run_in_threadpool(lambda: list(self.col.aggregate(pipeline)))
+
+    async def bulk_write(self, requests, ordered=True):
+        return await run_in_threadpool(self.col.bulk_write, requests, ordered=ordered)
+
+
+# --- MONGODB SETUP ---
+# The client is created on first use, not at import, so cold starts that only
+# serve pages never pay for it. It lives at module level, so warm serverless
+# invocations and every request in a worker reuse the same connection pool.
+mongo_client = None
+_db = None
+
+def get_db():
+    global mongo_client, _db
+    if _db is None:
+        # Every command is timed for /metrics (api/metrics.py)
+        mongo_client = MongoClient(MONGO_URI, event_listeners=[MONGO_LISTENER])
+        _db = mongo_client[DB_NAME]
+    return _db
+
+_COLLECTIONS = {}
+
+def get_collection(name):
+    """Returns the AsyncCollection for a department (or any named collection)."""
+    if name not in _COLLECTIONS:
+        _COLLECTIONS[name] = AsyncCollection(name)
+    return _COLLECTIONS[name]
+
+def get_lead_collection(dept):
+    """Resolves a department name to its lead collection. None for invalid types."""
+    if dept not in DEPARTMENTS: return None
+    return get_collection(DEPARTMENTS[dept])
+
+def get_archive_collection(dept):
+    """Resolves a department name to its archive (cold tier) collection. None for invalid types."""
+    if dept not in DEPARTMENTS: return None
+    return get_collection(DEPARTMENTS[dept] + ARCHIVE_SUFFIX)
+
+def archived_before(dept):
+    """Aware UTC created_at bound below which dept's leads may be archived, or None if none ever were (sync)."""
+    state = get_collection(ARCHIVE_STATE_COLLECTION).col.find_one({"_id": dept})
+    if not state or not state.get("archived_before"): return None
+    bound = state["archived_before"]
+    # Mongo hands datetimes back as naive UTC
+    return bound.replace(tzinfo=timezone.utc) if bound.tzinfo is None else bound
+
+def needs_archive(dept, start=None):
+    """Whether reading dept's leads created at/after `start` (aware; None = all time) must include the archive (sync)."""
+    bound = archived_before(dept)
+    return bound is not None and (start is None or start < bound)
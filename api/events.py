@@ -0,0 +1,76 @@
+import os
+import re
+import time
+from api.outbox import enqueue
+from api.metrics import external_call, PUSHER_BATCH_LENGTH, PUSHER_PUBLISH_DELAY
+
+# ==========================================
+# REALTIME EVENTS (PUSHER)
+# ==========================================
+# Routes publish() events; they travel through the outbox as "pusher"
+# messages, wait up to PUSHER_BATCH_WAIT to coalesce with other events and go
+# out with trigger_batch (Pusher takes at most PUSHER_BATCH_EVENTS per call).
+# Each page subscribes only to the channels it renders:
+#   techware-channel          team chat (every page)
+#   techware-dept-<dept>      lead events of one department (agent pages)
+#   techware-manager          every lead event (manager console)
+#   techware-agent-<agent>    an agent's own status updates (approval overlay)
+#   techware-leaderboard      ranking / team-goal changes (manager ticker, billing gold mode)
+# static/js/main.js and billing.js build the same names.
+
+CHAT_CHANNEL = "techware-channel"
+MANAGER_CHANNEL = "techware-manager"
+LEADERBOARD_CHANNEL = "techware-leaderboard"
+PUSHER_BATCH_EVENTS = 10
+# Outbox messages per batch (one message can fan out to several channels)
+PUSHER_BATCH_SIZE_MESSAGES = int(os.getenv("PUSHER_BATCH_SIZE", "10"))
+PUSHER_BATCH_WAIT = float(os.getenv("PUSHER_BATCH_WAIT", "0.3"))
+
+
+def dept_channel(dept):
+    return f"techware-dept-{dept}"
+
+def agent_channel(agent):
+    return "techware-agent-" + re.sub(r"[^a-z0-9]+", "-", str(agent).lower()).strip("-")
+
+def lead_channels(dept, agent=None):
+    """Where an event about one of dept's leads goes: its page, the manager and (if given) the agent."""
+    channels = [dept_channel(dept), MANAGER_CHANNEL]
+    if agent: channels.append(agent_channel(agent))
+    return channels
+
+
+async def publish(event, data, channels):
+    await enqueue("pusher", {"channels": list(channels), "event": event, "data": data, "queued_at": time.time()})
+
+async def publish_items(event, items, channels_for, per_event):
+    """
+    Publishes {"items": [...]} events, each channel receiving only the items
+    channels_for(item) routes to it, per_event items at most per event.
+    """
+    by_channel = {}
+    for item in items:
+        for channel in channels_for(item): by_channel.setdefault(channel, []).append(item)
+    for channel, channel_items in by_channel.items():
+        for start in range(0, len(channel_items), per_event):
+            await publish(event, {"items": channel_items[start:start + per_event]}, [channel])
+
+
+def batch_entries(payloads):
+    """Outbox payloads -> trigger_batch entries. Payloads queued before channels existed carry one `channel`."""
+    return [
+        {"channel": channel, "name": p["event"], "data": p["data"]}
+        for p in payloads for channel in (p.get("channels") or [p["channel"]])
+    ]
+
+def deliver(client, payloads):
+    """Sends a batch of outbox payloads with as few trigger_batch calls as Pusher allows. Raises on failure."""
+    entries = batch_entries(payloads)
+    for start in range(0, len(entries), PUSHER_BATCH_EVENTS):
+        chunk = entries[start:start + PUSHER_BATCH_EVENTS]
+        with external_call("pusher", "trigger_batch"):
+            client.trigger_batch(chunk)
+        PUSHER_BATCH_LENGTH.observe(len(chunk))
+    now = time.time()
+    for p in payloads:
+        if "queued_at" in p: PUSHER_PUBLISH_DELAY.observe(now - p["queued_at"])
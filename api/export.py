@@ -0,0 +1,159 @@
+import io
+import csv
+import zlib
+import heapq
+from datetime import datetime, timedelta
+from api.db import get_collection, get_lead_collection, get_archive_collection, archived_before, DEPARTMENTS
+from api.models import dumps, lead_detail_to_wire, chargeback_to_wire, VAULT_DEPTS
+from api.shift_totals import TZ_KARACHI
+from api.vault import iter_with_secrets
+
+# ==========================================
+# SHEET COLUMN LAYOUTS + STREAMING EXPORT
+# ==========================================
+# The column layouts are the rows save_lead appends to Google Sheets; exports
+# reuse them so a CSV lines up with the sheet. An export walks one Mongo cursor
+# in batches and yields encoded chunks, so memory stays flat however long the
+# date range is. StreamingResponse runs the (sync) generator on the threadpool.
+
+def _pin_or_account(doc):
+    return doc.get("pin_code") or doc.get("account_number")
+
+_CARD_COLUMNS = [
+    ("Record_ID", "record_id"), ("Agent Name", "agent"), ("Name", "client_name"), ("Phone", "phone"),
+    ("Address", "address"), ("Email", "email"), ("Card Holder", "card_holder"), ("Card Number", "card_number"),
+    ("Exp Date", "exp_date"), ("CVC", "cvc"), ("Charge", "charge_str"), ("LLC", "llc")
+]
+
+# (header, field name or fn(doc)) per sheet
+SHEET_COLUMNS = {
+    "billing": _CARD_COLUMNS + [("Provider", "provider"), ("Date", "date_str"), ("Status", "status"), ("Timestamp", "timestamp_str"), ("PIN/Acc", _pin_or_account)],
+    "insurance": _CARD_COLUMNS + [("Date", "date_str"), ("Status", "status"), ("Timestamp", "timestamp_str")],
+    "design": [("Name", "client_name"), ("Service", "provider"), ("Charge", "charge_str"), ("Date", "date_str"), ("Timestamp", "timestamp_str")],
+}
+SHEET_COLUMNS["telecom"] = SHEET_COLUMNS["billing"]
+SHEET_COLUMNS["ebook"] = SHEET_COLUMNS["design"]
+
+CHARGEBACK_COLUMNS = [
+    ("Timestamp", "timestamp_str"), ("Agent Name", "agent"), ("Dept", "dept"), ("Name", "client_name"),
+    ("Record_ID", "original_record_id"), ("Amount", "amount"), ("Note", "note")
+]
+
+def sheet_row(columns, doc):
+    return [field(doc) if callable(field) else doc.get(field, "") for _, field in columns]
+
+
+# --- QUERY ---
+
+EXPORT_BATCH_SIZE = 1000
+# Rows per yielded chunk (one threadpool hop each)
+EXPORT_CHUNK_ROWS = 500
+
+def parse_range_bound(value, end=False):
+    """ "YYYY-MM-DD" (Karachi day; an end date includes the whole day) or an ISO datetime -> aware datetime."""
+    if not value: return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid date: {value}")
+    if end and len(value) == 10: parsed += timedelta(days=1)
+    return TZ_KARACHI.localize(parsed) if parsed.tzinfo is None else parsed
+
+def export_filter(start=None, end=None, status=None, agent=None):
+    query = {}
+    created = {}
+    if start: created["$gte"] = start
+    if end: created["$lt"] = end
+    if created: query["created_at"] = created
+    if status: query["status"] = status
+    if agent: query["agent"] = agent
+    return query
+
+def export_sources(kind, dept, query):
+    """[(dept, pymongo cursor, to_row)] in export order. dept=None means every department."""
+    if kind == "chargebacks":
+        cb_query = {k: v for k, v in query.items() if k != "status"}
+        if dept: cb_query["dept"] = dept
+        cursor = get_collection("twh_chargebacks").col.find(cb_query).sort("created_at", 1).batch_size(EXPORT_BATCH_SIZE)
+        return [("chargebacks", cursor, chargeback_to_wire)]
+    sources = []
+    start = query.get("created_at", {}).get("$gte")
+    for d in ([dept] if dept else list(DEPARTMENTS)):
+        to_row = lambda doc, d=d: {**lead_detail_to_wire(doc, d), "dept": d, "date_str": doc.get("date_str")}
+        hot = get_lead_collection(d).col
+        bound = archived_before(d)
+        if bound is not None and (start is None or start < bound):
+            # Archived leads are the older ones: read first, and only if the range reaches them (api/archive.py)
+            cursors = [_archived_range(d, {"$and": [query, {"created_at": {"$lt": bound}}]}),
+                       _oldest_first(hot.find({"$and": [query, {"created_at": {"$gte": bound}}]}))]
+        else:
+            cursors = [_oldest_first(hot.find(query))]
+        for cursor in cursors:
+            # Card columns come from the vault, one lookup per batch (api/vault.py)
+            if d in VAULT_DEPTS: cursor = iter_with_secrets(cursor, EXPORT_BATCH_SIZE)
+            sources.append((d, cursor, to_row))
+    return sources
+
+def _oldest_first(cursor):
+    return cursor.sort("created_at", 1).batch_size(EXPORT_BATCH_SIZE)
+
+def _archived_range(dept, query):
+    """
+    Leads of `query` in both tiers, oldest first, each once. A lead being archived
+    is briefly in both: the hot ones are read up front (normally only the few
+    left behind) and left out of the archive read, so a lead that moves
+    afterwards is still exported exactly once.
+    """
+    hot = list(_oldest_first(get_lead_collection(dept).col.find(query)))
+    archived = _oldest_first(get_archive_collection(dept).col.find({"$and": [query, {"_id": {"$nin": [d["_id"] for d in hot]}}]}))
+    try:
+        yield from heapq.merge(hot, archived, key=lambda d: d.get("created_at") or datetime.min)
+    finally:
+        archived.close()
+
+
+# --- ENCODING ---
+
+def csv_chunks(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([header for header, _ in columns])
+    for i, row in enumerate(rows, 1):
+        writer.writerow(sheet_row(columns, row))
+        if i % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+def ndjson_chunks(rows):
+    lines = []
+    for row in rows:
+        lines.append(dumps(row))
+        if len(lines) == EXPORT_CHUNK_ROWS:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines: yield b"\n".join(lines) + b"\n"
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data: yield data
+    yield compressor.flush()
+
+def export_stream(kind, dept, fmt, query, gzip=False):
+    """Sync generator of response bytes. CSV needs a single column layout (one dept, or chargebacks)."""
+    def rows():
+        for _, cursor, to_row in export_sources(kind, dept, query):
+            try:
+                for doc in cursor: yield to_row(doc)
+            finally:
+                cursor.close()
+
+    if fmt == "csv":
+        columns = CHARGEBACK_COLUMNS if kind == "chargebacks" else SHEET_COLUMNS[dept]
+        chunks = csv_chunks(columns, rows())
+    else:
+        chunks = ndjson_chunks(rows())
+    return gzip_chunks(chunks) if gzip else chunks
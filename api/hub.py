@@ -0,0 +1,181 @@
+import os
+import json
+import asyncio
+from starlette.websockets import WebSocketDisconnect
+from api.models import dumps
+from api.metrics import HUB_SUBSCRIBERS, HUB_MESSAGES, HUB_EVICTIONS
+
+# ==========================================
+# IN-PROCESS REALTIME HUB (PUSHER ALTERNATIVE)
+# ==========================================
+# With REALTIME_BACKEND=hub, get_pusher() returns a HubClient: the outbox
+# delivers the same events to the same channel names (api/events.py), but to
+# browsers connected to this process instead of Pusher. Browsers connect over
+# SSE (/api/realtime/stream, used by static/js/realtime.js) or a WebSocket
+# (/ws). Every message is one JSON object: {"channel", "event", "data"}.
+#
+# Each connection has a bounded send queue. A client whose queue fills
+# (a slow reader or a dead socket) is evicted and disconnected rather than
+# stalling a broadcast or growing memory; EventSource reconnects on its own.
+# Subscribers live in this process, so run a single worker in hub mode.
+
+HUB_QUEUE_SIZE = int(os.getenv("HUB_QUEUE_SIZE", "256"))
+HUB_HEARTBEAT_SECONDS = 15
+MAX_CHANNELS_PER_CLIENT = 20
+
+
+class Subscriber:
+    def __init__(self, queue_size):
+        self.queue = asyncio.Queue(queue_size)
+        self.channels = set()
+
+    def close(self):
+        """Drops anything unsent and wakes the sender with the end-of-stream marker (None)."""
+        while not self.queue.empty(): self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class Hub:
+    """Channel -> subscriber sets. Everything but publish_threadsafe runs on the event loop thread."""
+
+    def __init__(self, queue_size=HUB_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.channels = {}
+        self.subscribers = set()
+        self.evictions = 0
+        self.loop = None
+
+    def connect(self, channels=()):
+        self.loop = asyncio.get_running_loop()
+        sub = Subscriber(self.queue_size)
+        self.subscribers.add(sub)
+        HUB_SUBSCRIBERS.set(len(self.subscribers))
+        for channel in channels: self.subscribe(sub, channel)
+        return sub
+
+    def subscribe(self, sub, channel):
+        if channel in sub.channels: return
+        if len(sub.channels) >= MAX_CHANNELS_PER_CLIENT: raise ValueError("Too many channels")
+        sub.channels.add(channel)
+        self.channels.setdefault(channel, set()).add(sub)
+
+    def unsubscribe(self, sub, channel):
+        sub.channels.discard(channel)
+        members = self.channels.get(channel)
+        if members is None: return
+        members.discard(sub)
+        if not members: del self.channels[channel]
+
+    def disconnect(self, sub):
+        for channel in list(sub.channels): self.unsubscribe(sub, channel)
+        self.subscribers.discard(sub)
+        HUB_SUBSCRIBERS.set(len(self.subscribers))
+
+    def evict(self, sub):
+        self.disconnect(sub)
+        sub.close()
+        self.evictions += 1
+        HUB_EVICTIONS.inc()
+
+    def publish(self, channel, event, data):
+        """Queues one event for every subscriber of channel. Returns how many got it."""
+        members = self.channels.get(channel)
+        if not members: return 0
+        # Encoded once, whatever the fan-out
+        message = dumps({"channel": channel, "event": event, "data": data}).decode()
+        sent = 0
+        for sub in list(members):
+            try:
+                sub.queue.put_nowait(message)
+                sent += 1
+            except asyncio.QueueFull:
+                self.evict(sub)
+        HUB_MESSAGES.inc(sent)
+        return sent
+
+    def publish_many(self, events):
+        for channel, event, data in events: self.publish(channel, event, data)
+
+    def publish_threadsafe(self, events):
+        """publish() from any thread (outbox handlers run on the threadpool). No-op before the first connection."""
+        if self.loop is None or self.loop.is_closed(): return
+        self.loop.call_soon_threadsafe(self.publish_many, list(events))
+
+
+class HubClient:
+    """Stands in for pusher.Pusher: the trigger / trigger_batch calls the app makes, delivered by a Hub."""
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    def trigger(self, channels, event_name, data):
+        channels = [channels] if isinstance(channels, str) else channels
+        self.trigger_batch([{"channel": c, "name": event_name, "data": data} for c in channels])
+
+    def trigger_batch(self, batch):
+        self.hub.publish_threadsafe((e["channel"], e["name"], e["data"]) for e in batch)
+
+
+HUB = Hub()
+
+
+# --- TRANSPORTS ---
+
+def parse_channels(value):
+    channels = [c.strip() for c in (value or "").split(",") if c.strip()]
+    if not channels: raise ValueError("channels is required")
+    if len(channels) > MAX_CHANNELS_PER_CLIENT: raise ValueError("Too many channels")
+    return channels
+
+async def sse_events(channels, hub=HUB):
+    """SSE frames for one client until it disconnects or is evicted. Comment lines keep proxies from timing out."""
+    sub = hub.connect(channels)
+    try:
+        yield ": connected\n\n"
+        while True:
+            try:
+                message = await asyncio.wait_for(sub.queue.get(), HUB_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if message is None: return
+            yield f"data: {message}\n\n"
+    finally:
+        hub.disconnect(sub)
+
+async def serve_websocket(websocket, hub=HUB):
+    """
+    Initial channels from ?channels=a,b; then the client may send
+    {"subscribe": name} / {"unsubscribe": name}. Evicted clients are closed with 1013.
+    """
+    await websocket.accept()
+    try:
+        sub = hub.connect(parse_channels(websocket.query_params.get("channels")) if websocket.query_params.get("channels") else ())
+    except ValueError as e:
+        await websocket.close(1008, str(e))
+        return
+
+    async def read_commands():
+        try:
+            while True:
+                command = json.loads(await websocket.receive_text())
+                if command.get("subscribe"): hub.subscribe(sub, str(command["subscribe"]))
+                if command.get("unsubscribe"): hub.unsubscribe(sub, str(command["unsubscribe"]))
+        except (WebSocketDisconnect, ValueError, AttributeError):
+            pass
+        finally:
+            hub.disconnect(sub)
+            sub.close()
+
+    reader = asyncio.create_task(read_commands())
+    try:
+        while True:
+            message = await sub.queue.get()
+            if message is None: break
+            await websocket.send_text(message)
+        if not reader.done(): await websocket.close(1013)
+    except Exception:
+        pass
+    finally:
+        reader.cancel()
+        hub.disconnect(sub)
@@ -0,0 +1,196 @@
+import io
+import sys
+import csv
+import argparse
+from datetime import datetime
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from api.db import get_archive_collection, get_collection, get_lead_collection, needs_archive, DEPARTMENTS
+from api.export import SHEET_COLUMNS
+from api.models import LEAD_FIELDS
+from api.pagination import utc_now
+from api.search import search_keys
+from api.shift_totals import TZ_KARACHI, TOTALS_COLLECTION, rollup_ops
+from api.vault import VAULT_COLLECTION, split_lead
+
+# ==========================================
+# BULK LEAD IMPORT
+# ==========================================
+# For migrating sheet history or partner CSVs. Reads the CSV in chunks,
+# builds the same documents save_lead writes, and inserts each chunk with
+# insert_many(ordered=False). Rows whose record_id already exists (indexed
+# lookup per chunk, archive included) or repeats within the file are reported as duplicates and
+# skipped unless on_duplicate="insert". No Sheets/Pusher/Pushbullet side
+# effects; the shift rollups are moved in one bulk_write per chunk. Card
+# fields go to the vault (api/vault.py) with one insert_many per chunk.
+#   python -m api.importer billing leads.csv [--no-header] [--dry-run]
+
+IMPORT_CHUNK_ROWS = 1000
+# Reported rows per category (counts are always complete)
+REPORT_LIMIT = 100
+
+# Headers accepted besides the raw field names: the sheet/export headers
+HEADER_FIELDS = {
+    header.lower(): field
+    for columns in SHEET_COLUMNS.values() for header, field in columns if isinstance(field, str)
+}
+HEADER_FIELDS.update({"pin/acc": "pin_code", "order id": "record_id", "client name": "client_name"})
+
+TEXT_FIELDS = [
+    "record_id", "agent", "client_name", "phone", "address", "email", "card_holder", "card_number",
+    "exp_date", "cvc", "llc", "provider", "pin_code", "account_number"
+]
+
+
+def parse_charge(value):
+    """save_lead's charge parsing: (amount, "$x.xx"). Raises ValueError if it is not a number."""
+    amount = float(str(value).replace('$', '').replace(',', '').strip())
+    return amount, f"${amount:.2f}"
+
+def parse_timestamp(value):
+    """ "YYYY-MM-DD HH:MM:SS" (or a bare date) in Karachi time -> aware datetime."""
+    value = str(value or "").strip()
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
+        try:
+            return TZ_KARACHI.localize(datetime.strptime(value, fmt))
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid timestamp: {value or '(empty)'}")
+
+def build_lead(dept, row):
+    """CSV row (field -> value) -> the document save_lead would have stored."""
+    if not row.get("agent") and dept not in ("design", "ebook"): raise ValueError("Missing agent")
+    if not row.get("client_name"): raise ValueError("Missing client name")
+    try:
+        charge_amount, charge_str = parse_charge(row.get("charge_str") or row.get("charge_amount"))
+    except ValueError:
+        raise ValueError(f"Invalid charge: {row.get('charge_str') or row.get('charge_amount') or '(empty)'}")
+    ts_obj = parse_timestamp(row.get("timestamp_str") or row.get("date_str"))
+    doc = {f: str(row.get(f) or "").strip() for f in TEXT_FIELDS}
+    doc.update({
+        "charge_amount": charge_amount,
+        "charge_str": charge_str,
+        "status": row.get("status") or "Pending",
+        "created_at": ts_obj,
+        "timestamp_str": ts_obj.strftime("%Y-%m-%d %H:%M:%S"),
+        "date_str": row.get("date_str") or ts_obj.strftime("%Y-%m-%d"),
+        "type": dept,
+        "updated_at": utc_now()
+    })
+    doc["search_keys"] = search_keys(doc)
+    return doc
+
+
+def read_rows(dept, text, header=True):
+    """Yields (line number, {field: value}) from a CSV text stream."""
+    reader = csv.reader(text)
+    if header:
+        names = next(reader, [])
+        fields = [HEADER_FIELDS.get(n.strip().lower(), n.strip()) for n in names]
+        known = set(LEAD_FIELDS[dept]) | set(TEXT_FIELDS) | {"date_str", "charge_amount"}
+        if not known & set(fields): raise ValueError(f"No known columns in header: {names}")
+        start = 2
+    else:
+        # Headerless sheet rows: positional, in the sheet layout
+        fields = [field if isinstance(field, str) else "pin_code" for _, field in SHEET_COLUMNS[dept]]
+        start = 1
+    for line, values in enumerate(reader, start):
+        if not any(v.strip() for v in values): continue
+        yield line, dict(zip(fields, values))
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk: yield chunk
+
+
+def import_leads(dept, text, header=True, on_duplicate="skip", dry_run=False, chunk_rows=IMPORT_CHUNK_ROWS):
+    """Imports a CSV text stream into a department's leads (sync). Returns a report dict."""
+    if dept not in DEPARTMENTS: raise ValueError("Invalid Type")
+    col = get_lead_collection(dept).col
+    rollups = get_collection(TOTALS_COLLECTION).col
+    vault = get_collection(VAULT_COLLECTION).col
+    # Archived leads keep their record_ids: a re-imported old row is still a duplicate
+    sources = [col, get_archive_collection(dept).col] if needs_archive(dept) else [col]
+    report = {"dept": dept, "rows": 0, "inserted": 0, "duplicate_count": 0, "error_count": 0,
+              "duplicates": [], "errors": [], "dry_run": dry_run}
+    seen = set()
+
+    def note(kind, entry):
+        report[{"duplicates": "duplicate_count", "errors": "error_count"}[kind]] += 1
+        if len(report[kind]) < REPORT_LIMIT: report[kind].append(entry)
+
+    for chunk in chunked(read_rows(dept, text, header), chunk_rows):
+        docs = []
+        for line, row in chunk:
+            report["rows"] += 1
+            try:
+                docs.append((line, build_lead(dept, row)))
+            except ValueError as e:
+                note("errors", {"line": line, "message": str(e)})
+
+        # One indexed lookup per chunk and tier (record_id index)
+        ids = list({doc["record_id"] for _, doc in docs if doc["record_id"]})
+        existing = {
+            d["record_id"] for source in sources
+            for d in source.find({"record_id": {"$in": ids}}, {"record_id": 1, "_id": 0})
+        } if ids else set()
+        to_insert = []
+        for line, doc in docs:
+            rid = doc["record_id"]
+            duplicate = rid and (rid in existing or rid in seen)
+            if rid: seen.add(rid)
+            if duplicate:
+                note("duplicates", {"line": line, "record_id": rid, "existing": rid in existing})
+                if on_duplicate != "insert": continue
+            to_insert.append(doc)
+
+        if dry_run or not to_insert: continue
+        # Vault entries first, under the leads' _ids, as save_lead does
+        pairs = [split_lead(doc, dept) for doc in to_insert]
+        leads = [lead for lead, _ in pairs]
+        for lead in leads: lead["_id"] = ObjectId()
+        secrets = [{"_id": lead["_id"], "dept": dept, **fields, "updated_at": utc_now()} for lead, fields in pairs if fields is not None]
+        if secrets: vault.insert_many(secrets, ordered=False)
+        try:
+            col.insert_many(leads, ordered=False)
+            inserted = leads
+        except BulkWriteError as e:
+            failed = {err["index"] for err in e.details.get("writeErrors", [])}
+            for index in sorted(failed):
+                note("errors", {"line": None, "record_id": leads[index]["record_id"], "message": "Write failed"})
+            inserted = [doc for i, doc in enumerate(leads) if i not in failed]
+            if secrets: vault.delete_many({"_id": {"$in": [leads[i]["_id"] for i in failed]}})
+        report["inserted"] += len(inserted)
+        ops = rollup_ops(dept, [(None, doc) for doc in inserted])
+        if ops: rollups.bulk_write(ops, ordered=False)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-import leads from a CSV file")
+    parser.add_argument("dept", choices=list(DEPARTMENTS))
+    parser.add_argument("path", help="CSV file, or - for stdin")
+    parser.add_argument("--no-header", action="store_true", help="Rows are positional in the sheet column layout")
+    parser.add_argument("--on-duplicate", choices=["skip", "insert"], default="skip")
+    parser.add_argument("--dry-run", action="store_true", help="Validate and report without writing")
+    args = parser.parse_args(argv)
+
+    text = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8-sig", newline="") if args.path == "-" \
+        else open(args.path, encoding="utf-8-sig", newline="")
+    with text:
+        report = import_leads(args.dept, text, header=not args.no_header, on_duplicate=args.on_duplicate, dry_run=args.dry_run)
+    for entry in report["errors"]: print(f"error     line {entry['line']}: {entry['message']}")
+    for entry in report["duplicates"]: print(f"duplicate line {entry['line']}: {entry['record_id']}")
+    verb = "Validated" if args.dry_run else "Imported"
+    print(f"{verb} {report['rows']} row(s) into {args.dept}: {report['inserted']} inserted, "
+          f"{report['duplicate_count']} duplicate(s), {report['error_count']} error(s).")
+    return 1 if report["error_count"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
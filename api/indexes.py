@@ -0,0 +1,128 @@
+import sys
+from datetime import datetime, timedelta
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from api.db import get_collection, DEPARTMENTS, ARCHIVE_SUFFIX
+from api.pagination import DELETED_COLLECTION
+from api.search import tier_filter
+
+# ==========================================
+# INDEX MANAGEMENT
+# ==========================================
+# ensure_indexes() runs at app startup and is idempotent (create_index is a
+# no-op when the same index already exists). `python -m api.indexes check`
+# explains every hot query and fails if any of them falls back to COLLSCAN.
+
+LEAD_INDEXES = [
+    IndexModel([("record_id", ASCENDING)], name="record_id"),
+    IndexModel([("created_at", DESCENDING)], name="created_at_desc"),
+    IndexModel([("status", ASCENDING), ("created_at", DESCENDING)], name="status_created_at"),
+    IndexModel([("agent", ASCENDING), ("created_at", DESCENDING)], name="agent_created_at"),
+    IndexModel([("updated_at", DESCENDING)], name="updated_at_desc"),
+    # Lead search (api/search.py): exact token and prefix ranges, newest first
+    IndexModel([("search_keys", ASCENDING), ("created_at", DESCENDING)], name="search_keys_created_at"),
+]
+
+# Archived leads (api/archive.py) are only looked up by id and read by date range
+ARCHIVE_INDEXES = [
+    IndexModel([("record_id", ASCENDING)], name="record_id"),
+    IndexModel([("created_at", DESCENDING)], name="created_at_desc"),
+    IndexModel([("status", ASCENDING), ("created_at", DESCENDING)], name="status_created_at"),
+    IndexModel([("agent", ASCENDING), ("created_at", DESCENDING)], name="agent_created_at"),
+]
+
+INDEXES = {
+    **{name: LEAD_INDEXES for name in DEPARTMENTS.values()},
+    **{name + ARCHIVE_SUFFIX: ARCHIVE_INDEXES for name in DEPARTMENTS.values()},
+    "twh_chargebacks": [
+        IndexModel([("created_at", DESCENDING)], name="created_at_desc"),
+    ],
+    "shift_rollups": [
+        IndexModel([("shift_date", DESCENDING), ("dept", ASCENDING)], name="shift_date_dept"),
+    ],
+    "outbox": [
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="status_next_attempt"),
+        IndexModel([("delivered_at", ASCENDING)], name="delivered_at_ttl", expireAfterSeconds=3 * 24 * 3600),
+    ],
+    # Tombstones only need to outlive the longest gap between manager syncs
+    DELETED_COLLECTION: [
+        IndexModel([("deleted_at", ASCENDING)], name="deleted_at_ttl", expireAfterSeconds=7 * 24 * 3600),
+        IndexModel([("dept", ASCENDING), ("deleted_at", ASCENDING)], name="dept_deleted_at"),
+    ],
+}
+
+
+def ensure_indexes():
+    """Creates any missing index. Returns {collection: [index names]}."""
+    created = {}
+    for col_name, models in INDEXES.items():
+        try:
+            created[col_name] = get_collection(col_name).col.create_indexes(models)
+        except Exception as e:
+            print(f"Index Error ({col_name}): {e}")
+    return created
+
+
+def hot_queries():
+    """(collection, filter, sort, label) for every query the routes run on a hot path."""
+    now = datetime.utcnow()
+    window = {"$gte": now - timedelta(hours=10), "$lte": now}
+    queries = []
+    for col_name in DEPARTMENTS.values():
+        queries += [
+            (col_name, {"record_id": "0"}, None, "lookup by record_id"),
+            (col_name, {}, [("created_at", -1), ("_id", -1)], "recent leads"),
+            (col_name, {"updated_at": {"$gte": now}}, [("created_at", -1), ("_id", -1)], "manager delta sync"),
+            (col_name, {"status": "Pending"}, None, "pending count"),
+            (col_name, {"status": "Charged", "created_at": window}, None, "shift stats"),
+            (col_name, {"agent": "x", "created_at": window}, [("created_at", -1)], "agent shift"),
+            (col_name, tier_filter(["smith"], "exact"), [("created_at", -1), ("_id", -1)], "search exact"),
+            (col_name, tier_filter(["smi"], "prefix"), [("created_at", -1), ("_id", -1)], "search prefix"),
+            (col_name + ARCHIVE_SUFFIX, {"record_id": "0"}, None, "archive lookup by record_id"),
+            (col_name + ARCHIVE_SUFFIX, {}, [("created_at", -1), ("_id", -1)], "archive recent leads"),
+        ]
+    queries.append(("twh_chargebacks", {}, [("created_at", -1)], "recent chargebacks"))
+    queries.append((DELETED_COLLECTION, {"dept": {"$in": list(DEPARTMENTS)}, "deleted_at": {"$gte": now}}, None, "deleted since"))
+    return queries
+
+
+def _stages(plan):
+    """Yields every stage name inside an explain() plan tree."""
+    if isinstance(plan, dict):
+        if "stage" in plan: yield plan["stage"]
+        for value in plan.values(): yield from _stages(value)
+    elif isinstance(plan, list):
+        for item in plan: yield from _stages(item)
+
+
+def find_collscans():
+    """Explains each hot query; returns the ones whose winning plan scans the collection."""
+    failures = []
+    for col_name, query, sort, label in hot_queries():
+        cursor = get_collection(col_name).col.find(query)
+        if sort: cursor = cursor.sort(sort)
+        plan = cursor.limit(1000).explain().get("queryPlanner", {}).get("winningPlan", {})
+        if "COLLSCAN" in set(_stages(plan)):
+            failures.append((col_name, label, query))
+    return failures
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else "check"
+    if command == "ensure":
+        for col_name, names in ensure_indexes().items():
+            print(f"{col_name}: {', '.join(names)}")
+        return 0
+    if command == "check":
+        ensure_indexes()
+        failures = find_collscans()
+        for col_name, label, query in failures:
+            print(f"COLLSCAN: {col_name} [{label}] {query}")
+        print(f"{len(hot_queries())} hot queries explained, {len(failures)} COLLSCAN.")
+        return 1 if failures else 0
+    print("usage: python -m api.indexes [ensure|check]")
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
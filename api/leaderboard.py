@@ -0,0 +1,156 @@
+import json
+import hashlib
+from collections import OrderedDict
+
+# ==========================================
+# LIVE LEADERBOARD (SERVER-COMPUTED RANKINGS)
+# ==========================================
+# Agent and department rankings, team-goal progress and the last move of each
+# entry, computed from the shift stats (api/shift_totals.py rollups) instead of
+# in every browser. A board looks like:
+#   {version, shift_date,
+#    agents:      [{dept, name, amount, rank, dept_rank, delta, moved}],   <- by rank
+#    departments: [{dept, total, rank, goal, progress, reached, delta, moved}]}
+# Ranks are competition ranks (ties share a rank, the next one is skipped).
+# `delta` is how much the amount changed and `moved` how many places the rank
+# rose (negative: fell) the last time that entry changed.
+#
+# `version` hashes amounts and ranks only, so every worker computing the same
+# standings arrives at the same version. since(version) answers a client with
+# just the entries that changed after it, when that version is still in the
+# recent history, else with the full board.
+
+LEADERBOARD_HISTORY = 32
+DEFAULT_GOALS = "billing=1000"
+
+
+def parse_goals(value):
+    """"billing=1000,insurance=500" -> {"billing": 1000.0, "insurance": 500.0}. Bad entries are skipped."""
+    goals = {}
+    for part in (value or "").split(","):
+        dept, _, amount = part.partition("=")
+        try:
+            goals[dept.strip()] = float(amount)
+        except ValueError:
+            continue
+    return {d: g for d, g in goals.items() if d and g > 0}
+
+def competition_ranks(amounts):
+    """Amounts sorted descending -> ranks, e.g. [50, 20, 20, 5] -> [1, 2, 2, 4]."""
+    ranks = []
+    for i, amount in enumerate(amounts):
+        ranks.append(ranks[-1] if i and amount == amounts[i - 1] else i + 1)
+    return ranks
+
+def _agent_key(entry):
+    return (entry["dept"], entry["name"])
+
+def _carry_moves(entries, previous, key, amount_field):
+    """Sets delta / moved on entries that changed since `previous`, keeps the last move on the rest."""
+    before = {key(e): e for e in previous}
+    for entry in entries:
+        old = before.get(key(entry))
+        if old is None:
+            entry["delta"], entry["moved"] = entry[amount_field], 0
+        elif old[amount_field] != entry[amount_field] or old["rank"] != entry["rank"]:
+            entry["delta"] = round(entry[amount_field] - old[amount_field], 2)
+            entry["moved"] = old["rank"] - entry["rank"]
+        else:
+            entry["delta"], entry["moved"] = old["delta"], old["moved"]
+
+
+def build_board(shift_date, stats, goals, previous=None):
+    """
+    stats: {dept: format_stats() output}. `previous` (the last board of the same
+    shift) supplies delta / moved for entries that have not changed since.
+    """
+    agents = sorted(
+        ({"dept": dept, "name": name, "amount": round(float(amount), 2)}
+         for dept, s in stats.items() for name, amount in (s.get("breakdown") or {}).items()),
+        key=lambda e: (-e["amount"], e["name"].lower(), e["dept"])
+    )
+    for entry, rank in zip(agents, competition_ranks([e["amount"] for e in agents])):
+        entry["rank"] = rank
+    per_dept = {}
+    for entry in agents:
+        per_dept.setdefault(entry["dept"], []).append(entry)
+    for dept_agents in per_dept.values():
+        for entry, rank in zip(dept_agents, competition_ranks([e["amount"] for e in dept_agents])):
+            entry["dept_rank"] = rank
+
+    departments = sorted(
+        ({"dept": dept, "total": round(float(s.get("total") or 0), 2)} for dept, s in stats.items()),
+        key=lambda e: (-e["total"], e["dept"])
+    )
+    for entry, rank in zip(departments, competition_ranks([e["total"] for e in departments])):
+        goal = goals.get(entry["dept"])
+        entry.update({
+            "rank": rank,
+            "goal": goal,
+            "progress": round(entry["total"] / goal, 4) if goal else None,
+            "reached": bool(goal) and entry["total"] >= goal
+        })
+
+    same_shift = previous if previous and previous["shift_date"] == shift_date else None
+    _carry_moves(agents, same_shift["agents"] if same_shift else [], _agent_key, "amount")
+    _carry_moves(departments, same_shift["departments"] if same_shift else [], lambda e: e["dept"], "total")
+
+    standings = [shift_date,
+                 [(e["dept"], e["name"], e["amount"], e["rank"]) for e in agents],
+                 [(e["dept"], e["total"], e["goal"]) for e in departments]]
+    version = hashlib.md5(json.dumps(standings).encode()).hexdigest()[:16]
+    return {"version": version, "shift_date": shift_date, "agents": agents, "departments": departments}
+
+
+def diff_boards(old, new):
+    """Entries of `new` whose amount or rank differ from `old`, plus the agents that left it."""
+    before = {_agent_key(e): e for e in old["agents"]}
+    after = {_agent_key(e) for e in new["agents"]}
+    dept_before = {e["dept"]: e for e in old["departments"]}
+    return {
+        "mode": "delta",
+        "base": old["version"],
+        "version": new["version"],
+        "shift_date": new["shift_date"],
+        "agents": [e for e in new["agents"]
+                   if _agent_key(e) not in before
+                   or (before[_agent_key(e)]["amount"], before[_agent_key(e)]["rank"]) != (e["amount"], e["rank"])],
+        "departments": [e for e in new["departments"]
+                        if e["dept"] not in dept_before
+                        or (dept_before[e["dept"]]["total"], dept_before[e["dept"]]["rank"], dept_before[e["dept"]]["goal"]) != (e["total"], e["rank"], e["goal"])],
+        "removed": [{"dept": d, "name": n} for d, n in before if (d, n) not in after]
+    }
+
+
+class Leaderboard:
+    """The current board and the last LEADERBOARD_HISTORY versions (per process)."""
+
+    def __init__(self, goals, history=LEADERBOARD_HISTORY):
+        self.goals = goals
+        self.history_size = history
+        self.history = OrderedDict()
+        self.current = None
+
+    def update(self, shift_date, stats):
+        """
+        Recomputes the board. Returns None when the standings did not change,
+        else what a client holding the previous version needs: a delta, or the
+        full board for the first board of a process or shift.
+        """
+        board = build_board(shift_date, stats, self.goals, self.current)
+        previous = self.current
+        if previous and previous["version"] == board["version"]: return None
+        self.current = board
+        self.history[board["version"]] = board
+        self.history.move_to_end(board["version"])
+        while len(self.history) > self.history_size: self.history.popitem(last=False)
+        if previous is None or previous["shift_date"] != shift_date:
+            return {"mode": "full", **board}
+        return diff_boards(previous, board)
+
+    def since(self, version):
+        """Response for a client holding `version`: a delta if it is known and of this shift, else the full board."""
+        old = self.history.get(version) if version else None
+        if old is None or old["shift_date"] != self.current["shift_date"]:
+            return {"mode": "full", **self.current}
+        return diff_boards(old, self.current)
@@ -1,58 +1,94 @@
+import io
 import os
 import json
-import gspread
 import pytz
-import requests
 import hashlib
 import time as time_module
+import asyncio
 from datetime import datetime, timedelta, time
-from fastapi import FastAPI, Request, Form
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, Request, Response, Form, BackgroundTasks, UploadFile, File, WebSocket
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from typing import Optional
 from dotenv import load_dotenv
-import pusher
-from pymongo import MongoClient
 from bson import ObjectId
+from fastapi import HTTPException
+from api.db import get_collection, get_lead_collection, get_archive_collection, DEPARTMENTS, CHARGED_ONLY_DEPTS
+from api.cache import TTLCache
+from api.shift_totals import TZ_KARACHI, shift_start_for, apply_lead_change, apply_lead_changes, get_shift_totals, get_rollups, get_latest_rollups, run_finalizer
+from api.indexes import ensure_indexes
+from api.changes import delta_events
+from api.chat import create_chat_backend, allow_message
+from api.auth import auth_configured, verify_password, issue_token, verify_token
+from api.outbox import enqueue, drain as drain_outbox, handler as outbox_handler, batch_handler as outbox_batch_handler, run_worker as run_outbox_worker, metrics as outbox_metrics, requeue_dead as requeue_dead_outbox_messages
+from api.pagination import NEWEST_FIRST, DELETED_COLLECTION, encode_cursor, cursor_filter, parse_since, sync_token, utc_now
+from api.export import SHEET_COLUMNS, sheet_row, export_filter, export_stream, parse_range_bound
+from api.importer import parse_charge, import_leads
+from api.models import VAULT_DEPTS, FastJSONResponse, lead_projection, lead_to_wire, lead_detail_to_wire, chargeback_to_wire, v1_row, v1_detail, v1_chargeback
+from api.metrics import MetricsMiddleware, external_call, metrics_response
+from api.events import CHAT_CHANNEL, MANAGER_CHANNEL, LEADERBOARD_CHANNEL, PUSHER_BATCH_SIZE_MESSAGES, PUSHER_BATCH_WAIT, lead_channels, publish, publish_items, deliver as deliver_pusher
+from api.hub import HUB, HubClient, parse_channels, sse_events, serve_websocket
+from api.search import SEARCH_FIELDS, SEARCH_PAGE_SIZE, search_keys, search_leads
+from api.leaderboard import DEFAULT_GOALS, Leaderboard, parse_goals
+from api.archive import ARCHIVE_AFTER_SHIFTS, run_archiver
+from api.vault import VAULT_FIELDS, split_lead, unset_inline, save_secrets, delete_secrets, with_secrets
+from contextlib import asynccontextmanager
+from pymongo import UpdateOne, DeleteOne
+from starlette.concurrency import run_in_threadpool
 
 load_dotenv()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    # Idempotent setup (missing indexes, capped chat collection) runs in the background so it never delays the first response
+    asyncio.create_task(run_in_threadpool(ensure_indexes))
+    if hasattr(CHAT_STORE, "ensure_collection"):
+        asyncio.create_task(run_in_threadpool(CHAT_STORE.ensure_collection))
+    # Retries and anything left over from a previous process
+    worker = asyncio.create_task(run_outbox_worker())
+    # Closed shifts get their rollups recomputed and stamped off the request path
+    finalizer = asyncio.create_task(run_finalizer())
+    # Old leads move to the archive tier (api/archive.py) when ARCHIVE_AFTER_SHIFTS is set
+    archiver = asyncio.create_task(run_archiver()) if ARCHIVE_AFTER_SHIFTS else None
+    yield
+    worker.cancel()
+    finalizer.cancel()
+    if archiver: archiver.cancel()
+
+app = FastAPI(lifespan=lifespan)
+# Per-route latency, in-flight requests and opt-in profiling; served at /metrics
+app.add_middleware(MetricsMiddleware)
 
 # --- SECURITY: LOAD SECRETS -
 PUSHER_APP_ID = os.getenv("PUSHER_APP_ID")
 PUSHER_KEY = os.getenv("PUSHER_KEY")
 PUSHER_SECRET = os.getenv("PUSHER_SECRET")
 PUSHER_CLUSTER = os.getenv("PUSHER_CLUSTER")
-MONGO_URI = os.getenv("MONGO_URI")
-
-pusher_client = pusher.Pusher(
-  app_id=PUSHER_APP_ID,
-  key=PUSHER_KEY,
-  secret=PUSHER_SECRET,
-  cluster=PUSHER_CLUSTER,
-  ssl=True
-)
-
-# --- MONGODB SETUP ---
-try:
-    mongo_client = MongoClient(MONGO_URI)
-    db = mongo_client["twh_portal"]
-    
-    billing_col = db["billing"]
-    insurance_col = db["insurance"]
-    telecom_col = db["telecom"]
-    design_col = db["design"]
-    ebook_col = db["ebook"]
-    
-    print("Connected to MongoDB successfully.")
-except Exception as e:
-    print(f"MongoDB Connection Error: {e}")
+
+# "pusher" (default) or "hub": events go to browsers connected to this process (api/hub.py)
+REALTIME_BACKEND = os.getenv("REALTIME_BACKEND", "pusher").lower()
+
+# Created on first trigger so page-only cold starts skip it
+pusher_client = None
+
+def get_pusher():
+    global pusher_client
+    if pusher_client is None and REALTIME_BACKEND == "hub":
+        pusher_client = HubClient(HUB)
+    if pusher_client is None:
+        import pusher
+        pusher_client = pusher.Pusher(
+          app_id=PUSHER_APP_ID,
+          key=PUSHER_KEY,
+          secret=PUSHER_SECRET,
+          cluster=PUSHER_CLUSTER,
+          ssl=True
+        )
+    return pusher_client
 
 # --- CHAT SETUP ---
-CHAT_HISTORY = []
-CHAT_RATE_LIMIT = {"start": 0, "count": 0}
+CHAT_STORE, CHAT_LIMITER = create_chat_backend()
 
 # --- SETUP DIRECTORIES ---
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -63,8 +99,9 @@ TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 STATIC_DIR = os.path.join(BASE_DIR, "static")
 
 templates = Jinja2Templates(directory=TEMPLATES_DIR)
+# Pages load static/js/realtime.js instead of the Pusher client in hub mode
+templates.env.globals["realtime_backend"] = REALTIME_BACKEND
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
-TZ_KARACHI = pytz.timezone("Asia/Karachi")
 
 # --- SHEETS SETUP ---
 gc = None
@@ -74,6 +111,7 @@ SHEET_NEW = "E-Books and Design from Portal"
 def get_gc():
     global gc
     try:
+        import gspread
         service_file = os.getenv("GOOGLE_SERVICE_ACCOUNT_FILE")
         service_json = os.getenv("GCP_SERVICE_ACCOUNT") 
         if service_file and os.path.exists(service_file):
@@ -85,28 +123,62 @@ def get_gc():
         gc = None
     return gc
 
+# Opened spreadsheets / worksheets, reused until an API call fails (see reset_sheets)
+SPREADSHEETS = {}
+WORKSHEETS = {}
+
+def reset_sheets():
+    """Drops the client and every cached handle so the next call reconnects."""
+    global gc
+    gc = None
+    SPREADSHEETS.clear()
+    WORKSHEETS.clear()
+
+def open_spreadsheet(name):
+    if name not in SPREADSHEETS:
+        with external_call("sheets", "open"):
+            SPREADSHEETS[name] = gc.open(name)
+    return SPREADSHEETS[name]
+
 def get_worksheet(sheet_type):
     global gc
+    if sheet_type in WORKSHEETS: return WORKSHEETS[sheet_type]
     if not gc: get_gc()
     if not gc: return None
     
     try:
+        ws = None
         if sheet_type in ['billing', 'insurance', 'auth']:
-            sh = gc.open(SHEET_MAIN)
-            if sheet_type == 'billing': return sh.get_worksheet(0)
-            if sheet_type == 'insurance': return sh.get_worksheet(1)
-            if sheet_type == 'auth': return sh.get_worksheet(2)
+            sh = open_spreadsheet(SHEET_MAIN)
+            if sheet_type == 'billing': ws = sh.get_worksheet(0)
+            if sheet_type == 'insurance': ws = sh.get_worksheet(1)
+            if sheet_type == 'auth': ws = sh.get_worksheet(2)
             
         if sheet_type in ['design', 'ebook']:
-            sh = gc.open(SHEET_NEW)
-            if sheet_type == 'design': return sh.worksheet("Design")
-            if sheet_type == 'ebook': return sh.worksheet("Ebook")
+            sh = open_spreadsheet(SHEET_NEW)
+            if sheet_type == 'design': ws = sh.worksheet("Design")
+            if sheet_type == 'ebook': ws = sh.worksheet("Ebook")
+
+        if ws: WORKSHEETS[sheet_type] = ws
+        return ws
             
     except Exception as e:
         print(f"Sheet Access Error ({sheet_type}): {e}")
-        gc = None 
+        reset_sheets()
         return None
-    return None
+
+def with_worksheet(sheet_type, fn, operation="call"):
+    """Runs fn(ws) on the cached worksheet; on failure (e.g. expired auth) reconnects and retries once."""
+    for attempt in range(2):
+        ws = get_worksheet(sheet_type)
+        if not ws: raise Exception(f"Worksheet unavailable ({sheet_type})")
+        try:
+            with external_call("sheets", operation):
+                return fn(ws)
+        except Exception as e:
+            print(f"Sheet Call Error ({sheet_type}): {e}")
+            reset_sheets()
+            if attempt == 1: raise
 
 # --- CONSTANTS ---
 AGENTS_BILLING = ["Arham Kaleem", "Arham Ali", "Haziq", "Hasnain"]
@@ -115,88 +187,182 @@ AGENTS_INSURANCE = ["Saad"]
 AGENTS_DESIGN = ["Taha"]
 AGENTS_EBOOK = ["Huzaifa","Asad"]
 
+DEPT_AGENTS = {
+    'billing': AGENTS_BILLING,
+    'telecom': AGENTS_TELECOM,
+    'insurance': AGENTS_INSURANCE,
+    'design': AGENTS_DESIGN,
+    'ebook': AGENTS_EBOOK
+}
+
 PROVIDERS = ["Spectrum", "Insurance", "Xfinity", "Frontier", "Optimum"]
 LLC_SPEC = ["Secure Claim Solutions", "Visionary Pathways", "TS"]
 LLC_INS = ["Secure Claim Solutions"]
 
+# Fields the design/ebook "recent leads" tables render (the manager gets the full wire model, see api/models.py)
+RECENT_FIELDS = ("_id", "record_id", "agent", "client_name", "provider", "charge_str", "status", "timestamp_str", "created_at")
+MANAGER_PAGE_SIZE = 1000
+
 # --- UTILS ---
 def send_pushbullet(title, body):
+    # Raises on failure so the outbox retries it
     token = os.getenv("PUSHBULLET_TOKEN")
     if not token: return
-    try:
-        requests.post("https://api.pushbullet.com/v2/pushes", 
-                      json={"type": "note", "title": title, "body": body}, 
-                      headers={"Access-Token": token, "Content-Type": "application/json"})
-    except: pass
+    import requests
+    with external_call("pushbullet", "push"):
+        res = requests.post("https://api.pushbullet.com/v2/pushes", 
+                            json={"type": "note", "title": title, "body": body}, 
+                            headers={"Access-Token": token, "Content-Type": "application/json"},
+                            timeout=10)
+        res.raise_for_status()
+
+def sheets_configured():
+    return bool(os.getenv("GOOGLE_SERVICE_ACCOUNT_FILE") or os.getenv("GCP_SERVICE_ACCOUNT"))
+
+# --- OUTBOX HANDLERS (run by api/outbox.py, off the request path) ---
+# New-lead rows are coalesced per worksheet: flushed when SHEETS_BATCH_SIZE rows
+# are waiting or the oldest has waited SHEETS_BATCH_WAIT seconds.
+SHEETS_BATCH_SIZE = int(os.getenv("SHEETS_BATCH_SIZE", "20"))
+SHEETS_BATCH_WAIT = float(os.getenv("SHEETS_BATCH_WAIT", "5"))
+
+@outbox_batch_handler("sheet_append", SHEETS_BATCH_SIZE, SHEETS_BATCH_WAIT)
+def deliver_sheet_rows(payloads):
+    if not sheets_configured(): return
+    # A batch always belongs to one group, i.e. one worksheet
+    sheet_type = payloads[0]["sheet_type"]
+    rows = [p["row"] for p in payloads]
+    with_worksheet(sheet_type, lambda ws: ws.append_rows(rows), "append_rows")
+
+# Realtime events are coalesced for PUSHER_BATCH_WAIT and sent with trigger_batch (api/events.py)
+@outbox_batch_handler("pusher", PUSHER_BATCH_SIZE_MESSAGES, PUSHER_BATCH_WAIT)
+def deliver_pusher_events(payloads):
+    deliver_pusher(get_pusher(), payloads)
+
+@outbox_handler("pushbullet")
+def deliver_pushbullet(payload):
+    send_pushbullet(payload["title"], payload["body"])
 
 def get_timestamp():
     now = datetime.now(TZ_KARACHI)
     return now.strftime("%Y-%m-%d"), now.strftime("%Y-%m-%d %H:%M:%S"), now
 
 def get_shift_start_time():
-    now = datetime.now(TZ_KARACHI)
     # If it's before 8 PM (e.g., 4 AM), the shift started yesterday at 8 PM
-    if now.hour < 20:
-        start = (now - timedelta(days=1)).replace(hour=20, minute=0, second=0, microsecond=0)
-    else:
-        # If it's after 8 PM, the shift started today at 8 PM
-        start = now.replace(hour=20, minute=0, second=0, microsecond=0)
-    return start
+    # If it's after 8 PM, the shift started today at 8 PM
+    return shift_start_for(datetime.now(TZ_KARACHI))
 
-def calculate_mongo_stats(collection, dept_type):
-    try:
-        start_time = get_shift_start_time()
-        
-        # LOGIC: 8 PM to 6 AM = 10 Hours exactly
-        end_time = start_time + timedelta(hours=10)
-        
-        # Status Rules:
-        # Billing/Insurance -> Count 'Charged' only
-        # Design/Ebook      -> Count ALL (Pending, Declined, etc.)
-        if dept_type in ['billing', 'insurance', 'telecom']:
-            status_filter = {"status": "Charged"}
-        else:
-            status_filter = {} 
+def format_stats(total, agent_totals, dept_type):
+    # --- FIX: Initialize breakdown with ALL agents set to 0 ---
+    target_agents = DEPT_AGENTS.get(dept_type, [])
+    
+    # Create dictionary with 0.0 default for everyone
+    breakdown = {agent: 0.0 for agent in target_agents}
+    
+    # Update with actual values from database
+    for agent, amount in agent_totals.items():
+        breakdown[agent] = round(amount, 2)
+    # -----------------------------------------------------------
 
-        match_query = {
-            "created_at": {"$gte": start_time, "$lte": end_time},
-            **status_filter
-        }
+    return {
+        "total": round(total, 2),
+        "breakdown": breakdown,
+        "today": round(total, 2), 
+        "night": round(total, 2)
+    }
 
-        pipeline = [
-            {"$match": match_query},
-            {"$group": {"_id": "$agent", "total": {"$sum": "$charge_amount"}}}
-        ]
-        results = list(collection.aggregate(pipeline))
-        
-        total = sum(r["total"] for r in results)
-        
-        # --- FIX: Initialize breakdown with ALL agents set to 0 ---
-        target_agents = []
-        if dept_type == 'billing': target_agents = AGENTS_BILLING
-        elif dept_type == 'insurance': target_agents = AGENTS_INSURANCE
-        elif dept_type == 'telecom': target_agents = AGENTS_TELECOM  
-        elif dept_type == 'design': target_agents = AGENTS_DESIGN
-        elif dept_type == 'ebook': target_agents = AGENTS_EBOOK
-        
-        # Create dictionary with 0.0 default for everyone
-        breakdown = {agent: 0.0 for agent in target_agents}
-        
-        # Update with actual values from database
-        for r in results:
-            breakdown[r["_id"]] = r["total"]
-        # -----------------------------------------------------------
-
-        return {
-            "total": round(total, 2),
-            "breakdown": breakdown,
-            "today": round(total, 2), 
-            "night": round(total, 2)
-        }
+async def calculate_mongo_stats(dept_type):
+    # Status Rules (applied when rollups are written, see api/shift_totals.py):
+    # Billing/Insurance/Telecom -> Count 'Charged' only
+    # Design/Ebook              -> Count ALL (Pending, Declined, etc.)
+    try:
+        shift_date = get_shift_start_time().strftime("%Y-%m-%d")
+        doc = await get_shift_totals(dept_type, shift_date) or {}
+        return format_stats(doc.get("total", 0), doc.get("agents", {}), dept_type)
 
     except Exception as e:
         print(f"Stats Error ({dept_type}): {e}")
         return {"total": 0, "breakdown": {}, "today": 0, "night": 0}
+
+async def calculate_stats_with_pending(collection, dept_type):
+    """Shift stats (one find_one on the shift rollup) plus the live Pending count."""
+    try:
+        stats, pending = await asyncio.gather(
+            calculate_mongo_stats(dept_type),
+            collection.count_documents({"status": "Pending"})
+        )
+        return {**stats, "pending": pending}
+
+    except Exception as e:
+        print(f"Stats Error ({dept_type}): {e}")
+        return {"total": 0, "breakdown": {}, "today": 0, "night": 0, "pending": 0}
+
+async def timed(timings, label, coro):
+    """Awaits coro and records its wall time (ms) under label."""
+    start = time_module.perf_counter()
+    try:
+        return await coro
+    finally:
+        timings[label] = (time_module.perf_counter() - start) * 1000
+
+def server_timing_header(timings):
+    return ", ".join(f"{label};dur={ms:.1f}" for label, ms in timings.items())
+
+# --- SHIFT STATS CACHE ---
+# Night-stats is polled by every agent page; each department's stats are computed
+# once per TTL and dropped whenever a write could change that department's totals.
+STATS_CACHE = TTLCache(int(os.getenv("NIGHT_STATS_TTL", "60")))
+
+def _stats_cache_key(dept):
+    return (dept, get_shift_start_time().isoformat())
+
+async def get_cached_shift_stats(dept):
+    """Returns (stats, etag) for the current shift."""
+    async def compute():
+        stats = await calculate_mongo_stats(dept)
+        etag = hashlib.md5(json.dumps(stats, sort_keys=True).encode()).hexdigest()
+        return stats, etag
+    return await STATS_CACHE.get_or_set(_stats_cache_key(dept), compute)
+
+def invalidate_shift_stats(dept):
+    STATS_CACHE.invalidate(_stats_cache_key(dept))
+
+async def record_lead_change(dept, before, after):
+    """Call after every lead write: moves the shift rollup, drops the cached stats and pushes leaderboard moves."""
+    await apply_lead_change(dept, before, after)
+    invalidate_shift_stats(dept)
+    await publish_leaderboard()
+
+async def record_lead_changes(dept, changes):
+    """record_lead_change for a batch of (before, after) writes to one department."""
+    if not changes: return
+    await apply_lead_changes(dept, changes)
+    invalidate_shift_stats(dept)
+    await publish_leaderboard()
+
+# --- LIVE LEADERBOARD ---
+# Rankings and team goals are computed here from the cached shift stats
+# (api/leaderboard.py); pages draw the ticker and gold mode from them.
+# LEADERBOARD_GOALS: "dept=amount,..." shift targets.
+LEADERBOARD = Leaderboard(parse_goals(os.getenv("LEADERBOARD_GOALS", DEFAULT_GOALS)))
+# Pusher rejects events over 10KB: a bigger change is announced as a reset and clients refetch
+LEADERBOARD_PUSH_MAX = 40
+
+async def refresh_leaderboard():
+    """Recomputes the board from the shift stats. Returns what changed (see Leaderboard.update) or None."""
+    results = await asyncio.gather(*(get_cached_shift_stats(dept) for dept in DEPARTMENTS))
+    shift_date = get_shift_start_time().strftime("%Y-%m-%d")
+    return LEADERBOARD.update(shift_date, {dept: stats for dept, (stats, _) in zip(DEPARTMENTS, results)})
+
+async def publish_leaderboard():
+    # A failed push never fails the write; clients catch up on their next fetch
+    try:
+        changes = await refresh_leaderboard()
+        if not changes: return
+        if changes["mode"] == "full" or len(changes["agents"]) + len(changes["departments"]) > LEADERBOARD_PUSH_MAX:
+            changes = {"mode": "reset", "version": changes["version"]}
+        await publish("leaderboard-update", changes, [LEADERBOARD_CHANNEL])
+    except Exception as e:
+        print(f"Leaderboard Error: {e}")
       
 # --- ROUTES ---
 
@@ -244,42 +410,81 @@ async def view_manager(request: Request):
     })
   
 @app.get("/api/public/night-stats")
-async def get_public_stats():
-    return {
-        "billing": calculate_mongo_stats(billing_col, 'billing'),
-        "telecom": calculate_mongo_stats(telecom_col, 'telecom'),
-        "insurance": calculate_mongo_stats(insurance_col, 'insurance'),
-        "design": calculate_mongo_stats(design_col, 'design'),
-        "ebook": calculate_mongo_stats(ebook_col, 'ebook')
-    }
+async def get_public_stats(request: Request):
+    results = await asyncio.gather(*(get_cached_shift_stats(dept) for dept in DEPARTMENTS))
+    etag = '"' + hashlib.md5("".join(tag for _, tag in results).encode()).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse({dept: stats for dept, (stats, _) in zip(DEPARTMENTS, results)}, headers=headers)
+
+@app.get("/api/live/leaderboard")
+async def get_live_leaderboard(request: Request, since: str = None):
+    """
+    Full board, or with `since` (a version the client holds) only the entries
+    that changed after it. 304 when nothing changed. Updates arrive as
+    "leaderboard-update" events on the leaderboard channel in the same shape.
+    """
+    try:
+        await refresh_leaderboard()
+    except Exception as e:
+        print(f"Leaderboard Error: {e}")
+        if LEADERBOARD.current is None:
+            return JSONResponse({"status": "error", "message": "Leaderboard unavailable"}, 500)
+    version = LEADERBOARD.current["version"]
+    etag = f'"{version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if since == version or request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(LEADERBOARD.since(since), headers=headers)
+
+# --- REALTIME HUB (REALTIME_BACKEND=hub) ---
+@app.get("/api/realtime/stream")
+async def realtime_stream(channels: str):
+    if REALTIME_BACKEND != "hub":
+        return JSONResponse({"status": "error", "message": "Realtime hub is disabled"}, 404)
+    try:
+        names = parse_channels(channels)
+    except ValueError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, 400)
+    return StreamingResponse(
+        sse_events(names), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/ws")
+async def realtime_websocket(websocket: WebSocket):
+    if REALTIME_BACKEND != "hub":
+        await websocket.close(1008)
+        return
+    await serve_websocket(websocket)
 
 # --- CHAT ENDPOINTS ---
 @app.get("/api/chat/history")
-async def get_chat_history(): return CHAT_HISTORY
+async def get_chat_history(since: int = None):
+    # `since` = the last `seq` the client has; returns only newer messages
+    return await CHAT_STORE.history(since=since)
 
 @app.post("/api/chat/send")
-async def send_chat(sender: str = Form(...), message: str = Form(...), role: str = Form(...)):
-    current_time = time_module.time()
-    if current_time - CHAT_RATE_LIMIT["start"] > 3600:
-        CHAT_RATE_LIMIT["start"] = current_time
-        CHAT_RATE_LIMIT["count"] = 0
-    if CHAT_RATE_LIMIT["count"] >= 30:
-        return JSONResponse({"status": "error", "message": "Global chat limit reached."}, 429)
-
-    CHAT_RATE_LIMIT["count"] += 1
+async def send_chat(background_tasks: BackgroundTasks, sender: str = Form(...), message: str = Form(...), role: str = Form(...)):
+    limit_error = await allow_message(CHAT_LIMITER, sender)
+    if limit_error:
+        return JSONResponse({"status": "error", "message": limit_error}, 429)
+
     t_str = datetime.now(TZ_KARACHI).strftime("%I:%M %p")
-    msg_data = {"sender": sender, "message": message, "role": role, "time": t_str}
-    
-    CHAT_HISTORY.append(msg_data)
-    if len(CHAT_HISTORY) > 50: CHAT_HISTORY.pop(0)
+    msg_data = await CHAT_STORE.append({"sender": sender, "message": message, "role": role, "time": t_str})
 
-    try: pusher_client.trigger('techware-channel', 'new-chat', msg_data)
-    except: pass
+    try:
+        await publish('new-chat', msg_data, [CHAT_CHANNEL])
+        background_tasks.add_task(drain_outbox, settle=PUSHER_BATCH_WAIT)
+    except Exception as e:
+        print(f"Chat Publish Error: {e}")
     return {"status": "success"}
 
 @app.post("/api/save-lead")
 async def save_lead(
     request: Request,
+    background_tasks: BackgroundTasks,
     type: str = Form(...), 
     is_edit: str = Form("false"),
     agent: str = Form(...),
@@ -305,8 +510,7 @@ async def save_lead(
 ):
     try:
         try:
-            clean_charge = float(str(charge_amt).replace('$', '').replace(',', '').strip())
-            final_charge_str = f"${clean_charge:.2f}"
+            clean_charge, final_charge_str = parse_charge(charge_amt)
         except: 
             clean_charge = 0.0
             final_charge_str = charge_amt 
@@ -324,12 +528,8 @@ async def save_lead(
 
         unique_id = str(order_id).strip() if type == 'billing' else str(record_id).strip()
         
-        if type == 'billing': target_col = billing_col
-        elif type == 'telecom': target_col = telecom_col  
-        elif type == 'insurance': target_col = insurance_col
-        elif type == 'design': target_col = design_col
-        elif type == 'ebook': target_col = ebook_col
-        else: return JSONResponse({"status": "error", "message": "Invalid Type"}, 400)
+        target_col = get_lead_collection(type)
+        if target_col is None: return JSONResponse({"status": "error", "message": "Invalid Type"}, 400)
 
         mongo_doc = {
             "record_id": unique_id,
@@ -352,8 +552,12 @@ async def save_lead(
             "created_at": ts_obj,
             "timestamp_str": timestamp_str,
             "date_str": date_str,
-            "type": type
+            "type": type,
+            "updated_at": utc_now()
         }
+        mongo_doc["search_keys"] = search_keys(mongo_doc)
+        # Card fields go to the vault (api/vault.py); mongo_doc stays whole for the sheet row
+        lead_doc, secrets = split_lead(mongo_doc, type)
 
         # --- CRITICAL CHANGE FOR OVERWRITING ---
         if is_edit == 'true':
@@ -366,9 +570,11 @@ async def save_lead(
             else:
                 filter_query = {"record_id": unique_id}
                 
-            result = target_col.update_one(filter_query, {"$set": mongo_doc})
-            if result.matched_count == 0:
+            before = await target_col.find_one_and_update(filter_query, {"$set": lead_doc, "$unset": unset_inline()})
+            if not before:
                  return JSONResponse({"status": "error", "message": "Record not found for update"}, 404)
+            if secrets is not None: await save_secrets(before["_id"], type, secrets)
+            await record_lead_change(type, before, {**before, **lead_doc})
         else:
             # NEW LEAD MODE: 
             # We use insert_one(). 
@@ -376,34 +582,33 @@ async def save_lead(
             # Even if the Record ID is the same.
             # Even if the Agent Name is the same.
             # It will NEVER overwrite an old lead.
-            target_col.insert_one(mongo_doc)
+            # The vault entry is written first, under the lead's _id, so a stored lead always has its card data
+            lead_doc["_id"] = ObjectId()
+            if secrets is not None: await save_secrets(lead_doc["_id"], type, secrets)
+            await target_col.insert_one(lead_doc)
+            await record_lead_change(type, None, lead_doc)
         # ----------------------------------------
 
+        # Side-effects go through the outbox; delivery starts after the response is sent
+        background_tasks.add_task(drain_outbox, settle=PUSHER_BATCH_WAIT)
+
         if is_edit != 'true':
-            ws = get_worksheet(type)
-            if ws:
-                # Append row always adds to the bottom, never overwrites
-                if type in ['billing', 'telecom']:
-                    row_data = [unique_id, agent, client_name, phone, address, email, card_holder, str(card_number), str(exp_date), str(cvc), final_charge_str, llc, provider, date_str, "Pending", timestamp_str, pin_code or account_number]
-                elif type == 'insurance':
-                   row_data = [unique_id, agent, client_name, phone, address, email, card_holder, str(card_number), str(exp_date), str(cvc), final_charge_str, llc, date_str, "Pending", timestamp_str]
-                elif type in ['design', 'ebook']:
-                    row_data = [client_name, provider, final_charge_str, date_str, timestamp_str]
-                
-                ws.append_row(row_data)
+            # Append row always adds to the bottom, never overwrites (layouts in api/export.py)
+            row_data = sheet_row(SHEET_COLUMNS[type], mongo_doc)
+            await enqueue("sheet_append", {"sheet_type": type, "row": row_data}, group=type)
 
         if is_edit == 'true':
-            pusher_client.trigger('techware-channel', 'lead-edited', {'agent': agent, 'id': unique_id, 'client': client_name, 'type': type, 'message': f"Edited by {agent}"})
+            await publish('lead-edited', {'agent': agent, 'id': unique_id, 'client': client_name, 'type': type, 'message': f"Edited by {agent}"}, lead_channels(type))
             return {"status": "success", "message": "Lead Updated"}
         else:
-            pusher_client.trigger('techware-channel', 'new-lead', {
+            await publish('new-lead', {
                 'agent': agent, 
                 'amount': final_charge_str, 
                 'client': client_name, 
                 'type': type, 
                 'message': f"New {type.title()} Lead"
-            })
-            send_pushbullet(f"New {type} Lead", f"{agent} - {final_charge_str}")
+            }, lead_channels(type))
+            await enqueue("pushbullet", {"title": f"New {type} Lead", "body": f"{agent} - {final_charge_str}"})
             return {"status": "success", "message": "Lead Saved"}
 
     except Exception as e:
@@ -419,12 +624,8 @@ async def update_field_inline(
 ):
     try:
         # Select Collection
-        if type == 'design': col = design_col
-        elif type == 'ebook': col = ebook_col
-        elif type == 'billing': col = billing_col
-        elif type == 'telecom': col = telecom_col  
-        elif type == 'insurance': col = insurance_col
-        else: return JSONResponse({"status": "error", "message": "Invalid Type"}, 400)
+        col = get_lead_collection(type)
+        if col is None: return JSONResponse({"status": "error", "message": "Invalid Type"}, 400)
 
         update_data = {}
         
@@ -443,6 +644,9 @@ async def update_field_inline(
                 update_data['charge_amount'] = 0.0
         else:
             update_data[field] = value
+        update_data['updated_at'] = utc_now()
+        # Card departments write card fields to the vault; the lead only records that it changed
+        secrets = {f: update_data.pop(f) for f in VAULT_FIELDS if f in update_data} if type in VAULT_DEPTS else None
 
         # --- THE FIX IS HERE ---
         # If we have the Unique ID (row_index), use it!
@@ -456,10 +660,19 @@ async def update_field_inline(
             # Fallback for old code
             query = {"record_id": id}
             
-        result = col.update_one(query, {"$set": update_data})
+        update = {"$set": update_data}
+        if secrets: update["$unset"] = unset_inline()
+        before = await col.find_one_and_update(query, update)
         
-        if result.matched_count == 0:
+        if not before:
             return JSONResponse({"status": "error", "message": "Record not found"}, 404)
+        if secrets:
+            # A lead stored before the split moves all its inline card fields along
+            await save_secrets(before["_id"], type, {**{f: before[f] for f in VAULT_FIELDS if f in before}, **secrets})
+        after = {**before, **update_data}
+        if set(update_data) & set(SEARCH_FIELDS):
+            await col.update_one({"_id": before["_id"]}, {"$set": {"search_keys": search_keys(after)}})
+        await record_lead_change(type, before, after)
 
         return {"status": "success"}
     except Exception as e:
@@ -468,70 +681,58 @@ async def update_field_inline(
 @app.post("/api/delete-lead")
 async def delete_lead(type: str = Form(...), id: str = Form(...), row_index: str = Form(None)):
     try:
-        if type == 'billing': col = billing_col
-        elif type == 'insurance': col = insurance_col
-        elif type == 'design': col = design_col
-        elif type == 'ebook': col = ebook_col
-        else: return {"status": "error"}
+        col = get_lead_collection(type)
+        if col is None: return {"status": "error"}
         
         # PRIORITIZE deleting by specific Row Index (Unique ID)
         if row_index and row_index != 'undefined' and row_index != '':
             try:
-                result = col.delete_one({"_id": ObjectId(row_index)})
+                deleted = await col.find_one_and_delete({"_id": ObjectId(row_index)})
             except Exception as e:
                 # Fallback to ID if ObjectId fails
-                result = col.delete_one({"record_id": str(id)})
+                deleted = await col.find_one_and_delete({"record_id": str(id)})
         else:
             # Fallback for old records without row_index
-            result = col.delete_one({"record_id": str(id)})
+            deleted = await col.find_one_and_delete({"record_id": str(id)})
 
-        if result.deleted_count > 0:
+        if deleted:
+            await delete_secrets([deleted["_id"]])
+            await record_lead_change(type, deleted, None)
+            # Tombstone so manager delta syncs can drop the row
+            await get_collection(DELETED_COLLECTION).insert_one({"dept": type, "lead_id": str(deleted["_id"]), "deleted_at": utc_now()})
             return {"status": "success", "message": "Deleted from Database"}
         return {"status": "error", "message": "ID not found in Database"}
     except Exception as e:
         return {"status": "error", "message": str(e)}
       
 @app.get("/api/get-lead")
-async def get_lead(type: str, id: str = None, limit: int = None, row_index: str = None):
+async def get_lead(type: str, id: str = None, limit: int = None, row_index: str = None, cursor: str = None, v: int = 1):
     try:
-        if type == 'billing': col = billing_col
-        elif type == 'insurance': col = insurance_col
-        elif type == 'design': col = design_col
-        elif type == 'ebook': col = ebook_col
-        else: return JSONResponse({"status": "error", "message": "Invalid Type"}, 400)
+        col = get_lead_collection(type)
+        if col is None: return JSONResponse({"status": "error", "message": "Invalid Type"}, 400)
         
         # --- CASE 1: Fetching Recent Leads (Table) ---
         if limit:
-            cursor = col.find().sort("created_at", -1).limit(limit)
-            results = []
-            for doc in cursor:
-                doc['_id'] = str(doc['_id'])
-                doc['Record_ID'] = doc.get('record_id')
-                doc['Agent'] = doc.get('agent')
-                doc['Name'] = doc.get('client_name')
-                doc['Phone'] = doc.get('phone')
-                doc['Email'] = doc.get('email')
-                doc['Address'] = doc.get('address')
-                doc['CardHolder'] = doc.get('card_holder')
-                doc['CardNumber'] = doc.get('card_number')
-                doc['ExpDate'] = doc.get('exp_date')
-                doc['CVC'] = doc.get('cvc')
-                doc['Charge'] = doc.get('charge_str')
-                doc['Provider'] = doc.get('provider')
-                doc['LLC'] = doc.get('llc')
-                doc['AccountNo'] = doc.get('account_number')
-                doc['PIN'] = doc.get('pin_code')
-                doc['Status'] = doc.get('status')
-                doc['Timestamp'] = doc.get('timestamp_str')
-                doc['row_index'] = str(doc['_id']) 
-                doc['Service'] = doc.get('provider')
-                results.append(doc)
-            return {"status": "success", "data": results}
+            try:
+                query = cursor_filter(cursor) if cursor else {}
+            except ValueError as e:
+                return JSONResponse({"status": "error", "message": str(e)}, 400)
+            docs = await col.find(query, lead_projection(type, RECENT_FIELDS), sort=NEWEST_FIRST, limit=limit)
+            # A short page ran past the oldest hot lead: continue into the archive (same keyset order)
+            if len(docs) < limit:
+                archived = await get_archive_collection(type).find(query, lead_projection(type, RECENT_FIELDS), sort=NEWEST_FIRST, limit=limit - len(docs))
+                # An interrupted move can leave a lead in both tiers for a moment
+                hot_ids = {d["_id"] for d in docs}
+                docs += [d for d in archived if d["_id"] not in hot_ids]
+            results = [lead_to_wire(doc, type) for doc in docs]
+            if v < 2: results = [v1_row(r) for r in results]
+            next_cursor = encode_cursor(docs[-1]) if len(docs) == limit else None
+            return FastJSONResponse({"status": "success", "data": results, "next_cursor": next_cursor})
 
         # --- CASE 2: Specific Selection (User clicked a duplicate) ---
         if row_index:
             try:
-                doc = col.find_one({"_id": ObjectId(row_index)})
+                doc = await col.find_one({"_id": ObjectId(row_index)}) or await get_archive_collection(type).find_one({"_id": ObjectId(row_index)})
                 if not doc: return JSONResponse({"status": "error", "message": "Specific record not found"}, 404)
                 found_docs = [doc]
             except:
@@ -539,8 +740,9 @@ async def get_lead(type: str, id: str = None, limit: int = None, row_index: str
 
         # --- CASE 3: General Search by ID ---
         elif id:
-            cursor = col.find({"record_id": str(id)})
-            found_docs = list(cursor)
+            found_docs = await col.find({"record_id": str(id)})
+            if not found_docs:
+                found_docs = await get_archive_collection(type).find({"record_id": str(id)})
             
             if len(found_docs) == 0:
                 return JSONResponse({"status": "error", "message": "Not Found"}, 404)
@@ -567,197 +769,465 @@ async def get_lead(type: str, id: str = None, limit: int = None, row_index: str
             return JSONResponse({"status": "error", "message": "No ID provided"}, 400)
 
         # --- RETURN SINGLE DOCUMENT ---
-        doc = found_docs[0]
-        data = {
-            "row_index": str(doc.get('_id')), 
-            "Agent Name": doc.get("agent"),
-            "Name": doc.get("client_name"),
-            "Client Name": doc.get("client_name"),
-            "Ph Number": doc.get("phone"),
-            "Address": doc.get("address"),
-            "Email": doc.get("email"),
-            "Card Holder Name": doc.get("card_holder"),
-            "Card Number": doc.get("card_number"),
-            "Expiry Date": doc.get("exp_date"),
-            "CVC": doc.get("cvc"),
-            "Charge Amount": doc.get("charge_str"),
-            "Charge": doc.get("charge_str"),
-            "LLC": doc.get("llc"),
-            "Provider": doc.get("provider"),
-            "Timestamp": doc.get("timestamp_str"),
-            "Status": doc.get("status"),
-            "Record_ID": doc.get("record_id"),
-            "Order ID": doc.get("record_id"),
-            "PIN Code": doc.get("pin_code"),
-            "Account Number": doc.get("account_number")
-        }
-        return {"status": "success", "data": data}
+        # The one place card fields leave the vault
+        data = lead_detail_to_wire(await with_secrets(found_docs[0], type), type)
+        return FastJSONResponse({"status": "success", "data": data if v >= 2 else v1_detail(data)})
 
     except Exception as e: 
         return JSONResponse({"status": "error", "message": str(e)}, 500)
       
+# --- MANAGER DIRECTORY ---
+# Auth sheet rows keyed by ID. Reloaded after AUTH_CACHE_TTL, or early (at most
+# once per AUTH_MISS_REFRESH seconds) when an unknown ID tries to log in.
+AUTH_CACHE = TTLCache(int(os.getenv("AUTH_CACHE_TTL", "300")))
+AUTH_MISS_REFRESH = 30
+
+def load_manager_directory():
+    records = with_worksheet('auth', lambda ws: ws.get_all_records(), "get_all_records")
+    return time_module.monotonic(), {str(r['ID']): r for r in records}
+
+async def get_manager_directory(force=False):
+    if force: AUTH_CACHE.invalidate("users")
+    return await AUTH_CACHE.get_or_set("users", lambda: run_in_threadpool(load_manager_directory))
+
+def unauthorized():
+    return JSONResponse({"status": "error", "message": "Session expired, please log in again"}, 401)
+
 @app.post("/api/manager/login")
 async def manager_login(user_id: str = Form(...), password: str = Form(...)):
+    if not auth_configured():
+        return JSONResponse({"status": "error", "message": "Login is disabled: AUTH_SECRET is not configured on the server"}, 503)
     try:
-        ws = get_worksheet('auth')
-        if not ws: raise Exception("Auth DB Error")
-        records = ws.get_all_records() 
-        user = next((r for r in records if str(r['ID']) == user_id), None)
+        loaded_at, users = await get_manager_directory()
+        user = users.get(user_id)
+        if not user and time_module.monotonic() - loaded_at > AUTH_MISS_REFRESH:
+            # Possibly added to the sheet since the last load
+            loaded_at, users = await get_manager_directory(force=True)
+            user = users.get(user_id)
         if not user: return JSONResponse({"status": "error", "message": "User not found"}, 401)
         
-        stored_pass = str(user['Password'])
-        hashed_input = hashlib.sha256(password.encode()).hexdigest()
-        if password == stored_pass or hashed_input == stored_pass:
-            return {"status": "success", "token": f"auth_{user_id}", "role": "Manager"}
+        # Slow KDF: keep it off the event loop
+        if await run_in_threadpool(verify_password, password, user['Password']):
+            return {"status": "success", "token": issue_token(user_id), "role": "Manager"}
         return JSONResponse({"status": "error", "message": "Invalid password"}, 401)
     except Exception as e:
         return JSONResponse({"status": "error", "message": str(e)}, 500)
 
+def manager_row(doc, dept, v=1):
+    row = lead_to_wire(doc, dept)
+    return row if v >= 2 else v1_row(row)
+
 @app.get("/api/manager/data")
-async def get_manager_data(token: str):
+async def get_manager_data(
+    token: str,
+    dept: str = None,
+    cursor: str = None,
+    since: str = None,
+    limit: int = MANAGER_PAGE_SIZE,
+    v: int = 1
+):
+    """
+    Full mode (default): newest `limit` rows per department, plus `next_cursor` per
+    department for keyset paging (`dept` + `cursor` fetch the next page).
+    Delta mode (`since` = a previous `sync_token`): only rows written since then,
+    plus the ids deleted since then under `deleted`.
+    Rows use the v2 wire model with `v=2`, else the v1 aliases as well.
+    """
+    if not verify_token(token): return unauthorized()
     try:
-        def clean_docs(cursor):
-            docs = []
-            for d in cursor:
-                d['_id'] = str(d['_id'])
-                d['Agent Name'] = d.get('agent')
-                d['Client Name'] = d.get('client_name')
-                d['Name'] = d.get('client_name')
-                d['Charge'] = d.get('charge_str')
-                d['Status'] = d.get('status')
-                d['Timestamp'] = d.get('timestamp_str')
-                d['Record_ID'] = d.get('record_id')
-                d['LLC'] = d.get('llc')
-                d['Provider'] = d.get('provider')
-                d['Service'] = d.get('provider', '')
-                docs.append(d)
-            return docs
-
-        bill_data = clean_docs(billing_col.find().sort("created_at", -1).limit(1000))
-        telecom_data = clean_docs(telecom_col.find().sort("created_at", -1).limit(1000))
-        ins_data = clean_docs(insurance_col.find().sort("created_at", -1).limit(1000))
-        design_data = clean_docs(design_col.find().sort("created_at", -1).limit(1000))
-        ebook_data = clean_docs(ebook_col.find().sort("created_at", -1).limit(1000))
-        
-        stats_bill = calculate_mongo_stats(billing_col, 'billing')
-        stats_telecom = calculate_mongo_stats(telecom_col, 'telecom')
-        stats_ins = calculate_mongo_stats(insurance_col, 'insurance')
-        stats_design = calculate_mongo_stats(design_col, 'design')
-        stats_ebook = calculate_mongo_stats(ebook_col, 'ebook')
-        
-        p_bill = billing_col.count_documents({"status": "Pending"})
-        p_telecom = telecom_col.count_documents({"status": "Pending"})
-        p_ins = insurance_col.count_documents({"status": "Pending"})
-        p_design = design_col.count_documents({"status": "Pending"})
-        p_ebook = ebook_col.count_documents({"status": "Pending"})
-
-        return {
-            "billing": bill_data, 
-            "telecom": telecom_data,
-            "insurance": ins_data,
-            "design": design_data,
-            "ebook": ebook_data,
-            "stats_bill": {**stats_bill, "pending": p_bill}, 
-            "stats_telecom": {**stats_telecom, "pending": p_telecom},
-            "stats_ins": {**stats_ins, "pending": p_ins},
-            "stats_design": {**stats_design, "pending": p_design},
-            "stats_ebook": {**stats_ebook, "pending": p_ebook}
-        }
+        if dept and dept not in DEPARTMENTS:
+            return JSONResponse({"status": "error", "message": "Invalid Type"}, 400)
+        if cursor and not dept:
+            return JSONResponse({"status": "error", "message": "cursor requires dept"}, 400)
+        depts = [dept] if dept else list(DEPARTMENTS)
+        limit = max(1, min(limit, MANAGER_PAGE_SIZE))
+        try:
+            page_filter = cursor_filter(cursor) if cursor else {}
+            since_dt = parse_since(since) if since and not cursor else None
+        except ValueError as e:
+            return JSONResponse({"status": "error", "message": str(e)}, 400)
+
+        # Keys the manager page reads for each department's stats block
+        stats_keys = {'billing': 'stats_bill', 'telecom': 'stats_telecom', 'insurance': 'stats_ins', 'design': 'stats_design', 'ebook': 'stats_ebook'}
+
+        # Taken before reading so nothing written during this request is skipped next time
+        next_sync = sync_token()
+        timings = {}
+
+        async def fetch_rows(row_filter):
+            tasks = [
+                timed(timings, f"{d}-rows", get_lead_collection(d).find(row_filter, lead_projection(d), sort=NEWEST_FIRST, limit=limit))
+                for d in depts
+            ]
+            return await asyncio.gather(*tasks)
+
+        # All departments are fetched concurrently: rows + stats & pending each
+        stats_task = asyncio.gather(*(
+            timed(timings, f"{d}-stats", calculate_stats_with_pending(get_lead_collection(d), d)) for d in depts
+        ))
+        if since_dt:
+            rows, stats, deleted_docs = await timed(timings, "total", asyncio.gather(
+                fetch_rows({"updated_at": {"$gte": since_dt}}),
+                stats_task,
+                get_collection(DELETED_COLLECTION).find({"dept": {"$in": depts}, "deleted_at": {"$gte": since_dt}}, {"dept": 1, "lead_id": 1})
+            ))
+            # A full page of changes means the client fell too far behind: send a full reload
+            if any(len(r) == limit for r in rows):
+                since_dt = None
+                rows = await fetch_rows({})
+        else:
+            rows, stats = await timed(timings, "total", asyncio.gather(fetch_rows(page_filter), stats_task))
+
+        data = {"mode": "delta" if since_dt else "full", "sync_token": next_sync}
+        for d, dept_rows, dept_stats in zip(depts, rows, stats):
+            data[d] = [manager_row(doc, d, v) for doc in dept_rows]
+            data[stats_keys[d]] = dept_stats
+        if since_dt:
+            data["deleted"] = {d: [t["lead_id"] for t in deleted_docs if t["dept"] == d] for d in depts}
+        else:
+            data["next_cursor"] = {d: (encode_cursor(r[-1]) if len(r) == limit else None) for d, r in zip(depts, rows)}
+
+        return FastJSONResponse(data, headers={"Server-Timing": server_timing_header(timings)})
     except Exception as e:
         print(f"Manager Data Error: {e}")
         return JSONResponse({"status": "error", "message": "Data sync failed"}, 500)
 
+def format_delta_doc(coll, doc, v=1):
+    if coll == "twh_chargebacks": return chargeback_row(doc, v)
+    return manager_row(doc, coll, v)
+
+@app.get("/api/manager/stream")
+async def manager_stream(request: Request, token: str, resume: str = None, v: int = 1):
+    """SSE feed of lead/chargeback deltas from MongoDB change streams (see api/changes.py)."""
+    if not verify_token(token): return unauthorized()
+    resume_token = request.headers.get("last-event-id") or resume
+    return StreamingResponse(
+        delta_events(request, resume_token, lambda coll, doc: format_delta_doc(coll, doc, v)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/api/manager/update_status")
 async def update_status(
+    background_tasks: BackgroundTasks,
     type: str = Form(...), 
     id: str = Form(...), 
     status: str = Form(...),
     row_index: str = Form(None)  # Added to capture the unique record ID
 ):
     try:
-        if type == 'billing': col = billing_col
-        elif type == 'telecom': col = telecom_col  
-        elif type == 'insurance': col = insurance_col
-        elif type == 'design': col = design_col
-        elif type == 'ebook': col = ebook_col
+        col = get_lead_collection(type)
+        if col is None: raise Exception("Invalid Type")
         
         # Priority: Use unique row_index (ObjectId) to distinguish between duplicates
         # Fallback: Use record_id if row_index is missing
         filter_query = {"_id": ObjectId(row_index)} if row_index else {"record_id": str(id)}
         
-        result = col.find_one_and_update(
+        # Returns the document as it was before the update
+        result = await col.find_one_and_update(
             filter_query,
-            {"$set": {"status": status}},
-            return_document=True
+            {"$set": {"status": status, "updated_at": utc_now()}}
         )
         
         if not result: raise Exception("ID not found in DB")
+        await record_lead_change(type, result, {**result, "status": status})
         
-        pusher_client.trigger('techware-channel', 'status-update', {
+        await publish('status-update', {
             'id': id, 'status': status, 'type': type,
             'agent': result.get('agent'), 'client': result.get('client_name'), 'llc': result.get('llc')
-        })
+        }, lead_channels(type, result.get('agent')))
+        background_tasks.add_task(drain_outbox, settle=PUSHER_BATCH_WAIT)
         
         return {"status": "success", "message": "Updated in Database"}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
-@app.get("/api/manager/history-totals")
-async def get_history_totals():
+# --- LEAD SEARCH ---
+# Client name / agent / record ID / email / phone, over every lead (not just the
+# rows the manager page downloaded). Ranking and index layout: api/search.py.
+
+@app.get("/api/manager/search")
+async def search(token: str, q: str, dept: str = None, cursor: str = None, limit: int = SEARCH_PAGE_SIZE, v: int = 1):
+    if not verify_token(token): return unauthorized()
+    if dept and dept not in DEPARTMENTS:
+        return JSONResponse({"status": "error", "message": "Invalid Type"}, 400)
     try:
-        def get_daily_sums(col, use_status_filter=False):
-            # 1. Apply Status Filter
-            match_stage = {"$match": {"status": "Charged"}} if use_status_filter else {"$match": {}}
-            
-            pipeline = [
-                match_stage,
-                # 2. Project data to identify the shift
-                # We shift back 8 hours to align 4 AM with the previous day's 8 PM start.
-                {"$project": {
-                    "charge_amount": 1,
-                    "created_at": 1,
-                    "hour": {"$hour": {"date": "$created_at", "timezone": "Asia/Karachi"}},
-                    "shift_date": {
-                        "$dateToString": {
-                            "format": "%Y-%m-%d",
-                            "date": {"$subtract": ["$created_at", 1000 * 60 * 60 * 8]}, 
-                            "timezone": "Asia/Karachi"
-                        }
-                    }
-                }},
-                # 3. STRICT WINDOW: 8 PM (20) to 6 AM (6)
-                # We keep hours >= 20 OR hours < 6
-                {"$match": {
-                    "$or": [{"hour": {"$gte": 20}}, {"hour": {"$lt": 6}}]
-                }},
-                # 4. Group by Shift Date
-                {"$group": {"_id": "$shift_date", "total": {"$sum": "$charge_amount"}}},
-                {"$sort": {"_id": -1}},
-                {"$limit": 30}
-            ]
-            return {doc["_id"]: doc["total"] for doc in col.aggregate(pipeline)}
+        matches, next_cursor = await search_leads(q, [dept] if dept else None, cursor, limit, projection=lead_projection)
+    except ValueError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, 400)
+    except Exception as e:
+        print(f"Search Error: {e}")
+        return JSONResponse({"status": "error", "message": "Search failed"}, 500)
+    results = [{**manager_row(doc, d, v), "dept": d, "match": tier} for d, tier, doc in matches]
+    return FastJSONResponse({"status": "success", "data": results, "next_cursor": next_cursor})
+
+# --- BULK MANAGER ACTIONS ---
+# JSON body: {"token", "items": [{"type", "row_index", "llc"?}, ...], "status"?}
+# Items are grouped per department and written with one unordered bulk_write
+# each. Every write is conditional on the lead's updated_at as read just
+# before, so a lead edited in between is reported as "conflict", not clobbered.
+BULK_MAX_ITEMS = 1000
+# Pusher rejects events over 10KB: notifications go out in chunks of this many items
+BULK_EVENT_ITEMS = 50
+
+def parse_bulk_items(body):
+    """
+    -> (results, {dept: [(index, ObjectId, item)]}). results is pre-filled for invalid
+    items and for repeats of a lead already listed, which are reported as duplicate.
+    """
+    items = body.get("items")
+    if not isinstance(items, list) or not items or len(items) > BULK_MAX_ITEMS:
+        raise ValueError(f"items must be a list of 1-{BULK_MAX_ITEMS} {{type, row_index}} objects")
+    results = [None] * len(items)
+    by_dept = {}
+    seen = set()
+    for i, item in enumerate(items):
+        item = item if isinstance(item, dict) else {}
+        results[i] = {"type": item.get("type"), "row_index": item.get("row_index")}
+        if item.get("type") not in DEPARTMENTS:
+            results[i].update(status="error", message="Invalid Type")
+            continue
+        try:
+            oid = ObjectId(item.get("row_index"))
+        except Exception:
+            results[i].update(status="error", message="Invalid Row Index")
+            continue
+        if (item["type"], oid) in seen:
+            results[i].update(status="duplicate", message="Lead already listed in this request")
+            continue
+        seen.add((item["type"], oid))
+        by_dept.setdefault(item["type"], []).append((i, oid, item))
+    return results, by_dept
+
+async def bulk_apply(dept, entries, results, build_op, done_status, was_written):
+    """
+    Runs one department's share of a bulk action. build_op(before, item) -> pymongo op;
+    was_written(current) tells, from the lead as re-read afterwards (None if gone),
+    whether our op landed. Fills results and returns [(before, item)] for written leads.
+    """
+    col = get_lead_collection(dept)
+    ids = [oid for _, oid, _ in entries]
+    found = {d["_id"]: d for d in await col.find({"_id": {"$in": ids}})}
+    ops, pending = [], []
+    for i, oid, item in entries:
+        before = found.get(oid)
+        if not before:
+            results[i].update(status="not_found", message="ID not found in Database")
+            continue
+        ops.append(build_op(before, item))
+        pending.append((i, before, item))
+    if not ops: return []
+
+    result = await col.bulk_write(ops, ordered=False)
+    applied = result.modified_count + result.deleted_count
+    # One op per lead (parse_bulk_items drops repeats), so a full count means every op landed
+    if applied == len(pending):
+        written = {before["_id"] for _, before, _ in pending}
+    else:
+        # Some conditional writes missed: look up which leads actually changed
+        current = {d["_id"]: d for d in await col.find({"_id": {"$in": [b["_id"] for _, b, _ in pending]}}, {"updated_at": 1})}
+        written = {b["_id"] for _, b, _ in pending if was_written(current.get(b["_id"]))}
+    changed = []
+    for i, before, item in pending:
+        if before["_id"] in written:
+            results[i]["status"] = done_status
+            changed.append((before, item))
+        else:
+            results[i].update(status="conflict", message="Lead changed meanwhile, reload and retry")
+    return changed
 
-        # Billing/Insurance = Charged Only | Design/Ebook = All
-        bill_sums = get_daily_sums(billing_col, use_status_filter=True)
-        telecom_sums = get_daily_sums(telecom_col, use_status_filter=True)
-        ins_sums = get_daily_sums(insurance_col, use_status_filter=True)
-        design_sums = get_daily_sums(design_col, use_status_filter=False)
-        ebook_sums = get_daily_sums(ebook_col, use_status_filter=False)
 
-        # Merge and sort dates
-        all_dates = sorted(list(set(list(bill_sums.keys()) + list(telecom_sums.keys()) + list(ins_sums.keys()) + list(design_sums.keys()) + list(ebook_sums.keys()))), reverse=True)
+def bulk_summary(results):
+    counts = {}
+    for r in results: counts[r["status"]] = counts.get(r["status"], 0) + 1
+    return {"status": "success", "counts": counts, "results": results}
+
+@app.post("/api/manager/bulk_update_status")
+async def bulk_update_status(request: Request, background_tasks: BackgroundTasks):
+    """update_status for many leads. An item's optional `llc` is set in the same write."""
+    try:
+        body = await request.json()
+        if not verify_token(body.get("token")): return unauthorized()
+        status = body.get("status")
+        if not status: return JSONResponse({"status": "error", "message": "status is required"}, 400)
+        results, by_dept = parse_bulk_items(body)
+    except ValueError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, 400)
+
+    try:
+        # Mongo keeps milliseconds and returns naive UTC: this is how our stamp reads back
+        now = utc_now()
+        stamp = now.replace(microsecond=now.microsecond // 1000 * 1000, tzinfo=None)
+        def build_op(before, item):
+            update = {"status": status, "updated_at": now}
+            if item.get("llc"): update["llc"] = item["llc"]
+            return UpdateOne({"_id": before["_id"], "updated_at": before.get("updated_at")}, {"$set": update})
+
+        depts = list(by_dept)
+        changed = await asyncio.gather(*(bulk_apply(d, by_dept[d], results, build_op, "updated", lambda cur: bool(cur) and cur.get("updated_at") == stamp) for d in depts))
+
+        events = []
+        for dept, dept_changed in zip(depts, changed):
+            await record_lead_changes(dept, [(before, {**before, "status": status}) for before, _ in dept_changed])
+            events += [{
+                'id': before.get('record_id'), 'status': status, 'type': dept,
+                'agent': before.get('agent'), 'client': before.get('client_name'), 'llc': item.get('llc') or before.get('llc')
+            } for before, item in dept_changed]
+        if events:
+            await publish_items('status-update-batch', events, lambda e: lead_channels(e['type'], e['agent']), BULK_EVENT_ITEMS)
+            background_tasks.add_task(drain_outbox, settle=PUSHER_BATCH_WAIT)
+        return bulk_summary(results)
+    except Exception as e:
+        print(f"Bulk Status Error: {e}")
+        return JSONResponse({"status": "error", "message": str(e)}, 500)
+
+@app.post("/api/manager/bulk_delete")
+async def bulk_delete(request: Request, background_tasks: BackgroundTasks):
+    """delete-lead for many leads, with tombstones for the manager delta sync."""
+    try:
+        body = await request.json()
+        if not verify_token(body.get("token")): return unauthorized()
+        results, by_dept = parse_bulk_items(body)
+    except ValueError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, 400)
+
+    try:
+        def build_op(before, item):
+            return DeleteOne({"_id": before["_id"], "updated_at": before.get("updated_at")})
+
+        depts = list(by_dept)
+        changed = await asyncio.gather(*(bulk_apply(d, by_dept[d], results, build_op, "deleted", lambda cur: cur is None) for d in depts))
+
+        now = utc_now()
+        tombstones, events = [], []
+        for dept, dept_changed in zip(depts, changed):
+            await delete_secrets([before["_id"] for before, _ in dept_changed])
+            await record_lead_changes(dept, [(before, None) for before, _ in dept_changed])
+            tombstones += [{"dept": dept, "lead_id": str(before["_id"]), "deleted_at": now} for before, _ in dept_changed]
+            events += [{'id': before.get('record_id'), 'row_index': str(before["_id"]), 'type': dept} for before, _ in dept_changed]
+        if tombstones:
+            await get_collection(DELETED_COLLECTION).insert_many(tombstones, ordered=False)
+            # Only the manager console renders deletions
+            await publish_items('leads-deleted', events, lambda e: [MANAGER_CHANNEL], BULK_EVENT_ITEMS)
+            background_tasks.add_task(drain_outbox, settle=PUSHER_BATCH_WAIT)
+        return bulk_summary(results)
+    except Exception as e:
+        print(f"Bulk Delete Error: {e}")
+        return JSONResponse({"status": "error", "message": str(e)}, 500)
+
+@app.get("/api/manager/export")
+async def export_data(
+    request: Request,
+    token: str,
+    kind: str = "leads",
+    dept: str = None,
+    format: str = "csv",
+    status: str = None,
+    agent: str = None,
+    start: str = None,
+    end: str = None,
+    gzip: bool = False
+):
+    """
+    Streams every matching row, oldest first. kind=leads|chargebacks, format=csv|ndjson.
+    `start`/`end` filter created_at ("YYYY-MM-DD" Karachi days, inclusive, or ISO datetimes).
+    CSV uses the department's sheet columns, so leads need `dept`; NDJSON without
+    `dept` covers every department. `gzip=true` downloads a .gz file; otherwise
+    the stream is gzip-encoded on the fly when the client accepts it.
+    """
+    if not verify_token(token): return unauthorized()
+    if kind not in ("leads", "chargebacks") or format not in ("csv", "ndjson"):
+        return JSONResponse({"status": "error", "message": "kind must be leads|chargebacks, format csv|ndjson"}, 400)
+    if dept and dept not in DEPARTMENTS:
+        return JSONResponse({"status": "error", "message": "Invalid Type"}, 400)
+    if kind == "leads" and format == "csv" and not dept:
+        return JSONResponse({"status": "error", "message": "CSV export of leads requires dept"}, 400)
+    try:
+        query = export_filter(parse_range_bound(start), parse_range_bound(end, end=True), status, agent)
+    except ValueError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, 400)
+
+    filename = "_".join(p for p in [dept or kind, start, end] if p) + "." + format
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    headers = {"Cache-Control": "no-store"}
+    compress = gzip or "gzip" in request.headers.get("accept-encoding", "")
+    if gzip:
+        filename += ".gz"
+        media_type = "application/gzip"
+    elif compress:
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+    headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return StreamingResponse(export_stream(kind, dept, format, query, gzip=compress), media_type=media_type, headers=headers)
+
+@app.post("/api/manager/import")
+async def import_data(
+    token: str = Form(...),
+    type: str = Form(...),
+    file: UploadFile = File(...),
+    header: bool = Form(True),
+    on_duplicate: str = Form("skip"),
+    dry_run: bool = Form(False)
+):
+    """
+    Bulk CSV import (see api/importer.py): chunked insert_many, record_id duplicates
+    reported and skipped (on_duplicate=insert keeps them), no per-row notifications.
+    """
+    if not verify_token(token): return unauthorized()
+    if type not in DEPARTMENTS: return JSONResponse({"status": "error", "message": "Invalid Type"}, 400)
+    if on_duplicate not in ("skip", "insert"):
+        return JSONResponse({"status": "error", "message": "on_duplicate must be skip|insert"}, 400)
+    try:
+        text = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+        report = await run_in_threadpool(import_leads, type, text, header, on_duplicate, dry_run)
+    except (ValueError, UnicodeDecodeError) as e:
+        return JSONResponse({"status": "error", "message": str(e)}, 400)
+    except Exception as e:
+        print(f"Import Error ({type}): {e}")
+        return JSONResponse({"status": "error", "message": "Import failed"}, 500)
+    if report["inserted"]: invalidate_shift_stats(type)
+    return {"status": "success", **report}
+
+@app.get("/api/manager/history-totals")
+async def get_history_totals(start: str = None, end: str = None, shifts: int = 30, detail: bool = False):
+    """
+    Per-shift totals served from the shift rollups (one document per shift and dept).
+    `start`/`end` ("YYYY-MM-DD" shift dates, inclusive) pick any range; otherwise
+    the latest `shifts` shifts that have data. `detail` adds counts and per-agent /
+    per-status breakdowns.
+    """
+    try:
+        if start or end:
+            try:
+                if start: datetime.strptime(start, "%Y-%m-%d")
+                if end: datetime.strptime(end, "%Y-%m-%d")
+            except ValueError:
+                return {"status": "error", "message": "Invalid Date Format"}
+            # Shift dates are ISO strings, so string bounds compare as dates
+            rollups = await get_rollups(start or "", end or "9999-12-31")
+        else:
+            rollups = await get_latest_rollups(max(1, shifts))
+
+        # Billing/Insurance/Telecom = Charged Only | Design/Ebook = All (applied when rollups are written)
+        by_date = {}
+        for doc in rollups:
+            if doc.get("dept") not in DEPARTMENTS: continue
+            by_date.setdefault(doc["shift_date"], {})[doc["dept"]] = doc
         
         history = []
-        for d in all_dates:
-            history.append({
-                "date": d,
-                "billing": round(bill_sums.get(d, 0), 2),
-                "telecom": round(telecom_sums.get(d, 0), 2),
-                "insurance": round(ins_sums.get(d, 0), 2),
-                "design": round(design_sums.get(d, 0), 2),
-                "ebook": round(ebook_sums.get(d, 0), 2),
-                "total": round(bill_sums.get(d, 0) + telecom_sums.get(d, 0) + ins_sums.get(d, 0) + design_sums.get(d, 0) + ebook_sums.get(d, 0), 2)
-            })
+        for d in sorted(by_date, reverse=True):
+            row = {"date": d}
+            for dept in DEPARTMENTS:
+                row[dept] = round(by_date[d].get(dept, {}).get("total", 0), 2)
+            row["total"] = round(sum(row[dept] for dept in DEPARTMENTS), 2)
+            if detail:
+                row["detail"] = {dept: {
+                    "count": doc.get("count", 0),
+                    "agents": {a: round(v, 2) for a, v in doc.get("agents", {}).items()},
+                    "statuses": doc.get("statuses", {}),
+                    "finalized": bool(doc.get("finalized_at"))
+                } for dept, doc in by_date[d].items()}
+            history.append(row)
             
         return {"status": "success", "data": history}
     except Exception as e:
@@ -768,7 +1238,7 @@ async def get_history_totals():
 # ==========================================
 
 # 1. New Separate Collection
-twh_cb_col = db["twh_chargebacks"]
+twh_cb_col = get_collection("twh_chargebacks")
 
 # 2. Endpoint to Copy to Chargebacks DB (Does NOT touch original)
 @app.post("/api/manager/mark_twh_chargeback")
@@ -779,18 +1249,17 @@ async def mark_twh_chargeback(
 ):
     try:
         # Select Source Collection
-        col = None
-        if dept == 'billing': col = billing_col
-        elif dept == 'insurance': col = insurance_col
-        elif dept == 'telecom': col = telecom_col
-        elif dept == 'design': col = design_col
-        elif dept == 'ebook': col = ebook_col
-
-        # Find Original Record
-        sale = col.find_one({"record_id": record_id})
-        if not sale:
-            try: sale = col.find_one({"_id": ObjectId(record_id)})
-            except: pass
+        col = get_lead_collection(dept)
+        if col is None: return {"status": "error", "message": "Invalid Department"}
+
+        # Find Original Record (hot tier first, then the archive like get-lead)
+        sale = None
+        for source in (col, get_archive_collection(dept)):
+            sale = await source.find_one({"record_id": record_id})
+            if not sale:
+                try: sale = await source.find_one({"_id": ObjectId(record_id)})
+                except: pass
+            if sale: break
             
         if not sale:
             return {"status": "error", "message": "Record not found"}
@@ -821,7 +1290,7 @@ async def mark_twh_chargeback(
             "date_str": date_str,
             "note": "Manual Copy"
         }
-        twh_cb_col.insert_one(cb_doc)
+        await twh_cb_col.insert_one(cb_doc)
 
         # NOTE: We specifically DO NOT update the original collection status.
         # The original record remains "Charged" (or whatever it was).
@@ -831,31 +1300,66 @@ async def mark_twh_chargeback(
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+def chargeback_row(doc, v=1):
+    row = chargeback_to_wire(doc)
+    return row if v >= 2 else v1_chargeback(row)
+
 # 3. Endpoint to Get Chargeback Data
 @app.get("/api/manager/twh_chargebacks")
-async def get_twh_chargebacks():
+async def get_twh_chargebacks(v: int = 1):
     try:
         # Fetch all chargebacks (sorted newest first)
-        cursor = twh_cb_col.find().sort("created_at", -1).limit(2000)
-        results = []
-        for d in cursor:
-            d['_id'] = str(d['_id'])
-            # Normalize fields for the frontend
-            d['Agent Name'] = d.get('agent')
-            d['Charge'] = f"${d.get('amount', 0)}"
-            # Return timestamp in a friendly string format
-            d['Timestamp'] = d.get('created_at').strftime("%Y-%m-%d %H:%M:%S") if d.get('created_at') else ""
-            results.append(d)
+        cursor = await twh_cb_col.find(sort=[("created_at", -1)], limit=2000)
+        results = [chargeback_row(d, v) for d in cursor]
             
-        return {"status": "success", "data": results}
+        return FastJSONResponse({"status": "success", "data": results})
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+@app.get("/api/outbox/metrics")
+async def get_outbox_metrics(token: str):
+    if not verify_token(token): return unauthorized()
+    try:
+        return {"status": "success", "data": await outbox_metrics()}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+@app.get("/metrics")
+async def get_metrics(request: Request):
+    """Prometheus scrape target. Bearer METRICS_TOKEN is required when that env var is set."""
+    expected = os.getenv("METRICS_TOKEN")
+    if expected and request.headers.get("authorization") != f"Bearer {expected}":
+        return JSONResponse({"status": "error", "message": "Unauthorized"}, 401)
+    extra = []
+    try:
+        # Queue state lives in Mongo, so it is read at scrape time
+        outbox = await outbox_metrics()
+        extra = [
+            "# HELP portal_outbox_messages Outbox messages by status.",
+            "# TYPE portal_outbox_messages gauge",
+            *(f'portal_outbox_messages{{status="{status}"}} {outbox[status]}' for status in ("pending", "processing", "dead")),
+            "# HELP portal_outbox_oldest_pending_age_seconds Age of the oldest undelivered outbox message.",
+            "# TYPE portal_outbox_oldest_pending_age_seconds gauge",
+            f"portal_outbox_oldest_pending_age_seconds {outbox['oldest_pending_age_s']}"
+        ]
+    except Exception as e:
+        print(f"Metrics Outbox Error: {e}")
+    return metrics_response(extra)
+
+@app.post("/api/outbox/requeue-dead")
+async def requeue_dead_outbox(background_tasks: BackgroundTasks, token: str = Form(...)):
+    if not verify_token(token): return unauthorized()
+    try:
+        count = await requeue_dead_outbox_messages()
+        background_tasks.add_task(drain_outbox, settle=PUSHER_BATCH_WAIT)
+        return {"status": "success", "requeued": count}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
 @app.delete("/api/posts/{post_id}")
 async def delete_post(post_id: str):
     try:
-        from bson import ObjectId
-        res = await db.posts.delete_one({"_id": ObjectId(post_id)})
+        res = await get_collection("posts").delete_one({"_id": ObjectId(post_id)})
         if res.deleted_count == 0:
             raise HTTPException(404, "Post not found")
         return {"status": "Post deleted successfully"}
@@ -0,0 +1,297 @@
+import io
+import os
+import time
+import pstats
+import cProfile
+import threading
+import contextvars
+from contextlib import contextmanager
+from pymongo import monitoring
+from starlette.routing import Match
+from starlette.responses import Response, HTMLResponse, PlainTextResponse
+from api.auth import verify_token
+
+# ==========================================
+# REQUEST INSTRUMENTATION + PROMETHEUS TEXT
+# ==========================================
+# In-process counters, gauges and histograms, rendered at /metrics in the
+# Prometheus text format (0.0.4). Values are per worker process: scrape each
+# worker, or aggregate in Prometheus. Fed by:
+#   MetricsMiddleware   per-route latency, status codes, requests in flight
+#   MongoListener       pymongo command monitoring: time per command/collection
+#   external_call()     Sheets / Pusher / Pushbullet latency and failures
+# Per-request profiling (PROFILE_REQUESTS=1, X-Profile: 1 header, valid manager
+# token) returns a profile of the request instead of its response: pyinstrument
+# HTML when it is installed, cProfile text otherwise.
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+MONGO_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+EXTERNAL_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_lock = threading.Lock()
+METRICS = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs: return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def _number(value):
+    if value == float("inf"): return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        METRICS.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with _lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value):
+        return [f"{self.name}{_labels(self.label_names, key)} {_number(value)}"]
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with _lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=HTTP_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound: entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def _render_value(self, key, value):
+        counts, total, count = value
+        lines = [
+            f"{self.name}_bucket{_labels(self.label_names, key, [('le', _number(bound))])} {n}"
+            for bound, n in zip(self.buckets, counts)
+        ]
+        lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(total)}")
+        lines.append(f"{self.name}_count{_labels(self.label_names, key)} {count}")
+        return lines
+
+
+def render(extra=()):
+    """Prometheus text exposition of every metric, plus `extra` pre-rendered lines."""
+    lines = []
+    for metric in METRICS: lines.extend(metric.render())
+    lines.extend(extra)
+    return "\n".join(lines) + "\n"
+
+
+# --- METRICS ---
+
+HTTP_REQUESTS = Counter("portal_http_requests_total", "HTTP requests by route, method and status code.", ("method", "route", "status"))
+HTTP_LATENCY = Histogram("portal_http_request_duration_seconds", "HTTP request latency until the response is complete.", ("method", "route"))
+HTTP_IN_FLIGHT = Gauge("portal_http_requests_in_flight", "HTTP requests currently being served, by route.", ("route",))
+MONGO_LATENCY = Histogram("portal_mongo_command_duration_seconds", "MongoDB command round trips.", ("command", "collection"), MONGO_BUCKETS)
+MONGO_FAILURES = Counter("portal_mongo_command_failures_total", "MongoDB commands that returned an error.", ("command", "collection"))
+EXTERNAL_LATENCY = Histogram("portal_external_call_duration_seconds", "Calls to Google Sheets, Pusher and Pushbullet.", ("service", "operation"), EXTERNAL_BUCKETS)
+PUSHER_BATCH_LENGTH = Histogram("portal_pusher_batch_events", "Events per Pusher trigger_batch call.", (), (1, 2, 3, 5, 8, 10))
+PUSHER_PUBLISH_DELAY = Histogram("portal_pusher_publish_delay_seconds", "Time from publishing an event to Pusher accepting it.", (), (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+HUB_SUBSCRIBERS = Gauge("portal_hub_connections", "Browsers connected to the in-process realtime hub.")
+HUB_MESSAGES = Counter("portal_hub_messages_total", "Events queued to hub connections (one per recipient).")
+HUB_EVICTIONS = Counter("portal_hub_evictions_total", "Hub connections dropped because their send queue was full.")
+EXTERNAL_FAILURES = Counter("portal_external_call_failures_total", "Failed calls to Google Sheets, Pusher and Pushbullet.", ("service", "operation"))
+
+
+# --- EXTERNAL CALLS ---
+
+@contextmanager
+def external_call(service, operation):
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        EXTERNAL_FAILURES.inc(service=service, operation=operation)
+        raise
+    finally:
+        EXTERNAL_LATENCY.observe(time.perf_counter() - start, service=service, operation=operation)
+
+
+# --- MONGO COMMAND MONITORING ---
+# Listeners run synchronously on the thread that issued the command; the
+# threadpool copies the request's context, so a profiled request sees its own
+# commands through _profile_commands.
+
+_profile_commands = contextvars.ContextVar("profile_commands", default=None)
+
+class MongoListener(monitoring.CommandListener):
+    def __init__(self):
+        self._pending = {}
+
+    def started(self, event):
+        # find/insert/update/aggregate name their collection; getMore carries it separately
+        target = event.command.get(event.command_name)
+        if not isinstance(target, str): target = event.command.get("collection", "")
+        self._pending[event.request_id] = target
+
+    def _finish(self, event, failed):
+        collection = self._pending.pop(event.request_id, "")
+        seconds = event.duration_micros / 1e6
+        MONGO_LATENCY.observe(seconds, command=event.command_name, collection=collection)
+        if failed: MONGO_FAILURES.inc(command=event.command_name, collection=collection)
+        commands = _profile_commands.get()
+        if commands is not None: commands.append((event.command_name, collection, seconds))
+
+    def succeeded(self, event):
+        self._finish(event, False)
+
+    def failed(self, event):
+        self._finish(event, True)
+
+MONGO_LISTENER = MongoListener()
+
+
+# --- MIDDLEWARE ---
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streamed responses (exports, SSE) are timed to their last byte."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        if wants_profile(scope):
+            return await profile_request(self.app, scope, receive, send)
+
+        route = match_route(scope)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start": status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(route=route)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec(route=route)
+            HTTP_REQUESTS.inc(method=scope["method"], route=route, status=status)
+            HTTP_LATENCY.observe(time.perf_counter() - start, method=scope["method"], route=route)
+
+def match_route(scope):
+    """Path template of the route that will serve the request (bounded label values, unlike raw paths)."""
+    app = scope.get("app")
+    for route in getattr(app, "routes", []):
+        match, _ = route.matches(scope)
+        if match == Match.FULL: return route.path
+    return "unmatched"
+
+
+# --- PROFILING ---
+
+PROFILED_PATHS = {"/api/manager/data"}
+PROFILE_HEADER = b"x-profile"
+
+def profiling_enabled():
+    return os.getenv("PROFILE_REQUESTS") == "1"
+
+def wants_profile(scope):
+    if scope["path"] not in PROFILED_PATHS or not profiling_enabled(): return False
+    if dict(scope["headers"]).get(PROFILE_HEADER) != b"1": return False
+    from urllib.parse import parse_qs
+    token = parse_qs(scope.get("query_string", b"").decode()).get("token", [None])[0]
+    return bool(token and verify_token(token))
+
+async def profile_request(app, scope, receive, send):
+    """Runs the request under a profiler and responds with the profile instead of the route's response."""
+    status = 500
+
+    async def discard(message):
+        nonlocal status
+        if message["type"] == "http.response.start": status = message["status"]
+
+    commands = []
+    token = _profile_commands.set(commands)
+    start = time.perf_counter()
+    try:
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            Profiler = None
+        if Profiler:
+            profiler = Profiler(async_mode="enabled")
+            profiler.start()
+            try:
+                await app(scope, receive, discard)
+            finally:
+                profiler.stop()
+            response = HTMLResponse(profiler.output_html())
+        else:
+            # cProfile sees the event loop thread only (threadpool work shows as waiting);
+            # the Mongo commands below cover the time spent there
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                await app(scope, receive, discard)
+            finally:
+                profiler.disable()
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(60)
+            out.write(f"\nMongo commands ({len(commands)}):\n")
+            for name, collection, seconds in commands:
+                out.write(f"  {seconds * 1000:9.2f}ms  {name} {collection}\n")
+            response = PlainTextResponse(out.getvalue())
+    finally:
+        _profile_commands.reset(token)
+
+    elapsed = time.perf_counter() - start
+    mongo_ms = sum(seconds for _, _, seconds in commands) * 1000
+    response.headers["X-Profile-Status"] = str(status)
+    response.headers["X-Profile-Mongo"] = f"{len(commands)} commands, {mongo_ms:.1f}ms"
+    response.headers["Server-Timing"] = f"total;dur={elapsed * 1000:.1f}, mongo;dur={mongo_ms:.1f}"
+    await response(scope, receive, send)
+
+
+def metrics_response(extra=()):
+    return Response(render(extra), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,147 @@
+import orjson
+from datetime import datetime
+from typing import TypedDict
+from bson import ObjectId
+from starlette.responses import JSONResponse
+
+# ==========================================
+# WIRE MODELS + FAST JSON
+# ==========================================
+# One canonical wire schema per document type: the Mongo field names, `_id` as
+# a string and datetimes as ISO-8601 UTC. Version 2 sends exactly that.
+# Version 1 (the default, `?v=1`) adds the alias keys the older pages read
+# ("Name", "Charge", "Agent Name", ...) on top, so they keep working until
+# they move to v2.
+
+WIRE_VERSION = 2
+
+
+class Lead(TypedDict, total=False):
+    _id: str
+    record_id: str
+    agent: str
+    client_name: str
+    phone: str
+    email: str
+    charge_amount: float
+    charge_str: str
+    status: str
+    provider: str
+    timestamp_str: str
+    created_at: datetime
+
+
+class CardLead(Lead, total=False):
+    """Billing / Telecom / Insurance: card-charged leads."""
+    address: str
+    card_holder: str
+    llc: str
+
+
+class CardVault(TypedDict, total=False):
+    """A card lead's sensitive fields: stored apart (api/vault.py), sent only for a single lead."""
+    card_number: str
+    exp_date: str
+    cvc: str
+    pin_code: str
+    account_number: str
+
+
+class Chargeback(TypedDict, total=False):
+    _id: str
+    original_record_id: str
+    agent: str
+    client_name: str
+    amount: float
+    dept: str
+    note: str
+    timestamp_str: str
+    created_at: datetime
+
+
+LEAD_MODELS = {"billing": CardLead, "telecom": CardLead, "insurance": CardLead, "design": Lead, "ebook": Lead}
+
+def fields_of(model):
+    return tuple(model.__annotations__)
+
+LEAD_FIELDS = {dept: fields_of(model) for dept, model in LEAD_MODELS.items()}
+VAULT_FIELDS = fields_of(CardVault)
+VAULT_DEPTS = [dept for dept, model in LEAD_MODELS.items() if model is CardLead]
+# Single-lead lookups and exports: the lead plus its vault fields
+LEAD_DETAIL_FIELDS = {dept: fields + (VAULT_FIELDS if dept in VAULT_DEPTS else ()) for dept, fields in LEAD_FIELDS.items()}
+CHARGEBACK_FIELDS = fields_of(Chargeback)
+
+def lead_projection(dept, fields=None):
+    """Mongo projection for a department's wire fields (optionally narrowed to `fields`)."""
+    return {f: 1 for f in LEAD_FIELDS[dept] if f != "_id" and (fields is None or f in fields)}
+
+
+def to_wire(doc, fields):
+    """Projects a Mongo document onto a wire model. Missing fields are left out."""
+    wire = {f: doc[f] for f in fields if f in doc}
+    if "_id" in wire: wire["_id"] = str(wire["_id"])
+    return wire
+
+def lead_to_wire(doc, dept):
+    return to_wire(doc, LEAD_FIELDS[dept])
+
+def lead_detail_to_wire(doc, dept):
+    """`doc` merged with its vault fields (api/vault.py)."""
+    return to_wire(doc, LEAD_DETAIL_FIELDS[dept])
+
+def chargeback_to_wire(doc):
+    wire = to_wire(doc, CHARGEBACK_FIELDS)
+    created_at = doc.get("created_at")
+    wire["timestamp_str"] = created_at.strftime("%Y-%m-%d %H:%M:%S") if created_at else ""
+    return wire
+
+
+# --- v1 COMPATIBILITY SHIM ---
+# alias -> canonical field, exactly the spellings the v1 responses carried
+
+V1_ROW_ALIASES = {
+    "row_index": "_id", "Record_ID": "record_id", "Agent": "agent", "Agent Name": "agent",
+    "Name": "client_name", "Client Name": "client_name", "Charge": "charge_str", "Status": "status",
+    "Timestamp": "timestamp_str", "LLC": "llc", "Provider": "provider", "Service": "provider"
+}
+
+# The single-lead lookup only ever sent aliases
+V1_DETAIL_ALIASES = {
+    "row_index": "_id", "Agent Name": "agent", "Name": "client_name", "Client Name": "client_name",
+    "Ph Number": "phone", "Address": "address", "Email": "email", "Card Holder Name": "card_holder",
+    "Card Number": "card_number", "Expiry Date": "exp_date", "CVC": "cvc", "Charge Amount": "charge_str",
+    "Charge": "charge_str", "LLC": "llc", "Provider": "provider", "Timestamp": "timestamp_str",
+    "Status": "status", "Record_ID": "record_id", "Order ID": "record_id", "PIN Code": "pin_code",
+    "Account Number": "account_number"
+}
+
+V1_CHARGEBACK_ALIASES = {"Agent Name": "agent", "Timestamp": "timestamp_str"}
+
+def v1_row(wire, aliases=V1_ROW_ALIASES):
+    return {**wire, **{alias: wire.get(field) for alias, field in aliases.items()}}
+
+def v1_detail(wire):
+    return {alias: wire.get(field) for alias, field in V1_DETAIL_ALIASES.items()}
+
+def v1_chargeback(wire):
+    row = v1_row(wire, V1_CHARGEBACK_ALIASES)
+    row["Charge"] = f"${wire.get('amount', 0)}"
+    return row
+
+
+# --- JSON ---
+
+def _default(value):
+    if isinstance(value, ObjectId): return str(value)
+    raise TypeError
+
+def dumps(content):
+    # Mongo hands datetimes back naive (UTC): serialize them with the offset
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by orjson. Return it directly to skip FastAPI's jsonable_encoder pass."""
+
+    def render(self, content):
+        return dumps(content)
@@ -0,0 +1,203 @@
+import uuid
+import asyncio
+from datetime import timedelta
+from pymongo import ReturnDocument
+from starlette.concurrency import run_in_threadpool
+from api.db import get_collection
+from api.pagination import utc_now
+
+# ==========================================
+# OUTBOX (SIDE-EFFECT DELIVERY)
+# ==========================================
+# Routes commit their Mongo write, then enqueue() the side-effects (Sheets row,
+# Pusher event, Pushbullet note) and return. Delivery happens off the request:
+# drain() runs as a background task after the response and the worker loop
+# started at app startup picks up retries. Each message is claimed atomically,
+# retried with exponential backoff, and dead-lettered after MAX_ATTEMPTS.
+# Batch kinds (see batch_handler) wait up to max_wait to coalesce with other
+# messages of the same group and are delivered together, max_size at a time.
+#
+#   {kind, group, payload, status: pending|processing|done|dead, attempts,
+#    next_attempt_at, locked_until, claim, created_at, delivered_at, last_error}
+
+OUTBOX_COLLECTION = "outbox"
+MAX_ATTEMPTS = 8
+BACKOFF_BASE_SECONDS = 2
+BACKOFF_MAX_SECONDS = 300
+LOCK_SECONDS = 60
+IDLE_POLL_SECONDS = 2
+
+HANDLERS = {}
+BATCH_HANDLERS = {}
+_wakeup = None
+
+
+def handler(kind):
+    """Registers a sync delivery function for a message kind. It must raise on failure."""
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+def batch_handler(kind, max_size, max_wait_seconds):
+    """Registers a sync function taking a list of payloads from one group. It must raise on failure."""
+    def register(fn):
+        BATCH_HANDLERS[kind] = (fn, max_size, max_wait_seconds)
+        return fn
+    return register
+
+def _outbox():
+    return get_collection(OUTBOX_COLLECTION)
+
+def _wake_worker():
+    if _wakeup is not None: _wakeup.set()
+
+async def enqueue(kind, payload, group=None):
+    now = utc_now()
+    due = now
+    if kind in BATCH_HANDLERS:
+        due = now + timedelta(seconds=BATCH_HANDLERS[kind][2])
+    await _outbox().insert_one({
+        "kind": kind, "group": group, "payload": payload, "status": "pending", "attempts": 0,
+        "next_attempt_at": due, "created_at": now
+    })
+    if kind in BATCH_HANDLERS:
+        # Size threshold: a full batch is due right away instead of after max_wait
+        waiting = {"kind": kind, "group": group, "status": "pending", "next_attempt_at": {"$gt": now}}
+        if await _outbox().count_documents(waiting) >= BATCH_HANDLERS[kind][1]:
+            await _outbox().update_many(waiting, {"$set": {"next_attempt_at": now}})
+        else:
+            # The worker would otherwise only see it on its next idle poll
+            if _wakeup is not None: asyncio.get_running_loop().call_later(BATCH_HANDLERS[kind][2], _wake_worker)
+            return
+    _wake_worker()
+
+def backoff_for(attempts):
+    return min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS ** attempts)
+
+async def claim_next():
+    """Atomically takes the oldest due message (or one whose lock expired)."""
+    now = utc_now()
+    return await _outbox().find_one_and_update(
+        {"$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "processing", "locked_until": {"$lte": now}}
+        ]},
+        {"$set": {"status": "processing", "locked_until": now + timedelta(seconds=LOCK_SECONDS)}, "$inc": {"attempts": 1}},
+        sort=[("next_attempt_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+async def claim_group(msg):
+    """Claims the rest of msg's due batch group (up to max_size in total)."""
+    max_size = BATCH_HANDLERS[msg["kind"]][1]
+    now = utc_now()
+    due = {"kind": msg["kind"], "group": msg.get("group"), "status": "pending", "next_attempt_at": {"$lte": now}}
+    candidates = await _outbox().find(due, {"_id": 1}, sort=[("next_attempt_at", 1)], limit=max_size - 1)
+    if not candidates: return []
+    claim = uuid.uuid4().hex
+    await _outbox().update_many(
+        {**due, "_id": {"$in": [c["_id"] for c in candidates]}},
+        {"$set": {"status": "processing", "claim": claim, "locked_until": now + timedelta(seconds=LOCK_SECONDS)}, "$inc": {"attempts": 1}}
+    )
+    return await _outbox().find({"claim": claim}, sort=[("next_attempt_at", 1)])
+
+async def _record_success(msgs):
+    await _outbox().update_many({"_id": {"$in": [m["_id"] for m in msgs]}}, {
+        "$set": {"status": "done", "delivered_at": utc_now()}, "$unset": {"locked_until": "", "claim": ""}
+    })
+
+async def _record_failure(msgs, error):
+    for msg in msgs:
+        attempts = msg.get("attempts", 1)
+        if attempts >= MAX_ATTEMPTS:
+            update = {"status": "dead", "last_error": str(error)}
+            print(f"Outbox Dead Letter ({msg['kind']}): {error}")
+        else:
+            update = {"status": "pending", "last_error": str(error),
+                      "next_attempt_at": utc_now() + timedelta(seconds=backoff_for(attempts))}
+        await _outbox().update_one({"_id": msg["_id"]}, {"$set": update, "$unset": {"locked_until": "", "claim": ""}})
+
+async def deliver(msg):
+    """Runs one claimed message (plus its batch group) and records the outcome. Returns how many ran."""
+    msgs = [msg]
+    try:
+        if msg["kind"] in BATCH_HANDLERS:
+            msgs += await claim_group(msg)
+            fn = BATCH_HANDLERS[msg["kind"]][0]
+            await run_in_threadpool(fn, [m["payload"] for m in msgs])
+        else:
+            fn = HANDLERS.get(msg["kind"])
+            if not fn: raise Exception(f"No handler for {msg['kind']}")
+            await run_in_threadpool(fn, msg["payload"])
+        await _record_success(msgs)
+    except Exception as e:
+        await _record_failure(msgs, e)
+    return len(msgs)
+
+async def drain(max_messages=100, settle=0):
+    """
+    Delivers due messages until none are left (or max_messages). Returns how many ran.
+    With `settle`, waits that long and drains again, so a batch window that short
+    (e.g. Pusher's) closes and is delivered without a worker.
+    """
+    ran = 0
+    for attempt in range(2 if settle else 1):
+        if attempt: await asyncio.sleep(settle)
+        while ran < max_messages:
+            msg = await claim_next()
+            if not msg: break
+            ran += await deliver(msg)
+    return ran
+
+async def run_worker():
+    """Long-running loop for servers with a lifespan (uvicorn). Cancel to stop."""
+    global _wakeup
+    _wakeup = asyncio.Event()
+    while True:
+        try:
+            await drain()
+        except Exception as e:
+            print(f"Outbox Worker Error: {e}")
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=IDLE_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+
+async def requeue_dead():
+    """Moves dead-lettered messages back to pending (after fixing the cause)."""
+    result = await _outbox().update_many(
+        {"status": "dead"},
+        {"$set": {"status": "pending", "attempts": 0, "next_attempt_at": utc_now()}}
+    )
+    _wake_worker()
+    return result.modified_count
+
+async def metrics():
+    """Queue depth per status and delivery lag in seconds."""
+    col = _outbox()
+    now = utc_now()
+    pending, processing, dead, oldest, recent = await asyncio.gather(
+        col.count_documents({"status": "pending"}),
+        col.count_documents({"status": "processing"}),
+        col.count_documents({"status": "dead"}),
+        col.find({"status": {"$in": ["pending", "processing"]}}, {"created_at": 1}, sort=[("created_at", 1)], limit=1),
+        col.find({"status": "done"}, {"created_at": 1, "delivered_at": 1}, sort=[("delivered_at", -1)], limit=100)
+    )
+
+    def age(start, end):
+        if start.tzinfo is None: start = start.replace(tzinfo=now.tzinfo)
+        if end.tzinfo is None: end = end.replace(tzinfo=now.tzinfo)
+        return (end - start).total_seconds()
+
+    lags = [age(d["created_at"], d["delivered_at"]) for d in recent if d.get("delivered_at")]
+    return {
+        "depth": pending + processing,
+        "pending": pending,
+        "processing": processing,
+        "dead": dead,
+        "oldest_pending_age_s": round(age(oldest[0]["created_at"], now), 3) if oldest else 0.0,
+        "recent_delivery_lag_avg_s": round(sum(lags) / len(lags), 3) if lags else 0.0,
+        "recent_delivery_lag_max_s": round(max(lags), 3) if lags else 0.0
+    }
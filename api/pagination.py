@@ -0,0 +1,53 @@
+import base64
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+
+# ==========================================
+# KEYSET PAGINATION + DELTA SYNC HELPERS
+# ==========================================
+# Tables page newest-first on (created_at, _id). A cursor is the last row's
+# pair, base64 encoded, so the next page is an index range instead of a skip.
+# Delta sync uses `updated_at`, stamped by every lead write.
+
+NEWEST_FIRST = [("created_at", -1), ("_id", -1)]
+
+# Writes can commit slightly after the timestamp they stamped, so each delta
+# re-reads a short overlap; clients merge rows by _id so repeats are harmless.
+SYNC_OVERLAP = timedelta(seconds=5)
+
+DELETED_COLLECTION = "deleted_leads"
+
+
+def utc_now():
+    return datetime.now(timezone.utc)
+
+def encode_cursor(doc):
+    created = doc.get("created_at")
+    if not isinstance(created, datetime): return None
+    if created.tzinfo is None: created = created.replace(tzinfo=timezone.utc)
+    raw = f"{created.isoformat()}|{doc['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def cursor_filter(token):
+    """Filter for rows strictly after `token` in NEWEST_FIRST order. Raises ValueError if malformed."""
+    try:
+        created_str, oid = base64.urlsafe_b64decode(token.encode()).decode().split("|")
+        created, oid = datetime.fromisoformat(created_str), ObjectId(oid)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    return {"$or": [
+        {"created_at": {"$lt": created}},
+        {"created_at": created, "_id": {"$lt": oid}}
+    ]}
+
+def parse_since(since):
+    """Sync token (ISO time from a previous response) -> lower bound for updated_at."""
+    try:
+        value = datetime.fromisoformat(since)
+    except Exception:
+        raise ValueError("Invalid since token")
+    if value.tzinfo is None: value = value.replace(tzinfo=timezone.utc)
+    return value - SYNC_OVERLAP
+
+def sync_token():
+    return utc_now().isoformat()
@@ -0,0 +1,157 @@
+import re
+import sys
+import asyncio
+import argparse
+from pymongo import UpdateOne
+from api.db import get_lead_collection, DEPARTMENTS
+from api.pagination import NEWEST_FIRST, encode_cursor, cursor_filter
+
+# ==========================================
+# LEAD SEARCH
+# ==========================================
+# Every lead carries `search_keys`: lowercased tokens of its client name,
+# agent, record ID, email and phone digits. A multikey index on
+# (search_keys, created_at) serves both an exact token match and an anchored
+# prefix regex as index ranges, in every department collection.
+# Results are ranked in two tiers, each newest-first across departments:
+#   exact   every query term equals a key ("smith", "5550100", "r-1042")
+#   prefix  every query term starts a key, minus the exact matches
+# A cursor is "<tier>.<keyset cursor>" (api/pagination.py), so paging never skips.
+# Leads written before this existed get their keys from:
+#   python -m api.search backfill [--all]
+
+SEARCH_FIELDS = ("client_name", "agent", "record_id", "email", "phone")
+SEARCH_MIN_CHARS = 2
+SEARCH_PAGE_SIZE = 25
+SEARCH_MAX_PAGE_SIZE = 100
+TIERS = ("exact", "prefix")
+
+_WORD = re.compile(r"[^\W_]+")
+_PHONE = re.compile(r"[\d\s().+-]+")
+
+
+def phone_digits(value):
+    digits = re.sub(r"\D", "", str(value or ""))
+    # US numbers are stored with and without the country code
+    if len(digits) == 11 and digits.startswith("1"): return [digits, digits[1:]]
+    return [digits] if digits else []
+
+def search_keys(doc):
+    """Index tokens for a lead document."""
+    keys = set()
+    for field in ("client_name", "agent"):
+        value = str(doc.get(field) or "").lower()
+        words = value.split()
+        keys.update(words)
+        keys.update(_WORD.findall(value))
+        # "o'brien" is also found as "obrien"
+        keys.update("".join(_WORD.findall(w)) for w in words)
+    record_id = str(doc.get("record_id") or "").strip().lower()
+    if record_id:
+        keys.add(record_id)
+        # "R-1042" is also found as "r1042", and "123-456" by a phone-shaped "123456"
+        keys.add(re.sub(r"[\W_]", "", record_id))
+    email = str(doc.get("email") or "").strip().lower()
+    if email:
+        keys.add(email)
+        keys.add(email.split("@")[0])
+    keys.update(phone_digits(doc.get("phone")))
+    keys.discard("")
+    return sorted(keys)
+
+def query_terms(q):
+    """Search box text -> key-shaped terms. A phone-looking query is one digits term."""
+    q = str(q or "").strip().lower()
+    if _PHONE.fullmatch(q) and len(re.sub(r"\D", "", q)) >= SEARCH_MIN_CHARS:
+        return [re.sub(r"\D", "", q)]
+    return [t for t in q.split() if t]
+
+
+def tier_filter(terms, tier):
+    exact = {"search_keys": {"$all": terms}}
+    if tier == "exact": return exact
+    prefixes = [{"search_keys": re.compile("^" + re.escape(t))} for t in terms]
+    return {"$and": prefixes, "$nor": [exact]}
+
+def encode_search_cursor(tier, doc=None):
+    return f"{TIERS.index(tier)}.{encode_cursor(doc) if doc else ''}"
+
+def parse_search_cursor(cursor):
+    """ -> (tier, keyset filter or {}). Raises ValueError if malformed."""
+    if not cursor: return TIERS[0], {}
+    tier, _, keyset = cursor.partition(".")
+    if tier not in ("0", "1"): raise ValueError("Invalid cursor")
+    return TIERS[int(tier)], (cursor_filter(keyset) if keyset else {})
+
+def _newest_first(item):
+    _, doc = item
+    return (doc.get("created_at"), doc["_id"])
+
+
+async def search_leads(q, depts=None, cursor=None, limit=SEARCH_PAGE_SIZE, projection=None):
+    """
+    One page of matches: ([(dept, tier, doc)], next_cursor). Raises ValueError for a
+    query shorter than SEARCH_MIN_CHARS or a malformed cursor. `projection` is
+    fn(dept) -> Mongo projection.
+    """
+    terms = query_terms(q)
+    if not terms or max(len(t) for t in terms) < SEARCH_MIN_CHARS:
+        raise ValueError(f"Search needs at least {SEARCH_MIN_CHARS} characters")
+    depts = depts or list(DEPARTMENTS)
+    tier, keyset = parse_search_cursor(cursor)
+    limit = max(1, min(limit, SEARCH_MAX_PAGE_SIZE))
+
+    results = []
+    while True:
+        need = limit - len(results)
+        query = {**tier_filter(terms, tier), **keyset}
+        # Top `need + 1` per department, merged: one more than the page tells us whether the tier continues
+        per_dept = await asyncio.gather(*(
+            get_lead_collection(d).find(query, projection(d) if projection else None, sort=NEWEST_FIRST, limit=need + 1)
+            for d in depts
+        ))
+        merged = sorted(((d, doc) for d, docs in zip(depts, per_dept) for doc in docs), key=_newest_first, reverse=True)
+        results += [(d, tier, doc) for d, doc in merged[:need]]
+        if len(merged) > need:
+            return results, encode_search_cursor(tier, results[-1][2])
+        next_index = TIERS.index(tier) + 1
+        if next_index == len(TIERS): return results, None
+        tier, keyset = TIERS[next_index], {}
+        if len(results) == limit: return results, encode_search_cursor(tier)
+
+
+# --- BACKFILL ---
+
+BACKFILL_BATCH_SIZE = 1000
+
+def backfill(depts=None, all_docs=False):
+    """Sets search_keys on leads missing them (every lead with all_docs). Returns {dept: updated}."""
+    updated = {}
+    for dept in depts or list(DEPARTMENTS):
+        col = get_lead_collection(dept).col
+        query = {} if all_docs else {"search_keys": {"$exists": False}}
+        fields = {f: 1 for f in SEARCH_FIELDS}
+        ops, count = [], 0
+        for doc in col.find(query, fields).batch_size(BACKFILL_BATCH_SIZE):
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"search_keys": search_keys(doc)}}))
+            if len(ops) == BACKFILL_BATCH_SIZE:
+                count += col.bulk_write(ops, ordered=False).modified_count
+                ops = []
+        if ops: count += col.bulk_write(ops, ordered=False).modified_count
+        updated[dept] = count
+    return updated
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lead search maintenance")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--dept", choices=list(DEPARTMENTS), action="append", help="Limit to a department (repeatable)")
+    parser.add_argument("--all", action="store_true", help="Recompute keys on every lead, not only those missing them")
+    args = parser.parse_args(argv)
+    for dept, count in backfill(args.dept, args.all).items():
+        print(f"{dept}: {count} lead(s) updated")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,295 @@
+import os
+import sys
+import asyncio
+import argparse
+import pytz
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+from starlette.concurrency import run_in_threadpool
+from api.db import get_collection, get_lead_collection, get_archive_collection, needs_archive, DEPARTMENTS, CHARGED_ONLY_DEPTS
+
+# ==========================================
+# SHIFT ROLLUPS (MATERIALIZED RUNNING SUMS)
+# ==========================================
+# One document per (shift, department), serving both the live night stats and
+# the daily history:
+#   {_id: "2026-10-17:billing", shift_date, dept,
+#    total, count, agents: {name: amount},            <- counted leads only
+#    statuses: {status: {count, amount}},             <- every lead in the window
+#    rev,                                             <- bumped by every $inc
+#    finalized_at}
+# Write paths call apply_lead_change() with the lead before/after the write and
+# the rollup moves by $inc, including late edits to already closed shifts.
+# Closed shifts are finalized once (recomputed from raw leads and stamped) by
+# the app's finalizer loop every FINALIZE_INTERVAL_MINUTES, never on a read.
+# `python -m api.shift_totals reconcile` reports drift, `rebuild` rewrites,
+# `finalize` runs one finalizer pass (e.g. from a cron).
+#
+# Shifts from before rollups existed have no documents: run once after deploy
+#   python -m api.shift_totals backfill
+# which writes finalized rollups for every closed shift back to the oldest lead
+# that has none (existing rollups are left alone, so it is safe to re-run).
+
+TZ_KARACHI = pytz.timezone("Asia/Karachi")
+SHIFT_START_HOUR = 20
+SHIFT_HOURS = 10
+TOTALS_COLLECTION = "shift_rollups"
+FINALIZE_INTERVAL_MINUTES = float(os.getenv("FINALIZE_INTERVAL_MINUTES", "30"))
+# Recompute attempts per rollup when lead writes keep landing mid-finalize
+FINALIZE_ATTEMPTS = 3
+
+
+def to_karachi(dt):
+    # Mongo hands datetimes back as naive UTC
+    if dt.tzinfo is None: dt = pytz.utc.localize(dt)
+    return dt.astimezone(TZ_KARACHI)
+
+def shift_start_for(dt):
+    """8 PM start of the shift a moment belongs to (before 8 PM -> yesterday's shift)."""
+    dt = to_karachi(dt)
+    start = dt.replace(hour=SHIFT_START_HOUR, minute=0, second=0, microsecond=0)
+    if dt.hour < SHIFT_START_HOUR:
+        start = start - timedelta(days=1)
+    return start
+
+def shift_date_for(dt):
+    """Shift date ("YYYY-MM-DD" of the 8 PM start), or None if dt is outside 8 PM - 6 AM."""
+    if not isinstance(dt, datetime): return None
+    start = shift_start_for(dt)
+    if to_karachi(dt) > start + timedelta(hours=SHIFT_HOURS): return None
+    return start.strftime("%Y-%m-%d")
+
+def totals_key(shift_date, dept):
+    return f"{shift_date}:{dept}"
+
+def field_name(value, default="Unknown"):
+    # Agent / status names become field paths, so dots and leading '$' are not allowed
+    name = str(value or default).replace(".", "_")
+    return name.lstrip("$") or default
+
+def lead_contribution(lead, dept):
+    """(shift_date, agent, status, amount, counted) for a lead inside a shift window, or None."""
+    if not lead: return None
+    shift_date = shift_date_for(lead.get("created_at"))
+    if not shift_date: return None
+    try:
+        amount = float(lead.get("charge_amount") or 0)
+    except (TypeError, ValueError):
+        amount = 0.0
+    # Billing/Insurance/Telecom count 'Charged' only | Design/Ebook count everything
+    counted = dept not in CHARGED_ONLY_DEPTS or lead.get("status") == "Charged"
+    return shift_date, field_name(lead.get("agent")), field_name(lead.get("status"), "None"), amount, counted
+
+def _inc_ops(dept, before, after):
+    """Collapses the before/after contributions into {shift_date: {field: delta}}."""
+    ops = {}
+    for contrib, sign in [(lead_contribution(before, dept), -1), (lead_contribution(after, dept), 1)]:
+        if not contrib: continue
+        shift_date, agent, status, amount, counted = contrib
+        inc = ops.setdefault(shift_date, {})
+        deltas = {f"statuses.{status}.count": sign, f"statuses.{status}.amount": sign * amount}
+        if counted:
+            deltas.update({"total": sign * amount, "count": sign, f"agents.{agent}": sign * amount})
+        for key, value in deltas.items():
+            inc[key] = inc.get(key, 0) + value
+    return {d: {k: v for k, v in inc.items() if v} for d, inc in ops.items()}
+
+async def apply_lead_change(dept, before, after):
+    """Keeps the shift rollups in step with one lead write. before/after are None for insert/delete."""
+    await apply_lead_changes(dept, [(before, after)])
+
+def rollup_ops(dept, changes):
+    """UpdateOne ops for many (before, after) writes: one $inc per touched shift."""
+    merged = {}
+    for before, after in changes:
+        for shift_date, inc in _inc_ops(dept, before, after).items():
+            total = merged.setdefault(shift_date, {})
+            for key, value in inc.items():
+                total[key] = total.get(key, 0) + value
+    return [
+        UpdateOne(
+            {"_id": totals_key(shift_date, dept)},
+            {"$inc": {**inc, "rev": 1}, "$setOnInsert": {"shift_date": shift_date, "dept": dept}},
+            upsert=True
+        )
+        for shift_date, inc in merged.items() if any(inc.values())
+    ]
+
+async def apply_lead_changes(dept, changes):
+    """Same for many (before, after) writes at once, in one bulk_write."""
+    try:
+        ops = rollup_ops(dept, changes)
+        if ops: await get_collection(TOTALS_COLLECTION).bulk_write(ops, ordered=False)
+    except Exception as e:
+        # The lead write already committed; reconcile fixes any drift
+        print(f"Shift Totals Error ({dept}): {e}")
+
+async def get_shift_totals(dept, shift_date):
+    return await get_collection(TOTALS_COLLECTION).find_one({"_id": totals_key(shift_date, dept)})
+
+async def get_rollups(start_date, end_date):
+    """All rollup documents with start_date <= shift_date <= end_date ("YYYY-MM-DD")."""
+    return await get_collection(TOTALS_COLLECTION).find(
+        {"shift_date": {"$gte": start_date, "$lte": end_date}}, sort=[("shift_date", -1)]
+    )
+
+async def get_latest_rollups(shifts):
+    """Rollups for the most recent `shifts` shift dates that have any data."""
+    col = get_collection(TOTALS_COLLECTION)
+    latest = await col.find({}, {"shift_date": 1}, sort=[("shift_date", -1)], limit=shifts * len(DEPARTMENTS))
+    dates = sorted({d["shift_date"] for d in latest}, reverse=True)[:shifts]
+    if not dates: return []
+    return await get_rollups(dates[-1], dates[0])
+
+
+# --- RECONCILE / REBUILD / FINALIZE ---
+
+def compute_from_leads(dept, shift_start):
+    """Recomputes one shift's rollup from the raw lead documents, archived ones included (sync)."""
+    match = {"created_at": {"$gte": shift_start, "$lte": shift_start + timedelta(hours=SHIFT_HOURS)}}
+    group = {"_id": {"agent": "$agent", "status": "$status"}, "total": {"$sum": "$charge_amount"}, "count": {"$sum": 1}}
+    if not needs_archive(dept, shift_start):
+        groups = list(get_lead_collection(dept).col.aggregate([{"$match": match}, {"$group": group}]))
+    else:
+        # A lead being archived is briefly in both tiers: the archive read skips
+        # whatever the hot read counted, so it is counted once
+        groups = list(get_lead_collection(dept).col.aggregate([{"$match": match}, {"$group": {**group, "ids": {"$push": "$_id"}}}]))
+        hot_ids = [i for r in groups for i in r.pop("ids")]
+        groups += get_archive_collection(dept).col.aggregate([{"$match": {**match, "_id": {"$nin": hot_ids}}}, {"$group": group}])
+    agents, statuses, total, count = {}, {}, 0.0, 0
+    for r in groups:
+        agent, status = r["_id"].get("agent"), r["_id"].get("status")
+        status_entry = statuses.setdefault(field_name(status, "None"), {"count": 0, "amount": 0.0})
+        status_entry["count"] += r["count"]
+        status_entry["amount"] += r["total"]
+        if dept in CHARGED_ONLY_DEPTS and status != "Charged": continue
+        name = field_name(agent)
+        agents[name] = agents.get(name, 0) + r["total"]
+        total += r["total"]
+        count += r["count"]
+    return {"total": total, "count": count, "agents": agents, "statuses": statuses}
+
+def finalize_closed_shifts(now=None):
+    """Recomputes and stamps every rollup whose shift has ended and is not finalized yet (sync)."""
+    totals_col = get_collection(TOTALS_COLLECTION).col
+    current = shift_start_for(now or datetime.now(TZ_KARACHI))
+    finalized = 0
+    open_docs = totals_col.find(
+        {"finalized_at": {"$exists": False}, "shift_date": {"$lt": current.strftime("%Y-%m-%d")}},
+        {"shift_date": 1, "dept": 1, "rev": 1}
+    )
+    for doc in list(open_docs):
+        if doc.get("dept") not in DEPARTMENTS: continue
+        shift_start = TZ_KARACHI.localize(datetime.strptime(doc["shift_date"], "%Y-%m-%d").replace(hour=SHIFT_START_HOUR))
+        for _ in range(FINALIZE_ATTEMPTS):
+            expected = compute_from_leads(doc["dept"], shift_start)
+            # Only replaces the rollup as read: a lead write ($inc moves rev) or
+            # another finalizer in between makes this a no-op
+            result = totals_col.replace_one(
+                {"_id": doc["_id"], "rev": doc.get("rev"), "finalized_at": {"$exists": False}},
+                {"shift_date": doc["shift_date"], "dept": doc["dept"], **expected, "rev": doc.get("rev"),
+                 "finalized_at": datetime.now(pytz.utc)}
+            )
+            finalized += result.modified_count
+            if result.matched_count: break
+            doc = totals_col.find_one({"_id": doc["_id"], "finalized_at": {"$exists": False}}, {"shift_date": 1, "dept": 1, "rev": 1})
+            if not doc: break
+        # Still racing after FINALIZE_ATTEMPTS: left open for the next pass
+    return finalized
+
+def backfill(shifts=None, now=None):
+    """
+    Writes finalized rollups for closed shifts that have leads but no rollup yet,
+    `shifts` shifts back or back to the oldest lead (sync). Returns how many were written.
+    """
+    totals_col = get_collection(TOTALS_COLLECTION).col
+    current = shift_start_for(now or datetime.now(TZ_KARACHI))
+    if shifts is None:
+        oldest = [
+            doc["created_at"] for dept in DEPARTMENTS
+            for col in (get_lead_collection(dept), get_archive_collection(dept))
+            for doc in [col.col.find_one({"created_at": {"$type": "date"}}, {"created_at": 1}, sort=[("created_at", 1)])] if doc
+        ]
+        if not oldest: return 0
+        shifts = (current - shift_start_for(min(oldest))).days
+    written = 0
+    for i in range(1, shifts + 1):
+        shift_start = current - timedelta(days=i)
+        shift_date = shift_start.strftime("%Y-%m-%d")
+        for dept in DEPARTMENTS:
+            if totals_col.find_one({"_id": totals_key(shift_date, dept)}, {"_id": 1}): continue
+            expected = compute_from_leads(dept, shift_start)
+            if not (expected["count"] or expected["statuses"]): continue
+            # $setOnInsert: a rollup written meanwhile by a lead write or finalize wins
+            result = totals_col.update_one(
+                {"_id": totals_key(shift_date, dept)},
+                {"$setOnInsert": {"shift_date": shift_date, "dept": dept, **expected, "finalized_at": datetime.now(pytz.utc)}},
+                upsert=True
+            )
+            written += bool(result.upserted_id)
+    return written
+
+async def run_finalizer():
+    """Lifespan loop: finalizes closed shifts every FINALIZE_INTERVAL_MINUTES. Cancel to stop."""
+    while True:
+        try:
+            finalized = await run_in_threadpool(finalize_closed_shifts)
+            if finalized: print(f"Finalized {finalized} shift rollup(s)")
+        except Exception as e:
+            print(f"Finalize Error: {e}")
+        await asyncio.sleep(FINALIZE_INTERVAL_MINUTES * 60)
+
+def reconcile(shifts=1, fix=False, now=None):
+    """Compares stored totals with raw leads for the last `shifts` shifts. Returns drift rows."""
+    totals_col = get_collection(TOTALS_COLLECTION).col
+    current = shift_start_for(now or datetime.now(TZ_KARACHI))
+    drift = []
+    for i in range(shifts):
+        shift_start = current - timedelta(days=i)
+        shift_date = shift_start.strftime("%Y-%m-%d")
+        for dept in DEPARTMENTS:
+            expected = compute_from_leads(dept, shift_start)
+            stored = totals_col.find_one({"_id": totals_key(shift_date, dept)}) or {}
+            diff = round(expected["total"] - stored.get("total", 0), 2)
+            count_diff = expected["count"] - stored.get("count", 0)
+            agents_stored = {k: round(v, 2) for k, v in stored.get("agents", {}).items() if round(v, 2)}
+            agents_expected = {k: round(v, 2) for k, v in expected["agents"].items() if round(v, 2)}
+            if diff or count_diff or agents_stored != agents_expected:
+                drift.append({"shift_date": shift_date, "dept": dept, "stored": round(stored.get("total", 0), 2),
+                              "expected": round(expected["total"], 2), "drift": diff, "count_drift": count_diff})
+            if fix and (expected["count"] or stored or expected["statuses"]):
+                finalized = {"finalized_at": datetime.now(pytz.utc)} if i > 0 else {}
+                totals_col.replace_one(
+                    {"_id": totals_key(shift_date, dept)},
+                    {"shift_date": shift_date, "dept": dept, **expected, **finalized},
+                    upsert=True
+                )
+    return drift
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reconcile shift rollups against raw leads")
+    parser.add_argument("command", choices=["reconcile", "rebuild", "finalize", "backfill"])
+    parser.add_argument("--shifts", type=int, default=None,
+                        help="How many shifts back to check (default: current only; backfill: back to the oldest lead)")
+    args = parser.parse_args(argv)
+
+    if args.command == "finalize":
+        print(f"Finalized {finalize_closed_shifts()} rollup(s).")
+        return 0
+    if args.command == "backfill":
+        print(f"Backfilled {backfill(args.shifts)} rollup(s).")
+        return 0
+    args.shifts = args.shifts or 1
+
+    drift = reconcile(shifts=args.shifts, fix=args.command == "rebuild")
+    for row in drift:
+        print(f"{row['shift_date']} {row['dept']:<10} stored={row['stored']:>10} expected={row['expected']:>10} "
+              f"drift={row['drift']:>9} count_drift={row['count_drift']}")
+    verb = "Rebuilt" if args.command == "rebuild" else "Checked"
+    print(f"{verb} {args.shifts} shift(s) x {len(DEPARTMENTS)} departments, {len(drift)} with drift.")
+    return 1 if drift and args.command == "reconcile" else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
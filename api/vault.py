@@ -0,0 +1,118 @@
+import sys
+import argparse
+from pymongo import UpdateOne
+from api.db import get_collection, get_lead_collection, get_archive_collection
+from api.models import VAULT_FIELDS, VAULT_DEPTS
+from api.pagination import utc_now
+
+# ==========================================
+# CARD VAULT (SENSITIVE LEAD FIELDS)
+# ==========================================
+# Card number, expiry, CVC, PIN and account number are not stored on the lead.
+# They live in one vault collection, one document per card lead under the
+# lead's own _id:
+#   {_id: <lead _id>, dept, card_number, exp_date, cvc, pin_code, account_number, updated_at}
+# Lead documents keep what tables, stats and search read, so manager syncs,
+# recent-leads pages, change streams and scans never carry card data. The
+# vault is read for a single lead (get-lead by id / row_index) and, in
+# batches, by exports. Leads stored before the split keep their inline fields
+# (readers fall back to them) until migrated:
+#   python -m api.vault migrate [--dept billing] [--dry-run]
+
+VAULT_COLLECTION = "lead_vault"
+VAULT_BATCH_SIZE = 1000
+_VAULT_PROJECTION = {f: 1 for f in VAULT_FIELDS}
+
+
+def split_lead(doc, dept):
+    """Full lead document -> (lead without vault fields, vault fields or None for non-card departments)."""
+    lead = {k: v for k, v in doc.items() if k not in VAULT_FIELDS}
+    if dept not in VAULT_DEPTS: return lead, None
+    return lead, {f: doc.get(f, "") for f in VAULT_FIELDS}
+
+def unset_inline():
+    """$unset for vault fields still stored on a lead from before the split."""
+    return {f: "" for f in VAULT_FIELDS}
+
+def _vault():
+    return get_collection(VAULT_COLLECTION)
+
+
+async def save_secrets(lead_id, dept, secrets):
+    await _vault().update_one({"_id": lead_id}, {"$set": {"dept": dept, **secrets, "updated_at": utc_now()}}, upsert=True)
+
+async def delete_secrets(lead_ids):
+    if lead_ids: await _vault().delete_many({"_id": {"$in": list(lead_ids)}})
+
+async def with_secrets(doc, dept):
+    """The lead merged with its vault fields. The vault wins over inline fields not migrated yet."""
+    if dept not in VAULT_DEPTS: return doc
+    secrets = await _vault().find_one({"_id": doc["_id"]}, _VAULT_PROJECTION)
+    return {**doc, **(secrets or {})}
+
+def attach_secrets(docs):
+    """with_secrets for many leads in one query (sync)."""
+    if not docs: return docs
+    found = {v["_id"]: v for v in _vault().col.find({"_id": {"$in": [d["_id"] for d in docs]}}, _VAULT_PROJECTION)}
+    return [{**d, **found.get(d["_id"], {})} for d in docs]
+
+def iter_with_secrets(cursor, batch_size=VAULT_BATCH_SIZE):
+    """Lead documents from a cursor, merged with their vault fields one batch at a time (sync). Closes the cursor."""
+    try:
+        batch = []
+        for doc in cursor:
+            batch.append(doc)
+            if len(batch) == batch_size:
+                yield from attach_secrets(batch)
+                batch = []
+        yield from attach_secrets(batch)
+    finally:
+        cursor.close()
+
+
+# --- MIGRATION ---
+
+def migrate(depts=None, dry_run=False, batch_size=VAULT_BATCH_SIZE):
+    """
+    Moves inline vault fields of card leads (hot and archive tiers) into the vault
+    and unsets them on the lead (sync). A vault document already written by the
+    new save path is never overwritten. Returns {dept: leads migrated or pending}.
+    """
+    inline = {"$or": [{f: {"$exists": True}} for f in VAULT_FIELDS]}
+    migrated = {}
+    for dept in depts or VAULT_DEPTS:
+        count = 0
+        for tier in (get_lead_collection(dept), get_archive_collection(dept)):
+            col = tier.col
+            if dry_run:
+                count += col.count_documents(inline)
+                continue
+            while True:
+                docs = list(col.find(inline, _VAULT_PROJECTION).limit(batch_size))
+                if not docs: break
+                now = utc_now()
+                _vault().col.bulk_write([
+                    UpdateOne({"_id": d["_id"]}, {"$setOnInsert": {"dept": dept, **split_lead(d, dept)[1], "updated_at": now}}, upsert=True)
+                    for d in docs
+                ], ordered=False)
+                result = col.bulk_write([UpdateOne({"_id": d["_id"]}, {"$unset": unset_inline()}) for d in docs], ordered=False)
+                count += result.modified_count
+                if not result.modified_count: break
+        migrated[dept] = count
+    return migrated
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Card vault maintenance")
+    parser.add_argument("command", choices=["migrate"])
+    parser.add_argument("--dept", choices=VAULT_DEPTS, action="append", help="Limit to a department (repeatable)")
+    parser.add_argument("--dry-run", action="store_true", help="Only count leads that still store card fields inline")
+    args = parser.parse_args(argv)
+    verb = "still inline" if args.dry_run else "migrated"
+    for dept, count in migrate(args.dept, args.dry_run).items():
+        print(f"{dept}: {count} lead(s) {verb}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
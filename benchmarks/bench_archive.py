@@ -0,0 +1,135 @@
+"""
+Working set and query latency before and after archiving old leads (api/archive.py).
+
+Seeds a scratch database (MONGO_DB, default "twh_portal_bench", on MONGO_URI;
+or mongomock with --mongomock) with --leads leads over --shifts shifts, the
+same way benchmarks/load_suite.py does, then measures:
+  - the hot collections' data and index size (collStats; BSON sizes under mongomock)
+  - median latency of the queries the routes run: the manager table page,
+    pending count, recent-leads page, lookup by record_id (a recent and an
+    old lead), and a CSV export of the last 7 days and of everything
+runs run_archive(--keep-shifts) and measures again. The old-lead lookup and
+the full export are the reads that must now reach into the archive.
+
+Usage:
+    MONGO_URI=mongodb://localhost:27017 python benchmarks/bench_archive.py --leads 200000 --shifts 365 --keep-shifts 30
+    python benchmarks/bench_archive.py --mongomock --leads 20000 --shifts 120 --keep-shifts 30
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from datetime import timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from load_suite import install_fakes, seed, use_mongomock
+
+
+def working_set(db, main):
+    """{dept: {count, data_mb, index_mb}} of the hot collections."""
+    import bson
+    sizes = {}
+    for dept, name in main.DEPARTMENTS.items():
+        try:
+            stats = db.command("collStats", name)
+            sizes[dept] = {"count": stats["count"], "data_mb": stats["size"] / 1e6, "index_mb": stats["totalIndexSize"] / 1e6}
+        except Exception:
+            # mongomock has no collStats: raw BSON bytes, no index sizes
+            col = db[name]
+            sizes[dept] = {"count": col.count_documents({}), "data_mb": sum(len(bson.encode(d)) for d in col.find()) / 1e6, "index_mb": 0.0}
+    return sizes
+
+
+async def time_call(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+async def measure(main, dept, recent_id, old_id, repeat):
+    from api.export import export_filter, export_stream, parse_range_bound
+    from api.models import lead_projection
+    col = main.get_lead_collection(dept)
+    week_ago = (main.get_shift_start_time() - timedelta(days=7)).strftime("%Y-%m-%d")
+
+    def export(start):
+        return sum(len(chunk) for chunk in export_stream("leads", dept, "csv", export_filter(parse_range_bound(start))))
+
+    queries = {
+        "manager page": lambda: col.find({}, lead_projection(dept), sort=main.NEWEST_FIRST, limit=main.MANAGER_PAGE_SIZE),
+        "pending count": lambda: col.count_documents({"status": "Pending"}),
+        "recent leads (50)": lambda: main.get_lead(type=dept, limit=50),
+        "get-lead recent id": lambda: main.get_lead(type=dept, id=recent_id),
+        "get-lead old id": lambda: main.get_lead(type=dept, id=old_id),
+        "export last 7 days": lambda: main.run_in_threadpool(export, week_ago),
+        "export everything": lambda: main.run_in_threadpool(export, None),
+    }
+    return {label: await time_call(fn, repeat) for label, fn in queries.items()}
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--leads", type=int, default=50000)
+    parser.add_argument("--shifts", type=int, default=180, help="Shifts the seeded leads are spread over")
+    parser.add_argument("--keep-shifts", type=int, default=30, help="Shifts left hot by the archiver")
+    parser.add_argument("--dept", default="billing", help="Department the queries run against")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--mongomock", action="store_true")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch database afterwards")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+    os.environ.setdefault("MONGO_DB", "twh_portal_bench")
+    if os.environ["MONGO_DB"] == "twh_portal":
+        sys.exit("Refusing to seed and drop the production database name; set MONGO_DB to a scratch name.")
+    for key in ["PUSHER_APP_ID", "PUSHER_KEY", "PUSHER_SECRET", "PUSHER_CLUSTER"]:
+        os.environ.setdefault(key, "1")
+    if args.mongomock: use_mongomock()
+
+    from api import main
+    from api.db import get_db
+    from api.archive import run_archive
+    install_fakes(main)
+    db = get_db()
+
+    try:
+        t0 = time.perf_counter()
+        seeded = seed(main, args.leads, args.shifts)
+        print(f"Seeded {sum(seeded.values())} leads {seeded} in {time.perf_counter() - t0:.1f}s")
+        col = main.get_lead_collection(args.dept).col
+        recent_id = col.find_one({}, sort=[("created_at", -1)])["record_id"]
+        old_id = col.find_one({}, sort=[("created_at", 1)])["record_id"]
+
+        before_size = working_set(db, main)
+        before = asyncio.run(measure(main, args.dept, recent_id, old_id, args.repeat))
+        t0 = time.perf_counter()
+        cutoff, moved = run_archive(args.keep_shifts)
+        print(f"Archived {sum(moved.values())} leads {moved} created before {cutoff.isoformat()} in {time.perf_counter() - t0:.1f}s")
+        after_size = working_set(db, main)
+        after = asyncio.run(measure(main, args.dept, recent_id, old_id, args.repeat))
+    finally:
+        if not args.keep: db.client.drop_database(db.name)
+
+    print(f"\n{'hot working set':<20} {'docs':>17} {'data MB':>19} {'index MB':>19}")
+    for dept in before_size:
+        b, a = before_size[dept], after_size[dept]
+        print(f"{dept:<20} {b['count']:>8} -> {a['count']:<6} {b['data_mb']:>8.1f} -> {a['data_mb']:<8.1f} {b['index_mb']:>8.1f} -> {a['index_mb']:<8.1f}")
+    print(f"\n{args.dept + ' query (median ms)':<28} {'before':>9} {'after':>9}")
+    for label in before:
+        print(f"{label:<28} {before[label]:>9.2f} {after[label]:>9.2f}")
+    print(json.dumps({"moved": moved, "before_ms": before, "after_ms": after}))
+
+
+if __name__ == "__main__":
+    main_cli()
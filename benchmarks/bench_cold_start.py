@@ -0,0 +1,89 @@
+"""
+Cold-start cost of the serverless entry point.
+
+Each sample is a fresh interpreter that imports api.main and serves one request
+in-process (httpx ASGITransport), so it sees exactly what a cold serverless
+invocation pays: module imports plus whatever the first request initializes.
+Also prints the slowest imports from `python -X importtime`.
+
+Usage:
+    MONGO_URI=mongodb://localhost:27017 python benchmarks/bench_cold_start.py --runs 5
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = ["/", "/billing", "/api/public/night-stats"]
+
+# Runs inside the child interpreter
+SAMPLE = """
+import sys, time, json, asyncio
+start = time.perf_counter()
+from api import main
+imported = time.perf_counter()
+import httpx
+
+async def first_request(path):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        return await client.get(path)
+
+r = asyncio.run(first_request(sys.argv[1]))
+done = time.perf_counter()
+print(json.dumps({"import_ms": (imported - start) * 1000, "first_response_ms": (done - imported) * 1000, "status": r.status_code}))
+"""
+
+
+def child_env():
+    env = dict(os.environ)
+    env.setdefault("MONGO_URI", "mongodb://localhost:27017")
+    for key in ["PUSHER_APP_ID", "PUSHER_KEY", "PUSHER_SECRET", "PUSHER_CLUSTER"]:
+        env.setdefault(key, "1")
+    env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def sample(path):
+    out = subprocess.run([sys.executable, "-c", SAMPLE, path], cwd=ROOT, env=child_env(),
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(top):
+    """(cumulative_us, module) for the `top` most expensive imports of api.main."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import api.main"], cwd=ROOT,
+                         env=child_env(), capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line: continue
+        _, cumulative, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per path")
+    parser.add_argument("--top", type=int, default=15, help="How many imports to list")
+    args = parser.parse_args()
+
+    print("Slowest imports (cumulative) for `import api.main`:")
+    for cumulative, name in slowest_imports(args.top):
+        print(f"  {cumulative / 1000:>8.1f}ms  {name}")
+
+    for path in PATHS:
+        runs = [sample(path) for _ in range(args.runs)]
+        imports = [r["import_ms"] for r in runs]
+        firsts = [r["first_response_ms"] for r in runs]
+        totals = [i + f for i, f in zip(imports, firsts)]
+        print(f"{path:<26} status={runs[-1]['status']} import={statistics.median(imports):.0f}ms "
+              f"first_response={statistics.median(firsts):.0f}ms "
+              f"time_to_first_response={statistics.median(totals):.0f}ms (median of {args.runs})")
+
+
+if __name__ == "__main__":
+    main_cli()
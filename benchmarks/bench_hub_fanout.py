@@ -0,0 +1,152 @@
+"""
+Fan-out latency of the in-process realtime hub (api/hub.py).
+
+Starts uvicorn on a local port serving the hub's SSE transport (the same
+sse_events() behind /api/realtime/stream), connects --clients EventSource-like
+HTTP streams, half on a department channel and half on the manager channel
+plus that department channel, then publishes --events events the way the outbox does
+(HubClient.trigger_batch from a worker thread). For each event it records how
+long every client took to receive it. --slow subscribers are attached on the
+server but never drained (a stuck connection), to show they are evicted once
+--queue-size events are pending instead of holding back the rest. Server and
+clients share one process, so the numbers are pessimistic. No database needed.
+
+Usage:
+    python benchmarks/bench_hub_fanout.py --clients 500 --events 50 --interval 0.1
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import threading
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from api.hub import HUB, HubClient, parse_channels, sse_events
+from api.events import MANAGER_CHANNEL, dept_channel
+
+CHANNEL = dept_channel("billing")
+
+
+def make_app():
+    app = FastAPI()
+
+    @app.get("/api/realtime/stream")
+    async def stream(channels: str):
+        return StreamingResponse(sse_events(parse_channels(channels)), media_type="text/event-stream")
+
+    return app
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values: return 0.0
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def client_loop(client, channels, received, ready, expected):
+    async with client.stream("GET", "/api/realtime/stream", params={"channels": ",".join(channels)}) as response:
+        ready.release()
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "): continue
+            message = json.loads(line[6:])
+            received.append((message["data"]["seq"], time.perf_counter() - message["data"]["sent"]))
+            if len(received) == expected: return
+
+
+async def attach_slow(count):
+    """Runs on the server's loop: subscribers nothing ever reads from."""
+    return [HUB.connect([CHANNEL]) for _ in range(count)]
+
+
+def publish_events(events, interval, payload_bytes):
+    pusher = HubClient(HUB)
+    filler = "x" * payload_bytes
+    for seq in range(events):
+        pusher.trigger_batch([{"channel": CHANNEL, "name": "new-lead", "data": {"seq": seq, "sent": time.perf_counter(), "pad": filler}}])
+        time.sleep(interval)
+
+
+async def run(args, base_url):
+    limits = httpx.Limits(max_connections=args.clients + 10, max_keepalive_connections=0)
+    ready = asyncio.Semaphore(0)
+    async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as client:
+        receivers = []
+        tasks = []
+        for i in range(args.clients):
+            received = []
+            channels = [CHANNEL] if i % 2 else [MANAGER_CHANNEL, CHANNEL]
+            receivers.append(received)
+            tasks.append(asyncio.create_task(client_loop(client, channels, received, ready, args.events)))
+        for _ in range(args.clients): await ready.acquire()
+        # Headers go out before the generator subscribes; give the last ones a moment
+        await asyncio.sleep(0.5)
+        asyncio.run_coroutine_threadsafe(attach_slow(args.slow), HUB.loop).result()
+        connected = len(HUB.subscribers)
+
+        start = time.perf_counter()
+        await asyncio.to_thread(publish_events, args.events, args.interval, args.payload_bytes)
+        done, pending = await asyncio.wait(tasks, timeout=args.timeout)
+        elapsed = time.perf_counter() - start
+        for task in pending: task.cancel()
+
+    latencies = [lat * 1000 for received in receivers for _, lat in received]
+    by_event = {}
+    for received in receivers:
+        for seq, lat in received: by_event[seq] = max(by_event.get(seq, 0), lat * 1000)
+    complete = sum(1 for received in receivers if len(received) == args.events)
+    return {
+        "connected": connected, "clients_complete": complete, "deliveries": len(latencies),
+        "expected": args.clients * args.events, "elapsed_s": elapsed,
+        "p50_ms": percentile(latencies, 50), "p99_ms": percentile(latencies, 99), "max_ms": max(latencies or [0]),
+        "last_client_p50_ms": statistics.median(by_event.values()) if by_event else 0.0,
+        "evicted": HUB.evictions
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--events", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.1, help="Seconds between published events")
+    parser.add_argument("--payload-bytes", type=int, default=200)
+    parser.add_argument("--slow", type=int, default=5, help="Subscribers that never read")
+    # Below --events so the slow subscribers overflow within the run (the app default is HUB_QUEUE_SIZE)
+    parser.add_argument("--queue-size", type=int, default=32, help="Per-connection send queue")
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+    HUB.queue_size = args.queue_size
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(make_app(), host="127.0.0.1", port=port, log_level="warning", backlog=4096))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started: time.sleep(0.05)
+    try:
+        r = asyncio.run(run(args, f"http://127.0.0.1:{port}"))
+    finally:
+        server.should_exit = True
+        thread.join(10)
+
+    print(f"clients={args.clients} (+{args.slow} slow) connected={r['connected']} events={args.events} "
+          f"deliveries={r['deliveries']}/{r['expected']} complete_clients={r['clients_complete']} evicted={r['evicted']}")
+    print(f"fan-out latency p50={r['p50_ms']:.1f}ms p99={r['p99_ms']:.1f}ms max={r['max_ms']:.1f}ms "
+          f"last-client median={r['last_client_p50_ms']:.1f}ms over {r['elapsed_s']:.1f}s")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,78 @@
+"""
+Bulk import throughput (rows/sec) against a real MongoDB.
+
+Generates a CSV in memory and loads it twice into the billing collection:
+  per-row   one insert_one + one rollup update per row (save_lead's writes, minus side effects)
+  bulk      api.importer.import_leads: chunked insert_many(ordered=False)
+Rows are stamped in 2001 and tagged BENCH-IMPORT-*, and are removed afterwards
+along with their 2001 rollups.
+
+Usage:
+    MONGO_URI=mongodb://localhost:27017 python benchmarks/bench_import.py --rows 20000
+"""
+import io
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+
+from api.db import get_collection, get_lead_collection
+from api.importer import import_leads, read_rows, build_lead
+from api.shift_totals import TOTALS_COLLECTION, rollup_ops
+
+HEADER = "Record_ID,Agent Name,Name,Phone,Email,Card Number,Charge,Status,Timestamp\n"
+
+
+def make_csv(rows, tag):
+    lines = [HEADER]
+    for i in range(rows):
+        lines.append(f"BENCH-IMPORT-{tag}-{i},{random.choice(['Haziq', 'Taha', 'Arham'])},Client {i},555-0100,"
+                     f"c{i}@example.com,4111111111111111,${random.randint(20, 500)}.00,Charged,"
+                     f"2001-01-{1 + i % 28:02d} {20 + i % 4}:{i % 60:02d}:00\n")
+    return "".join(lines)
+
+
+def per_row(text):
+    col = get_lead_collection("billing").col
+    rollups = get_collection(TOTALS_COLLECTION).col
+    for _, row in read_rows("billing", io.StringIO(text)):
+        doc = build_lead("billing", row)
+        col.insert_one(doc)
+        for op in rollup_ops("billing", [(None, doc)]):
+            rollups.update_one(op._filter, op._doc, upsert=True)
+
+
+def bulk(text):
+    report = import_leads("billing", io.StringIO(text))
+    assert report["inserted"] == report["rows"], report
+
+
+def cleanup():
+    get_lead_collection("billing").col.delete_many({"record_id": {"$regex": "^BENCH-IMPORT-"}})
+    get_collection(TOTALS_COLLECTION).col.delete_many({"shift_date": {"$regex": "^2001-"}})
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--per-row-rows", type=int, default=2000, help="The per-row path is slow; time it on fewer rows")
+    args = parser.parse_args()
+
+    cleanup()
+    try:
+        for label, fn, rows in [("per-row", per_row, args.per_row_rows), ("bulk", bulk, args.rows)]:
+            text = make_csv(rows, label)
+            start = time.perf_counter()
+            fn(text)
+            elapsed = time.perf_counter() - start
+            print(f"{label:<8} rows={rows:>7} time={elapsed:7.2f}s throughput={rows / elapsed:9.0f} rows/s")
+    finally:
+        cleanup()
+
+
+if __name__ == "__main__":
+    main_cli()
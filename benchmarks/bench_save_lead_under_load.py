@@ -0,0 +1,106 @@
+"""
+Save-lead latency while manager dashboards are polling.
+
+Runs the FastAPI app in-process against a real MongoDB (MONGO_URI, defaults to
+a local mongod) and measures /api/save-lead latency with and without concurrent
+/api/manager/data pollers. Pusher is replaced with a no-op so only the app and
+Mongo are measured.
+
+Usage:
+    MONGO_URI=mongodb://localhost:27017 python benchmarks/bench_save_lead_under_load.py --pollers 10 --saves 200
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+os.environ.setdefault("AUTH_SECRET", "bench")
+for key in ["PUSHER_APP_ID", "PUSHER_KEY", "PUSHER_SECRET", "PUSHER_CLUSTER"]:
+    os.environ.setdefault(key, "1")
+
+import httpx
+from api import main
+from api.auth import issue_token
+
+
+class NullPusher:
+    def trigger(self, *args, **kwargs): pass
+    def trigger_batch(self, *args, **kwargs): pass
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values: return 0.0
+    idx = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[idx]
+
+
+async def run_saves(client, count, concurrency):
+    latencies = []
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with sem:
+            start = time.perf_counter()
+            r = await client.post("/api/save-lead", data={
+                "type": "billing", "agent": random.choice(main.AGENTS_BILLING),
+                "client_name": f"Bench Client {i}", "charge_amt": f"${random.randint(50, 500)}",
+                "order_id": f"BENCH-{i}"
+            })
+            latencies.append((time.perf_counter() - start) * 1000)
+            r.raise_for_status()
+
+    await asyncio.gather(*(one(i) for i in range(count)))
+    return latencies
+
+
+async def poll_manager(client, stop):
+    token = issue_token("bench")
+    polls = 0
+    while not stop.is_set():
+        await client.get("/api/manager/data", params={"token": token})
+        polls += 1
+    return polls
+
+
+async def scenario(pollers, saves, concurrency):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        stop = asyncio.Event()
+        poll_tasks = [asyncio.create_task(poll_manager(client, stop)) for _ in range(pollers)]
+        await asyncio.sleep(0.2 if pollers else 0)
+        latencies = await run_saves(client, saves, concurrency)
+        stop.set()
+        polls = sum(await asyncio.gather(*poll_tasks))
+    return latencies, polls
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pollers", type=int, default=10)
+    parser.add_argument("--saves", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--keep", action="store_true", help="Keep BENCH-* leads after the run")
+    args = parser.parse_args()
+
+    main.pusher_client = NullPusher()
+    billing = main.get_lead_collection("billing").col
+
+    try:
+        for label, pollers in [("idle", 0), (f"{args.pollers} manager pollers", args.pollers)]:
+            latencies, polls = asyncio.run(scenario(pollers, args.saves, args.concurrency))
+            print(f"save-lead [{label}]: n={len(latencies)} "
+                  f"p50={percentile(latencies, 50):.1f}ms p99={percentile(latencies, 99):.1f}ms "
+                  f"mean={statistics.mean(latencies):.1f}ms manager_polls={polls}")
+    finally:
+        if not args.keep:
+            billing.delete_many({"record_id": {"$regex": "^BENCH-"}})
+
+
+if __name__ == "__main__":
+    main_cli()
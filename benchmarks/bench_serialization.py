@@ -0,0 +1,100 @@
+"""
+Serialization cost of a manager payload.
+
+Builds synthetic lead documents shaped like Mongo returns them (ObjectId _id,
+naive UTC datetimes) and times turning them into response bytes:
+  legacy   the old clean_manager_doc() key duplication + FastAPI's jsonable_encoder + json.dumps
+  v1       wire model + v1 alias shim, orjson (what old clients get now)
+  v2       wire model only, orjson (what manager.js requests)
+No database needed.
+
+Usage:
+    python benchmarks/bench_serialization.py --rows 5000 --repeat 10
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from api.models import FastJSONResponse, lead_to_wire, v1_row
+
+DEPTS = ["billing", "telecom", "insurance", "design", "ebook"]
+
+
+def make_lead(i):
+    created = datetime(2026, 10, 17, 15) + timedelta(seconds=i * 7)
+    amount = round(random.uniform(20, 500), 2)
+    return {
+        "_id": ObjectId(), "record_id": f"R{i}", "agent": random.choice(["Haziq", "Taha", "Arham", "Sami"]),
+        "client_name": f"Client {i}", "phone": "555-0100", "email": f"client{i}@example.com",
+        "address": "1 Main St, Springfield", "card_holder": f"Client {i}", "card_number": "4111111111111111",
+        "exp_date": "12/29", "cvc": "123", "charge_amount": amount, "charge_str": f"${amount:.2f}",
+        "status": random.choice(["Pending", "Charged", "Declined"]), "llc": "TS", "provider": "Spectrum",
+        "pin_code": "", "account_number": "", "timestamp_str": created.strftime("%Y-%m-%d %H:%M:%S"),
+        "created_at": created
+    }
+
+
+def legacy_clean(d):
+    # api/main.py clean_manager_doc before the wire models
+    d['_id'] = str(d['_id'])
+    d['Agent Name'] = d.get('agent')
+    d['Client Name'] = d.get('client_name')
+    d['Name'] = d.get('client_name')
+    d['Charge'] = d.get('charge_str')
+    d['Status'] = d.get('status')
+    d['Timestamp'] = d.get('timestamp_str')
+    d['Record_ID'] = d.get('record_id')
+    d['LLC'] = d.get('llc')
+    d['Provider'] = d.get('provider')
+    d['Service'] = d.get('provider', '')
+    return d
+
+
+def payload(docs_by_dept, row):
+    return {"mode": "full", "sync_token": "t", **{d: [row(dict(doc), d) for doc in docs] for d, docs in docs_by_dept.items()}}
+
+
+def legacy(docs_by_dept):
+    data = payload(docs_by_dept, lambda doc, d: legacy_clean(doc))
+    return json.dumps(jsonable_encoder(data), ensure_ascii=False, separators=(",", ":")).encode()
+
+def wire_v1(docs_by_dept):
+    return FastJSONResponse(payload(docs_by_dept, lambda doc, d: v1_row(lead_to_wire(doc, d)))).body
+
+def wire_v2(docs_by_dept):
+    return FastJSONResponse(payload(docs_by_dept, lead_to_wire)).body
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000, help="Total rows, spread over the departments")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    random.seed(1)
+    docs_by_dept = {d: [make_lead(i) for i in range(n, args.rows, len(DEPTS))] for n, d in enumerate(DEPTS)}
+
+    baseline = None
+    for label, fn in [("legacy", legacy), ("v1", wire_v1), ("v2", wire_v2)]:
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            body = fn(docs_by_dept)
+            times.append((time.perf_counter() - start) * 1000)
+        median = statistics.median(times)
+        baseline = baseline or median
+        print(f"{label:<7} rows={args.rows} median={median:7.1f}ms min={min(times):7.1f}ms "
+              f"bytes={len(body):>9,} speedup={baseline / median:4.1f}x")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,140 @@
+"""
+Lead document size, manager payload and scan throughput before and after
+moving card fields into the vault (api/vault.py).
+
+Seeds a scratch database (MONGO_DB, default "twh_portal_bench", on MONGO_URI;
+or mongomock with --mongomock) with --leads leads whose card fields are stored
+inline, as before the split, and measures:
+  - average lead document size per card department (collStats avgObjSize;
+    BSON sizes under mongomock)
+  - the /api/manager/data response size and latency (full mode, v=2); the
+    "before" rows use the pre-split wire model, card fields included
+  - full scan throughput of the card departments (documents and MB per second,
+    best of --repeat)
+runs `migrate` and measures again.
+
+Usage:
+    MONGO_URI=mongodb://localhost:27017 python benchmarks/bench_vault.py --leads 100000
+    python benchmarks/bench_vault.py --mongomock --leads 10000
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from load_suite import install_fakes, seed, use_mongomock
+
+
+def avg_doc_bytes(db, name):
+    import bson
+    try:
+        return db.command("collStats", name)["avgObjSize"]
+    except Exception:
+        # mongomock has no collStats
+        sizes = [len(bson.encode(d)) for d in db[name].find()]
+        return sum(sizes) / max(1, len(sizes))
+
+
+def scan(db, names, repeat):
+    """Best (docs/s, MB/s) reading every document of `names` with no projection."""
+    import bson
+    best = (0, 0)
+    for _ in range(repeat):
+        docs, size = 0, 0
+        start = time.perf_counter()
+        for name in names:
+            for doc in db[name].find().batch_size(1000):
+                docs += 1
+                size += len(bson.encode(doc))
+        elapsed = time.perf_counter() - start
+        best = max(best, (docs / elapsed, size / 1e6 / elapsed))
+    return best
+
+
+def manager_payload(main, token, repeat):
+    """(bytes, median ms) of one full /api/manager/data response."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = asyncio.run(main.get_manager_data(token=token, v=2))
+        timings.append((time.perf_counter() - start) * 1000)
+    return len(response.body), statistics.median(timings)
+
+
+def measure(db, main, token, repeat, legacy_rows=False):
+    from api import models
+    names = [main.DEPARTMENTS[d] for d in models.VAULT_DEPTS]
+    fields = models.LEAD_FIELDS
+    # legacy_rows: the wire model before the split sent card fields with every row
+    if legacy_rows: models.LEAD_FIELDS = models.LEAD_DETAIL_FIELDS
+    try:
+        payload_bytes, payload_ms = manager_payload(main, token, repeat)
+    finally:
+        models.LEAD_FIELDS = fields
+    docs_per_s, mb_per_s = scan(db, names, repeat)
+    return {
+        "avg_doc_bytes": {d: avg_doc_bytes(db, main.DEPARTMENTS[d]) for d in models.VAULT_DEPTS},
+        "manager_payload_bytes": payload_bytes, "manager_data_ms": payload_ms,
+        "scan_docs_per_s": docs_per_s, "scan_mb_per_s": mb_per_s
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--leads", type=int, default=20000)
+    parser.add_argument("--shifts", type=int, default=14)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--mongomock", action="store_true")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch database afterwards")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+    os.environ.setdefault("MONGO_DB", "twh_portal_bench")
+    if os.environ["MONGO_DB"] == "twh_portal":
+        sys.exit("Refusing to seed and drop the production database name; set MONGO_DB to a scratch name.")
+    os.environ.setdefault("AUTH_SECRET", "bench")
+    for key in ["PUSHER_APP_ID", "PUSHER_KEY", "PUSHER_SECRET", "PUSHER_CLUSTER"]:
+        os.environ.setdefault(key, "1")
+    if args.mongomock: use_mongomock()
+
+    from api import main
+    from api.db import get_db
+    from api.auth import issue_token
+    from api.vault import migrate
+    install_fakes(main)
+    db = get_db()
+    token = issue_token("bench")
+
+    try:
+        t0 = time.perf_counter()
+        seeded = seed(main, args.leads, args.shifts, vault=False)
+        print(f"Seeded {sum(seeded.values())} leads {seeded} (card fields inline) in {time.perf_counter() - t0:.1f}s")
+        before = measure(db, main, token, args.repeat, legacy_rows=True)
+        t0 = time.perf_counter()
+        migrated = migrate()
+        print(f"Migrated {sum(migrated.values())} leads {migrated} in {time.perf_counter() - t0:.1f}s")
+        after = measure(db, main, token, args.repeat)
+    finally:
+        if not args.keep: db.client.drop_database(db.name)
+
+    print(f"\n{'':<28} {'before':>12} {'after':>12}")
+    for dept in before["avg_doc_bytes"]:
+        print(f"{'avg lead bytes ' + dept:<28} {before['avg_doc_bytes'][dept]:>12.0f} {after['avg_doc_bytes'][dept]:>12.0f}")
+    print(f"{'manager payload bytes':<28} {before['manager_payload_bytes']:>12} {after['manager_payload_bytes']:>12}")
+    print(f"{'manager data (median ms)':<28} {before['manager_data_ms']:>12.1f} {after['manager_data_ms']:>12.1f}")
+    print(f"{'scan docs/s':<28} {before['scan_docs_per_s']:>12.0f} {after['scan_docs_per_s']:>12.0f}")
+    print(f"{'scan MB/s':<28} {before['scan_mb_per_s']:>12.1f} {after['scan_mb_per_s']:>12.1f}")
+    print(json.dumps({"migrated": migrated, "before": before, "after": after}))
+
+
+if __name__ == "__main__":
+    main_cli()
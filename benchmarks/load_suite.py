@@ -0,0 +1,325 @@
+"""
+Offline load suite for the portal API.
+
+Boots the FastAPI app from api/main.py against a scratch database (MONGO_DB,
+default "twh_portal_bench", on MONGO_URI; or mongomock with --mongomock), with
+in-process fakes for Pusher, Google Sheets and Pushbullet. Seeds realistic
+shift data across the five lead collections, then measures latency (p50/p99)
+and throughput per endpoint under concurrent load and writes the results to a
+JSON file that later runs can be compared against.
+
+By default the app runs under uvicorn on a local port (lifespan, outbox worker
+and background tasks behave as in production). --transport asgi calls the app
+in-process instead, where responses include their background tasks.
+
+Usage:
+    MONGO_URI=mongodb://localhost:27017 python benchmarks/load_suite.py --leads 30000 --requests 300 --concurrency 20
+    python benchmarks/load_suite.py --mongomock --leads 5000
+    python benchmarks/load_suite.py --leads 500000 --scenarios search get-lead
+    python benchmarks/load_suite.py --compare benchmarks/results/load-20261018T120000Z.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import random
+import asyncio
+import argparse
+import platform
+import threading
+import statistics
+import subprocess
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SCENARIOS = ["save-lead", "get-lead", "get-lead-recent", "manager-data", "search", "night-stats", "leaderboard", "history-totals"]
+# Share of seeded leads per department
+DEPT_WEIGHTS = {"billing": 0.4, "telecom": 0.25, "insurance": 0.15, "design": 0.1, "ebook": 0.1}
+STATUS_WEIGHTS = {"Charged": 0.6, "Pending": 0.25, "Declined": 0.15}
+
+
+# --- FAKES ---
+
+class FakePusher:
+    def __init__(self): self.events = 0
+    def trigger(self, *args, **kwargs): self.events += 1
+    def trigger_batch(self, batch): self.events += len(batch)
+
+
+class FakeWorksheet:
+    def __init__(self): self.rows = []
+    def append_rows(self, rows, **kwargs): self.rows.extend(rows)
+    def append_row(self, row, **kwargs): self.rows.append(row)
+    def get_all_records(self): return [{"ID": "bench", "Password": "bench", "Role": "Manager"}]
+
+
+class FakeSpreadsheet:
+    def __init__(self): self.sheets = {}
+    def get_worksheet(self, index): return self.sheets.setdefault(index, FakeWorksheet())
+    def worksheet(self, name): return self.sheets.setdefault(name, FakeWorksheet())
+
+
+class FakeGspread:
+    def __init__(self): self.spreadsheets = {}
+    def open(self, name): return self.spreadsheets.setdefault(name, FakeSpreadsheet())
+
+
+class FakePushbullet:
+    def __init__(self): self.pushes = 0
+    def __call__(self, title, body): self.pushes += 1
+
+
+def install_fakes(main):
+    fakes = {"pusher": FakePusher(), "gspread": FakeGspread(), "pushbullet": FakePushbullet()}
+    main.pusher_client = fakes["pusher"]
+    main.reset_sheets()
+    def fake_get_gc():
+        main.gc = fakes["gspread"]
+        return main.gc
+    main.get_gc = fake_get_gc
+    main.send_pushbullet = fakes["pushbullet"]
+    return fakes
+
+
+def use_mongomock():
+    import mongomock
+    import pymongo
+    import mongomock.collection
+    pymongo.MongoClient = mongomock.MongoClient
+    # mongomock's bulk builder predates pymongo's UpdateOne / ReplaceOne(sort=...)
+    builder = mongomock.collection.BulkOperationBuilder
+    add_update, add_replace = builder.add_update, builder.add_replace
+    builder.add_update = lambda self, *a, sort=None, **k: add_update(self, *a, **k)
+    builder.add_replace = lambda self, *a, sort=None, **k: add_replace(self, *a, **k)
+
+
+# --- SEEDING ---
+
+def weighted(choices):
+    return random.choices(list(choices), weights=list(choices.values()))[0]
+
+def seed(main, leads, shifts, vault=True):
+    """
+    Inserts `leads` leads spread over the last `shifts` shifts and rebuilds their
+    rollups. vault=False stores card fields inline, as leads written before api/vault.py.
+    """
+    from api.importer import build_lead
+    from api.indexes import ensure_indexes
+    from api.shift_totals import reconcile
+    from api.models import VAULT_DEPTS
+    from api.vault import VAULT_COLLECTION, split_lead
+
+    ensure_indexes()
+    current = main.get_shift_start_time()
+    by_dept = {d: [] for d in DEPT_WEIGHTS}
+    for i in range(leads):
+        dept = weighted(DEPT_WEIGHTS)
+        ts = current - timedelta(days=random.randrange(shifts)) + timedelta(seconds=random.randrange(10 * 3600))
+        by_dept[dept].append(build_lead(dept, {
+            "record_id": f"SEED-{i}", "agent": random.choice(main.DEPT_AGENTS[dept]), "client_name": f"Client {i}",
+            "phone": f"555-{i % 10000:04d}", "email": f"client{i}@example.com", "address": f"{i} Main St",
+            "card_holder": f"Client {i}", "card_number": "4111111111111111", "exp_date": "12/29", "cvc": "123",
+            "charge_str": f"${random.randint(20, 600)}.{random.randint(0, 99):02d}", "llc": "TS",
+            "provider": random.choice(["Spectrum", "Xfinity", "Logo", "Cover"]), "status": weighted(STATUS_WEIGHTS),
+            "timestamp_str": ts.strftime("%Y-%m-%d %H:%M:%S")
+        }))
+    for dept, docs in by_dept.items():
+        col = main.get_lead_collection(dept).col
+        for start in range(0, len(docs), 5000):
+            chunk = docs[start:start + 5000]
+            if vault:
+                pairs = [split_lead(doc, dept) for doc in chunk]
+                chunk = [lead for lead, _ in pairs]
+            col.insert_many(chunk, ordered=False)
+            if vault and dept in VAULT_DEPTS:
+                main.get_collection(VAULT_COLLECTION).col.insert_many(
+                    [{"_id": lead["_id"], "dept": dept, **fields} for lead, fields in pairs], ordered=False)
+    reconcile(shifts=shifts, fix=True)
+    return {dept: len(docs) for dept, docs in by_dept.items()}
+
+
+# --- LOAD ---
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values: return 0.0
+    idx = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[idx]
+
+def make_request(scenario, main, token, seeded, i):
+    """(method, url, kwargs) for one request of a scenario."""
+    if scenario == "save-lead":
+        dept = weighted(DEPT_WEIGHTS)
+        return "POST", "/api/save-lead", {"data": {
+            "type": dept, "agent": random.choice(main.DEPT_AGENTS[dept]), "client_name": f"Load Client {i}",
+            "charge_amt": f"${random.randint(20, 600)}", "order_id": f"LOAD-{i}", "record_id": f"LOAD-{i}"
+        }}
+    if scenario == "get-lead":
+        dept = weighted({d: n for d, n in seeded.items() if n})
+        return "GET", "/api/get-lead", {"params": {"type": dept, "id": f"SEED-{random.randrange(sum(seeded.values()))}"}}
+    if scenario == "get-lead-recent":
+        return "GET", "/api/get-lead", {"params": {"type": random.choice(["design", "ebook"]), "limit": 50}}
+    if scenario == "manager-data":
+        return "GET", "/api/manager/data", {"params": {"token": token, "v": 2}}
+    if scenario == "search":
+        # Alternates a prefix query (name + partial number) and an exact record ID
+        total = sum(seeded.values())
+        q = f"client {random.randrange(total) // 10}" if i % 2 else f"seed-{random.randrange(total)}"
+        return "GET", "/api/manager/search", {"params": {"token": token, "q": q, "v": 2}}
+    if scenario == "night-stats":
+        return "GET", "/api/public/night-stats", {}
+    if scenario == "leaderboard":
+        return "GET", "/api/live/leaderboard", {}
+    if scenario == "history-totals":
+        return "GET", "/api/manager/history-totals", {"params": {"shifts": 14}}
+    raise ValueError(scenario)
+
+async def run_scenario(client, scenario, main, token, seeded, requests, concurrency):
+    latencies, errors = [], 0
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        nonlocal errors
+        method, url, kwargs = make_request(scenario, main, token, seeded, i)
+        async with sem:
+            start = time.perf_counter()
+            r = await client.request(method, url, **kwargs)
+            latencies.append((time.perf_counter() - start) * 1000)
+        # get-lead for a random id may legitimately 404 (wrong department)
+        if r.status_code >= 500 or (r.status_code >= 400 and scenario != "get-lead"): errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": requests, "concurrency": concurrency, "errors": errors,
+        "p50_ms": round(percentile(latencies, 50), 2), "p99_ms": round(percentile(latencies, 99), 2),
+        "mean_ms": round(statistics.mean(latencies), 2), "max_ms": round(max(latencies), 2),
+        "throughput_rps": round(requests / elapsed, 1)
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(app):
+    import uvicorn
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started: time.sleep(0.05)
+    return server, thread, f"http://127.0.0.1:{port}"
+
+async def run_load(main, args, seeded, base_url):
+    import httpx
+    from api.auth import issue_token
+
+    token = issue_token("bench")
+    transport = httpx.ASGITransport(app=main.app) if base_url is None else None
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url=base_url or "http://bench", timeout=120, limits=limits) as client:
+        for scenario in args.scenarios:
+            results[scenario] = await run_scenario(client, scenario, main, token, seeded, args.requests, args.concurrency)
+            r = results[scenario]
+            print(f"{scenario:<16} n={r['requests']:<5} p50={r['p50_ms']:>8.1f}ms p99={r['p99_ms']:>8.1f}ms "
+                  f"rps={r['throughput_rps']:>7.1f} errors={r['errors']}")
+    return results
+
+
+# --- RESULTS ---
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def compare(current, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline_path} ({baseline.get('git_commit')}, {baseline.get('started_at')}):")
+    for scenario, r in current["scenarios"].items():
+        b = baseline.get("scenarios", {}).get(scenario)
+        if not b: continue
+        print(f"{scenario:<16} p50 {b['p50_ms']:>8.1f} -> {r['p50_ms']:>8.1f}ms   p99 {b['p99_ms']:>8.1f} -> {r['p99_ms']:>8.1f}ms   "
+              f"rps {b['throughput_rps']:>7.1f} -> {r['throughput_rps']:>7.1f}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--leads", type=int, default=30000, help="Seeded leads across the five collections")
+    parser.add_argument("--shifts", type=int, default=14, help="Shifts the seeded leads are spread over")
+    parser.add_argument("--requests", type=int, default=300, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--transport", choices=["http", "asgi"], default="http")
+    parser.add_argument("--mongomock", action="store_true", help="In-memory mongomock instead of MONGO_URI")
+    parser.add_argument("--out", help="Results file (default benchmarks/results/load-<UTC time>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch database afterwards")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+    os.environ.setdefault("MONGO_DB", "twh_portal_bench")
+    if os.environ["MONGO_DB"] == "twh_portal":
+        sys.exit("Refusing to seed and drop the production database name; set MONGO_DB to a scratch name.")
+    os.environ.setdefault("GCP_SERVICE_ACCOUNT", "{}")  # sheets "configured"; the client is faked
+    os.environ.setdefault("PUSHBULLET_TOKEN", "bench")
+    os.environ.setdefault("AUTH_SECRET", "bench")
+    for key in ["PUSHER_APP_ID", "PUSHER_KEY", "PUSHER_SECRET", "PUSHER_CLUSTER"]:
+        os.environ.setdefault(key, "1")
+    if args.mongomock: use_mongomock()
+
+    from api import main
+    from api.db import get_db, mongo_client
+    fakes = install_fakes(main)
+    db = get_db()
+
+    started_at = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    try:
+        t0 = time.perf_counter()
+        seeded = seed(main, args.leads, args.shifts)
+        print(f"Seeded {sum(seeded.values())} leads {seeded} in {time.perf_counter() - t0:.1f}s")
+
+        server = None
+        if args.transport == "http":
+            server, thread, base_url = start_server(main.app)
+        else:
+            base_url = None
+        try:
+            scenarios = asyncio.run(run_load(main, args, seeded, base_url))
+        finally:
+            if server:
+                server.should_exit = True
+                thread.join(10)
+    finally:
+        if not args.keep: db.client.drop_database(db.name)
+
+    results = {
+        "started_at": started_at, "git_commit": git_commit(), "python": platform.python_version(),
+        "mongo": "mongomock" if args.mongomock else os.environ["MONGO_URI"].split("@")[-1],
+        "transport": args.transport, "seeded": seeded,
+        "params": {k: getattr(args, k) for k in ["leads", "shifts", "requests", "concurrency", "seed"]},
+        "fakes": {"pusher_events": fakes["pusher"].events, "pushbullet_pushes": fakes["pushbullet"].pushes,
+                  "sheet_rows": sum(len(ws.rows) for sh in fakes["gspread"].spreadsheets.values() for ws in sh.sheets.values())},
+        "scenarios": scenarios
+    }
+    out = args.out or os.path.join(ROOT, "benchmarks", "results", f"load-{started_at}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {out}")
+    if args.compare: compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -409,21 +409,19 @@ if(newLeadBtn) {
         }
     `;
 
-    function checkTeamGoal() {
-        // Safety check
-        if (typeof nightStats === 'undefined' || !nightStats.billing) return;
-
-        const total = nightStats.billing.total;
-        const TARGET = 1000; // $1000 Threshold
+    // Goal progress comes from the server (LEADERBOARD_GOALS, api/leaderboard.py via main.js)
+    function checkTeamGoal(board) {
+        const billing = board.departments.find(d => d.dept === 'billing');
+        if (!billing || !billing.goal) return;
 
-        if (total >= TARGET) {
-            if (!isGoldMode) enableGoldMode();
+        if (billing.reached) {
+            if (!isGoldMode) enableGoldMode(billing.goal);
         } else {
             if (isGoldMode) disableGoldMode();
         }
     }
 
-    function enableGoldMode() {
+    function enableGoldMode(goal) {
         isGoldMode = true;
         
         // Inject CSS
@@ -434,7 +432,7 @@ if(newLeadBtn) {
 
         // Notify
         if(typeof showToast === 'function') {
-            showToast("💰 $1000 HIT: GOLD MODE UNLOCKED! 💰");
+            showToast(`💰 $${goal.toLocaleString()} HIT: GOLD MODE UNLOCKED! 💰`);
         }
 
         // Confetti
@@ -460,8 +458,8 @@ if(newLeadBtn) {
         if (style) style.remove();
     }
 
-    // Check every 2 seconds
-    setInterval(checkTeamGoal, 2000);
+    // Re-checked whenever the board changes
+    document.addEventListener('leaderboard', e => checkTeamGoal(e.detail));
 })();
 
 /* =========================================
@@ -809,9 +807,34 @@ if(newLeadBtn) {
             console.log("GTA Module: Connected using Vercel Keys 🔌");
 
             const pusher = new Pusher(window.PUSHER_KEY, { cluster: window.PUSHER_CLUSTER });
-            const channel = pusher.subscribe('techware-channel');
+            const agentDropdown = document.getElementById('agent');
+            let channel = null;
+
+            // Status updates arrive on the selected agent's own channel (same naming as api/events.py)
+            function agentChannel(name) {
+                return 'techware-agent-' + name.toLowerCase().replace(/[^a-z0-9]+/g, '-').replace(/^-+|-+$/g, '');
+            }
+
+            function subscribeAgent() {
+                if (channel) { pusher.unsubscribe(channel.name); channel = null; }
+                const name = agentDropdown ? agentDropdown.value : '';
+                if (!name) return;
+                channel = pusher.subscribe(agentChannel(name));
+                channel.bind('status-update', showApproval);
+                channel.bind('status-update-batch', showBatchApproval);
+            }
+            if (agentDropdown) agentDropdown.addEventListener('change', subscribeAgent);
+            subscribeAgent();
 
-            channel.bind('status-update', function(data) {
+            // Bulk approvals: celebrate the first lead of yours in the batch
+            function showBatchApproval(data) {
+                const agentDropdown = document.getElementById('agent');
+                const myAgentName = agentDropdown ? agentDropdown.value : '';
+                const mine = (data.items || []).find(item => item.status === 'Charged' && item.agent === myAgentName);
+                if (mine) showApproval(mine);
+            }
+
+            function showApproval(data) {
                 // Get the name currently selected in the dropdown
                 const agentDropdown = document.getElementById('agent');
                 const myAgentName = agentDropdown ? agentDropdown.value : '';
@@ -828,7 +851,7 @@ if(newLeadBtn) {
                     
                     setTimeout(() => overlay.classList.remove('active'), 5000);
                 }
-            });
+            }
         }
     }, 500);
 })();
@@ -245,13 +245,65 @@ document.addEventListener("DOMContentLoaded", function() {
         });
     }
 
-    // --- 6. PUSHER LISTENERS (CUSTOMIZED) ---
+    // --- 6. Live Leaderboard (ranked on the server, api/leaderboard.py) ---
+    // Widgets listen for a 'leaderboard' event on document; its detail is the
+    // whole board, kept current from the "leaderboard-update" pushes.
+    const LEADERBOARD_PAGES = ['manager', 'billing'];
+    const useLeaderboard = LEADERBOARD_PAGES.includes(PAGE_TYPE);
+    let liveBoard = null;
+
+    function boardKey(entry) { return entry.dept + '|' + (entry.name || ''); }
+    function byRank(a, b) { return (a.rank - b.rank) || boardKey(a).localeCompare(boardKey(b)); }
+
+    function applyBoardChanges(data) {
+        if (data.mode === 'full') {
+            liveBoard = data;
+        } else {
+            const agents = new Map(liveBoard.agents.map(e => [boardKey(e), e]));
+            (data.removed || []).forEach(e => agents.delete(boardKey(e)));
+            data.agents.forEach(e => agents.set(boardKey(e), e));
+            const depts = new Map(liveBoard.departments.map(e => [e.dept, e]));
+            data.departments.forEach(e => depts.set(e.dept, e));
+            liveBoard = {
+                version: data.version, shift_date: data.shift_date,
+                agents: [...agents.values()].sort(byRank), departments: [...depts.values()].sort(byRank)
+            };
+        }
+        document.dispatchEvent(new CustomEvent('leaderboard', { detail: liveBoard }));
+    }
+
+    async function fetchLeaderboard() {
+        const since = liveBoard ? `?since=${encodeURIComponent(liveBoard.version)}` : '';
+        try {
+            const res = await fetch('/api/live/leaderboard' + since);
+            if (res.status === 304 || !res.ok) return;
+            const data = await res.json();
+            if (data.mode === 'full' || (liveBoard && data.base === liveBoard.version)) applyBoardChanges(data);
+        } catch(e) { console.error("Leaderboard Error", e); }
+    }
+
+    function onLeaderboardUpdate(data) {
+        // A delta only applies on top of the version it was computed from; anything else refetches
+        if (data.mode === 'delta' && liveBoard && data.base === liveBoard.version) applyBoardChanges(data);
+        else if (!liveBoard || data.version !== liveBoard.version) fetchLeaderboard();
+    }
+
+    if (useLeaderboard) {
+        fetchLeaderboard();
+        // Catches up after pushes missed while disconnected
+        setInterval(fetchLeaderboard, 120000);
+    }
+
+    // --- 7. PUSHER LISTENERS (CUSTOMIZED) ---
     if (window.PUSHER_KEY) {
         const pusher = new Pusher(window.PUSHER_KEY, { cluster: window.PUSHER_CLUSTER });
-        const channel = pusher.subscribe('techware-channel');
+        // Chat is shared; lead events come per department, all of them for the manager (api/events.py)
+        const chatChannel = pusher.subscribe('techware-channel');
+        const channel = pusher.subscribe(PAGE_TYPE === 'manager' ? 'techware-manager' : `techware-dept-${PAGE_TYPE}`);
+        if (useLeaderboard) pusher.subscribe('techware-leaderboard').bind('leaderboard-update', onLeaderboardUpdate);
         
         if(showChat) {
-            channel.bind('new-chat', function(data) {
+            chatChannel.bind('new-chat', function(data) {
                 appendMessage(data);
                 const isSelf = (data.sender === getSenderName());
                 if (!isSelf) {
@@ -274,7 +326,7 @@ document.addEventListener("DOMContentLoaded", function() {
             if(showChat) appendMessage({ sender: 'System', message: `${title}\n${body}`, role: 'success' });
         });
 
-        channel.bind('status-update', function(data) {
+        function announceStatusUpdate(data, ring = true) {
             const status = data.status.toLowerCase();
             const isApproved = status === 'charged' || status === 'approved';
             const llcName = data.llc ? ` on ${data.llc}` : "";
@@ -292,10 +344,25 @@ document.addEventListener("DOMContentLoaded", function() {
             if (PAGE_TYPE === 'insurance' && data.type === 'insurance' && isApproved) shouldRing = true;
             if (PAGE_TYPE === 'billing' && data.type === 'billing') shouldRing = true;
             
-            if (shouldRing) triggerAlert('Update', msg, isApproved ? 'money' : 'error');
+            if (ring && shouldRing) triggerAlert('Update', msg, isApproved ? 'money' : 'error');
             
             if(showChat) appendMessage({ sender: 'System', message: msg, role: isApproved ? 'success' : 'error' });
-            
+        }
+
+        channel.bind('status-update', function(data) {
+            announceStatusUpdate(data);
+            if (PAGE_TYPE === 'manager' && window.fetchData) window.fetchData();
+        });
+
+        // Bulk approvals from the manager console: one event, one refresh
+        channel.bind('status-update-batch', function(data) {
+            const items = data.items || [];
+            items.forEach(item => announceStatusUpdate(item, items.length === 1));
+            if (items.length > 1 && PAGE_TYPE === 'manager') triggerAlert('Update', `${items.length} leads updated`, 'money');
+            if (PAGE_TYPE === 'manager' && window.fetchData) window.fetchData();
+        });
+
+        channel.bind('leads-deleted', function(data) {
             if (PAGE_TYPE === 'manager' && window.fetchData) window.fetchData();
         });
 
@@ -311,6 +378,7 @@ document.addEventListener("DOMContentLoaded", function() {
             
             if(showChat) appendMessage({ sender: 'System', message: msg, role: 'warning' });
             
+            if (PAGE_TYPE === 'manager' && window.forgetCardSecrets) window.forgetCardSecrets();
             if (PAGE_TYPE === 'manager' && window.fetchData) window.fetchData();
         });
     }
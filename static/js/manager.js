@@ -8,6 +8,9 @@ let allData = {
 };
 let pendingSubTab = 'billing';
 let myChart = null;
+let lastSync = null; // sync_token from the last /api/manager/data response
+const LEAD_DEPTS = ['billing', 'telecom', 'insurance', 'design', 'ebook'];
+const WIRE_VERSION = 2; // rows use the canonical snake_case fields (api/models.py)
 
 const token = sessionStorage.getItem('twh_token');
 if (token) {
@@ -38,14 +41,18 @@ async function fetchData() {
     const t = sessionStorage.getItem('twh_token');
     if (!t) return;
     
-    const res = await fetch(`/api/manager/data?token=${t}&_t=${new Date().getTime()}`);
+    const params = new URLSearchParams({ token: t, v: WIRE_VERSION, _t: new Date().getTime() });
+    if (lastSync) params.set('since', lastSync);
+    const res = await fetch(`/api/manager/data?${params}`);
+    if (res.status === 401) { logout(); return; }
     const json = await res.json();
     
-    allData.billing = json.billing || [];
-    allData.telecom = json.telecom || [];
-    allData.insurance = json.insurance || [];
-    allData.design = json.design || [];
-    allData.ebook = json.ebook || [];
+    // Delta responses only carry rows changed since lastSync (plus deleted ids)
+    LEAD_DEPTS.forEach(dept => {
+        if (json.mode === 'delta') allData[dept] = mergeRows(allData[dept], json[dept] || [], (json.deleted || {})[dept] || []);
+        else allData[dept] = json[dept] || [];
+    });
+    lastSync = json.sync_token || null;
     
     allData.stats_bill = json.stats_bill || {today:0, night:0, pending:0, breakdown:{}};
     allData.stats_telecom = json.stats_telecom || {today:0, night:0, pending:0, breakdown:{}};
@@ -53,6 +60,11 @@ async function fetchData() {
     allData.stats_design = json.stats_design || {total:0, breakdown:{}};
     allData.stats_ebook = json.stats_ebook || {total:0, breakdown:{}};
     
+    refreshViews();
+    startDeltaStream();
+}
+
+function refreshViews() {
     updateDashboardStats(); 
     updateDepartmentTotals();
     if(!document.getElementById('viewPending').classList.contains('hidden')) renderPendingCards();
@@ -60,6 +72,46 @@ async function fetchData() {
     if(!document.getElementById('viewAnalysis').classList.contains('hidden')) renderAnalysis();
 }
 
+// --- LIVE DELTAS (server change stream over SSE) ---
+let deltaStream = null;
+let deltaStreamUnavailable = false;
+let renderTimer = null;
+
+function startDeltaStream() {
+    const t = sessionStorage.getItem('twh_token');
+    if (!t || !window.EventSource || deltaStream || deltaStreamUnavailable) return;
+    deltaStream = new EventSource(`/api/manager/stream?token=${encodeURIComponent(t)}&v=${WIRE_VERSION}`);
+    deltaStream.addEventListener('delta', (e) => applyDelta(JSON.parse(e.data)));
+    deltaStream.addEventListener('reset', () => {
+        // Resume token gap: start a fresh stream after a full reload
+        stopDeltaStream();
+        lastSync = null;
+        fetchData();
+    });
+    deltaStream.addEventListener('unavailable', () => { deltaStreamUnavailable = true; stopDeltaStream(); });
+}
+
+function stopDeltaStream() {
+    if (deltaStream) { deltaStream.close(); deltaStream = null; }
+}
+
+function applyDelta(delta) {
+    if (delta.coll === 'twh_chargebacks') { fetchChargebackData(); return; }
+    if (!LEAD_DEPTS.includes(delta.coll)) return;
+    const changed = (delta.op !== 'delete' && delta.doc) ? [delta.doc] : [];
+    allData[delta.coll] = mergeRows(allData[delta.coll], changed, [delta.id]);
+    // Bursts of deltas re-render once
+    clearTimeout(renderTimer);
+    renderTimer = setTimeout(refreshViews, 300);
+}
+
+function mergeRows(current, changed, deletedIds) {
+    const drop = new Set([...deletedIds, ...changed.map(r => r._id)]);
+    const kept = current.filter(r => !drop.has(r._id));
+    // timestamp_str is "YYYY-MM-DD HH:MM:SS", so string order is time order (newest first)
+    return [...changed, ...kept].sort((a, b) => String(b.timestamp_str || '').localeCompare(String(a.timestamp_str || '')));
+}
+
 function updateDashboardStats() {
     const dept = document.getElementById('statsSelector').value;
     const stats = dept === 'billing' ? allData.stats_bill : (dept === 'telecom' ? allData.stats_telecom : allData.stats_ins);
@@ -186,12 +238,14 @@ function switchPendingSubTab(tab) {
 function renderPendingCards() {
     const container = document.getElementById('pendingContainer');
     container.innerHTML = '';
+    document.getElementById('bulkSelectAll').checked = false;
+    updateBulkCount();
     let rawData = [];
     if(pendingSubTab === 'billing') rawData = allData.billing;
     else if(pendingSubTab === 'telecom') rawData = allData.telecom;
     else rawData = allData.insurance;
 
-    const data = rawData.filter(row => row['Status'] === 'Pending').slice().reverse();
+    const data = rawData.filter(row => row.status === 'Pending').slice().reverse();
 
     if(data.length === 0) {
         container.innerHTML = `<div class="col-span-3 text-center text-slate-500 py-10">No pending orders.</div>`;
@@ -205,12 +259,10 @@ function renderPendingCards() {
 
     data.forEach(row => {
         // We capture both IDs here
-        const uniqueRowIndex = row['row_index'] || row['_id']; 
-        const id = row['Record_ID'] || row['Order ID']; 
+        const uniqueRowIndex = row['_id']; 
+        const id = row['record_id']; 
         
-        const cleanCharge = String(row['charge_str'] || row['Charge Amount'] || '').replace(/[^0-9.]/g, '');
-        const cleanCard = String(row['card_number'] || '').replace(/\s+/g, ''); 
-        const cleanExpiry = String(row['exp_date'] || '').replace(/[\/\\]/g, ''); 
+        const cleanCharge = String(row['charge_str'] || '').replace(/[^0-9.]/g, '');
         const address = row['Address'] || row['address'] || row['adress'] || 'N/A';
     
         const card = document.createElement('div');
@@ -220,20 +272,21 @@ function renderPendingCards() {
             <input type="hidden" class="row-index" value="${uniqueRowIndex}">
             
             <div class="bg-slate-900/50 p-4 border-b border-slate-700">
-                <div class="flex justify-between items-center">
-                    <h3 class="text-white font-bold text-lg truncate">${row['agent']} — <span class="text-green-400">$${cleanCharge}</span></h3>
+                <div class="flex justify-between items-center gap-3">
+                    <input type="checkbox" class="bulk-select w-4 h-4 accent-blue-500 shrink-0" onchange="updateBulkCount()">
+                    <h3 class="text-white font-bold text-lg truncate mr-auto">${row['agent']} — <span class="text-green-400">$${cleanCharge}</span></h3>
                     <div class="text-xs text-slate-400">(${row['llc'] || row['provider']})</div>
                 </div>
             </div>
             <div class="p-4 space-y-2 text-sm font-mono text-slate-300">
-                <div class="flex"><span class="w-36 text-slate-500 font-semibold shrink-0">Card Number:</span><span class="text-white tracking-widest font-bold">${cleanCard}</span></div>
-                <div class="flex"><span class="w-36 text-slate-500 font-semibold shrink-0">Expiry Date:</span><span class="text-white">${cleanExpiry}</span></div>
+                <div class="flex"><span class="w-36 text-slate-500 font-semibold shrink-0">Card Number:</span><span class="secret-card_number text-white tracking-widest font-bold">••••</span></div>
+                <div class="flex"><span class="w-36 text-slate-500 font-semibold shrink-0">Expiry Date:</span><span class="secret-exp_date text-white">••••</span></div>
                 <div class="flex"><span class="w-36 text-slate-500 font-semibold shrink-0">Charge:</span><span class="text-green-400 font-bold">$${cleanCharge}</span></div>
                 <div class="flex"><span class="w-36 text-slate-500 font-semibold shrink-0">Card Name:</span><span class="text-white">${row['card_holder']}</span></div>
                 <div class="flex"><span class="w-36 text-slate-500 font-semibold shrink-0">Phone:</span><span class="text-white">${row['phone']}</span></div>
                 <div class="flex"><span class="w-36 text-slate-500 font-semibold shrink-0">Email:</span><span class="text-blue-300 truncate">${row['email']}</span></div>
                 <div class="flex"><span class="w-36 text-slate-500 font-semibold shrink-0">Address:</span><span class="text-white break-words w-full">${address}</span></div>
-                <div class="flex"><span class="w-36 text-slate-500 font-semibold shrink-0">CVC:</span><span class="text-red-400 font-bold">${row['cvc']}</span></div>
+                <div class="flex"><span class="w-36 text-slate-500 font-semibold shrink-0">CVC:</span><span class="secret-cvc text-red-400 font-bold">•••</span></div>
             </div>
     
             <div class="px-4 mb-4">
@@ -250,9 +303,92 @@ function renderPendingCards() {
             </div>
         `;
         container.appendChild(card);
+        fillCardSecrets(card, pendingSubTab, uniqueRowIndex);
     });
 }
 
+// Card number, expiry and CVC are not part of the manager rows (api/vault.py):
+// each pending card looks its lead up once, and the answer is kept for the session.
+const cardSecrets = new Map();
+
+async function fillCardSecrets(card, type, rowIndex) {
+    if (!cardSecrets.has(rowIndex)) {
+        cardSecrets.set(rowIndex, fetch(`/api/get-lead?type=${type}&row_index=${encodeURIComponent(rowIndex)}&v=2`)
+            .then(res => res.json())
+            .then(res => res.status === 'success' ? res.data : null)
+            .catch(() => null));
+    }
+    const data = await cardSecrets.get(rowIndex);
+    if (!data) { cardSecrets.delete(rowIndex); return; }
+    const show = (field, value) => { const el = card.querySelector(`.secret-${field}`); if (el) el.innerText = value; };
+    show('card_number', String(data.card_number || '').replace(/\s+/g, ''));
+    show('exp_date', String(data.exp_date || '').replace(/[\/\\]/g, ''));
+    show('cvc', data.cvc || '');
+}
+
+// An edited lead may have new card details
+window.forgetCardSecrets = () => cardSecrets.clear();
+
+/* =========================================
+   BULK ACTIONS (selected pending cards)
+   One request and one Pusher event for the whole selection
+   ========================================= */
+
+function selectedPendingCards() {
+    return [...document.querySelectorAll('#pendingContainer .pending-card')].filter(c => c.querySelector('.bulk-select').checked);
+}
+
+function updateBulkCount() {
+    document.getElementById('bulkSelectedCount').innerText = `${selectedPendingCards().length} selected`;
+}
+
+function toggleSelectAllPending(checked) {
+    document.querySelectorAll('#pendingContainer .bulk-select').forEach(cb => cb.checked = checked);
+    updateBulkCount();
+}
+
+async function postBulk(url, payload) {
+    const res = await fetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ token: sessionStorage.getItem('twh_token'), ...payload })
+    });
+    if (res.status === 401) { logout(); return null; }
+    return res.json();
+}
+
+function reportBulk(data) {
+    if (!data) return;
+    if (data.status !== 'success') { alert("Error: " + data.message); return; }
+    const failed = data.results.filter(r => r.status !== 'updated' && r.status !== 'deleted');
+    if (failed.length) {
+        alert(`${failed.length} lead(s) were not changed:\n` + failed.slice(0, 10).map(r => `${r.row_index}: ${r.message || r.status}`).join('\n'));
+    }
+    fetchData();
+}
+
+async function bulkSetStatus(status) {
+    const cards = selectedPendingCards();
+    if (cards.length === 0) return;
+    const missing = cards.filter(c => !c.querySelector('select').value);
+    if (missing.length) {
+        alert(`Action Required: select an LLC on all ${missing.length} highlighted lead(s) first.`);
+        missing.forEach(c => c.querySelector('select').classList.add('border-red-500'));
+        return;
+    }
+    if (!confirm(`${status === 'Charged' ? 'Approve' : 'Decline'} ${cards.length} lead(s)?`)) return;
+    const items = cards.map(c => ({ type: pendingSubTab, row_index: c.querySelector('.row-index').value, llc: c.querySelector('select').value }));
+    reportBulk(await postBulk('/api/manager/bulk_update_status', { items, status }));
+}
+
+async function bulkDeleteSelected() {
+    const cards = selectedPendingCards();
+    if (cards.length === 0) return;
+    if (!confirm(`Permanently delete ${cards.length} lead(s)?`)) return;
+    const items = cards.map(c => ({ type: pendingSubTab, row_index: c.querySelector('.row-index').value }));
+    reportBulk(await postBulk('/api/manager/bulk_delete', { items }));
+}
+
 /* =========================================
    2. FIXED: validateAndSetStatus
    (Smart Logic: Finds dropdown inside the card)
@@ -297,15 +433,51 @@ async function validateAndSetStatus(type, id, status, btnElement) {
 function updateAgentSelector() {
     const type = document.getElementById('analysisSheetSelector').value;
     const data = allData[type] || [];
-    const agents = [...new Set(data.map(item => item['Agent Name']))].sort();
+    const agents = [...new Set(data.map(item => item.agent))].sort();
     const selector = document.getElementById('analysisAgentSelector');
     selector.innerHTML = '<option value="all">All Agents</option>';
     agents.forEach(agent => { if(agent) { const opt = document.createElement('option'); opt.value = agent; opt.innerText = agent; selector.appendChild(opt); } });
 }
 
+// --- SERVER SEARCH (analysis tab) ---
+// 2+ characters search every lead of the selected department on the server
+// (/api/manager/search), not just the rows downloaded above; the date range
+// is ignored while a search is active.
+const SEARCH_MIN_CHARS = 2;
+const SEARCH_LIMIT = 100;
+let searchResults = null; // { type, q, rows } for the last completed search
+let searchTimer = null;
+
+function onAnalysisSearch() {
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(runAnalysisSearch, 250);
+}
+
+async function runAnalysisSearch() {
+    const type = document.getElementById('analysisSheetSelector').value;
+    const q = document.getElementById('analysisSearch').value.trim();
+    if (q.length < SEARCH_MIN_CHARS) { searchResults = null; renderAnalysis(); return; }
+
+    const params = new URLSearchParams({ token: sessionStorage.getItem('twh_token'), q, dept: type, limit: SEARCH_LIMIT, v: WIRE_VERSION });
+    try {
+        const res = await fetch(`/api/manager/search?${params}`);
+        if (res.status === 401) { logout(); return; }
+        const json = await res.json();
+        // A newer keystroke or department change supersedes this response
+        if (q !== document.getElementById('analysisSearch').value.trim() || type !== document.getElementById('analysisSheetSelector').value) return;
+        searchResults = json.status === 'success' ? { type, q, rows: json.data } : null;
+    } catch (e) {
+        console.error(e);
+        searchResults = null;
+    }
+    renderAnalysis();
+}
+
 function renderAnalysis() {
     const type = document.getElementById('analysisSheetSelector').value;
     const search = document.getElementById('analysisSearch').value.toLowerCase();
+    const q = document.getElementById('analysisSearch').value.trim();
+    const serverSearch = searchResults && searchResults.type === type && searchResults.q === q;
     const agentFilter = document.getElementById('analysisAgentSelector').value;
     const statusFilter = document.getElementById('analysisStatusSelector').value;
     
@@ -317,11 +489,16 @@ function renderAnalysis() {
     let dStart = new Date(dateStartVal); dStart.setHours(0,0,0,0);
     let dEnd = new Date(dateEndVal); dEnd.setHours(23,59,59,999);
 
-    const data = allData[type] || [];
+    const data = serverSearch ? searchResults.rows : (allData[type] || []);
     
     const filtered = data.filter(row => {
+        if (serverSearch) {
+            if(agentFilter !== 'all' && row.agent !== agentFilter) return false;
+            return statusFilter === 'all' || row.status === statusFilter;
+        }
+
         // 1. Create Date object from the record's timestamp
-        const t = new Date(row['Timestamp']);
+        const t = new Date(row.timestamp_str);
         
         // --- FIX: Apply Shift Logic (Subtract 8 Hours) ---
         // 8 hours * 60 mins * 60 secs * 1000 ms = 28800000 ms
@@ -333,8 +510,8 @@ function renderAnalysis() {
         if(shiftDate < dStart || shiftDate > dEnd) return false;
 
         // 3. Apply other filters (Agent, Status, Search)
-        if(agentFilter !== 'all' && row['Agent Name'] !== agentFilter) return false;
-        if(statusFilter !== 'all' && row['Status'] !== statusFilter) return false;
+        if(agentFilter !== 'all' && row.agent !== agentFilter) return false;
+        if(statusFilter !== 'all' && row.status !== statusFilter) return false;
         
         // Search text
         return JSON.stringify(row).toLowerCase().includes(search);
@@ -346,19 +523,19 @@ function renderAnalysis() {
     
     filtered.forEach(r => {
         // Clean the charge amount string to a number
-        const raw = String(r['Charge']).replace(/[^0-9.]/g, '');
+        const raw = String(r.charge_str).replace(/[^0-9.]/g, '');
         const val = parseFloat(raw) || 0;
         
         // Status Logic: Billing/Insurance need "Charged", others count everything
         let shouldCount = false;
         if(type === 'design' || type === 'ebook') shouldCount = true;
-        else if(r['Status'] === 'Charged') shouldCount = true;
+        else if(r.status === 'Charged') shouldCount = true;
 
         if(shouldCount) {
             total += val;
             
             // For the Chart: Extract the hour
-            const hour = r['Timestamp'].substring(11, 13) + ":00";
+            const hour = r.timestamp_str.substring(11, 13) + ":00";
             hours[hour] = (hours[hour] || 0) + val;
         }
     });
@@ -380,11 +557,14 @@ function renderAnalysis() {
     myChart = new Chart(ctx, { type: 'line', data: { labels: sortedHours, datasets: [{ label: 'Hourly Charged', data: values, borderColor: '#3b82f6', backgroundColor: 'rgba(59, 130, 246, 0.1)', tension: 0.4, fill: true }] }, options: { responsive: true, maintainAspectRatio: false, plugins: { legend: { display: false } }, scales: { y: { beginAtZero: true, grid: { color: '#334155' } }, x: { grid: { display: false } } } } });
 
     // --- Render Table Columns ---
+    // Column label -> wire field, where lower_snake_case of the label is not the field
+    const COLUMN_FIELDS = { "Agent Name": "agent", "Name": "client_name", "Charge": "charge_str", "Service": "provider", "Timestamp": "timestamp_str" };
     let columns = [];
     if (type === 'billing' || type === 'telecom') {
-        columns = ["Record_ID", "Agent Name", "Name", "Phone", "Email", "Address", "Card Number", "Exp Date", "CVC", "Charge", "Status", "LLC", "Provider", "PIN/Acc", "Timestamp"];
+        // Card fields stay out of the table (api/vault.py); the pending cards show them per lead
+        columns = ["Record_ID", "Agent Name", "Name", "Phone", "Email", "Address", "Charge", "Status", "LLC", "Provider", "Timestamp"];
     } else if (type === 'insurance') {
-        columns = ["Record_ID", "Agent Name", "Name", "Phone", "Email", "Address", "Card Number", "Exp Date", "CVC", "Charge", "Status", "LLC", "Timestamp"];
+        columns = ["Record_ID", "Agent Name", "Name", "Phone", "Email", "Address", "Charge", "Status", "LLC", "Timestamp"];
     } else {
         columns = ["Record_ID", "Agent Name", "Name", "Service", "Charge", "Status", "Timestamp"];
     }
@@ -398,15 +578,7 @@ function renderAnalysis() {
         tbody.innerHTML = filtered.map(row => {
             return `<tr class="border-b border-slate-800 hover:bg-slate-800 transition">
                 ${columns.map(col => {
-                    let val = row[col];
-                    if (!val) {
-                        const key = col.toLowerCase().replace(/ /g, '_').replace(/\//g, '_').replace('.', '');
-                        val = row[key];
-                    }
-                    if (!val && col === 'Name') val = row['Client Name'];
-                    if (!val && col === 'Service') val = row['Provider'] || row['provider'];
-                    if (!val && col === 'PIN/Acc') val = row['pin_code'] || row['account_number'];
-                    if (!val && col === 'Exp Date') val = row['exp_date'] || row['Expiry Date'];
+                    let val = row[COLUMN_FIELDS[col] || col.toLowerCase().replace(/ /g, '_')];
                     if (!val) val = ''; 
 
                     let color = 'text-slate-300';
@@ -719,6 +891,7 @@ async function processLeadWithLLC(type, id, status, btn) {
             font-weight: 900;
         }
         .tag-bill { background-color: #22c55e; } /* Green */
+        .tag-tel  { background-color: #eab308; } /* Yellow */
         .tag-ins  { background-color: #3b82f6; } /* Blue */
         .tag-dsgn { background-color: #d946ef; } /* Purple */
         .tag-book { background-color: #f97316; } /* Orange */
@@ -744,57 +917,36 @@ async function processLeadWithLLC(type, id, status, btn) {
     `;
     document.body.appendChild(tickerContainer);
 
-    // 3. Logic to Aggregate ALL Data
-    function updateGlobalTicker() {
-        if (typeof allData === 'undefined') return;
-
-        // Master list array
-        let consolidatedList = [];
-
-        // Helper to extract data safely
-        function extract(source, deptCode, tagClass) {
-            if (source && source.breakdown) {
-                Object.entries(source.breakdown).forEach(([name, amount]) => {
-                    // Normalize name to Title Case
-                    const cleanName = name.charAt(0).toUpperCase() + name.slice(1).toLowerCase();
-                    consolidatedList.push({
-                        name: cleanName,
-                        amount: parseFloat(amount),
-                        dept: deptCode,
-                        css: tagClass
-                    });
-                });
-            }
-        }
-
-        // A. Extract Billing
-        extract(allData.stats_bill, 'BILL', 'tag-bill');
-        // B. Extract Insurance
-        extract(allData.stats_ins, 'INS', 'tag-ins');
-        // C. Extract Design (Check various common key names)
-        extract(allData.stats_design || allData.stats_web, 'DSGN', 'tag-dsgn');
-        // D. Extract Book Publishing
-        extract(allData.stats_book || allData.stats_publishing, 'BOOK', 'tag-book');
-
-        // Sort: Highest earners first across the whole company
-        consolidatedList.sort((a, b) => b.amount - a.amount);
+    // 3. Draw the server-ranked board (api/leaderboard.py, delivered by main.js)
+    const DEPT_TAGS = {
+        billing: ['BILL', 'tag-bill'], telecom: ['TEL', 'tag-tel'], insurance: ['INS', 'tag-ins'],
+        design: ['DSGN', 'tag-dsgn'], ebook: ['BOOK', 'tag-book']
+    };
 
-        // Generate HTML
+    function updateGlobalTicker(board) {
+        // Generate HTML (agents arrive highest earners first across the whole company)
         let itemsHTML = '';
         
-        if (consolidatedList.length === 0) {
+        if (!board || board.agents.length === 0) {
             itemsHTML = '<div class="ticker-item">WAITING FOR DATA...</div>';
         } else {
-            consolidatedList.forEach(item => {
+            board.agents.forEach(item => {
+                const [tag, css] = DEPT_TAGS[item.dept] || [item.dept.toUpperCase(), ''];
+                // Normalize name to Title Case
+                const cleanName = item.name.charAt(0).toUpperCase() + item.name.slice(1).toLowerCase();
                 const arrow = item.amount > 0 ? '▲' : '▼';
                 const colorClass = item.amount > 0 ? 'val-up' : 'val-down';
                 const money = '$' + item.amount.toLocaleString();
+                // Places gained / lost the last time this agent's standing changed
+                const moved = item.moved > 0 ? `<span class="val-up ml-2">↑${item.moved}</span>`
+                    : item.moved < 0 ? `<span class="val-down ml-2">↓${-item.moved}</span>` : '';
 
                 itemsHTML += `
                     <div class="ticker-item">
-                        <span class="dept-tag ${item.css}">${item.dept}</span>
-                        <span class="text-slate-200 mr-2 font-bold">${item.name}</span>
-                        <span class="${colorClass}">${arrow} ${money}</span>
+                        <span class="text-slate-400 mr-2">#${item.rank}</span>
+                        <span class="dept-tag ${css}">${tag}</span>
+                        <span class="text-slate-200 mr-2 font-bold">${cleanName}</span>
+                        <span class="${colorClass}">${arrow} ${money}</span>${moved}
                     </div>
                 `;
             });
@@ -807,9 +959,9 @@ async function processLeadWithLLC(type, id, status, btn) {
         }
     }
 
-    // 4. Run Loop
-    updateGlobalTicker(); 
-    setInterval(updateGlobalTicker, 5000); // Refresh every 5s
+    // 4. Redraw only when the board changes
+    updateGlobalTicker(null);
+    document.addEventListener('leaderboard', e => updateGlobalTicker(e.detail));
 
 })();
 
@@ -1264,7 +1416,7 @@ window.switchMainTab = function(tab) {
 // 1. FETCH DATA
 async function fetchChargebackData() {
     try {
-        const res = await fetch('/api/manager/twh_chargebacks');
+        const res = await fetch(`/api/manager/twh_chargebacks?v=${WIRE_VERSION}`);
         const json = await res.json();
         if(json.status === 'success') {
             twhCbData = json.data;
@@ -1370,12 +1522,12 @@ function renderCbAnalysis() {
     const tbody = document.getElementById('cbAnalysisBody');
 
     const filtered = twhCbData.filter(row => {
-        const t = new Date(row['Timestamp']);
+        const t = new Date(row.timestamp_str);
         // 8-6 Shift Logic (Subtract 6 hours)
         const shiftDate = new Date(t.getTime() - 21600000); 
 
         if (shiftDate < dStart || shiftDate > dEnd) return false;
-        if (agentVal !== 'all' && row['Agent Name'] !== agentVal) return false;
+        if (agentVal !== 'all' && row.agent !== agentVal) return false;
         return true;
     });
 
@@ -1387,14 +1539,14 @@ function renderCbAnalysis() {
     }
 
     tbody.innerHTML = filtered.map(row => {
-        const amountVal = parseFloat(String(row.amount || row.Charge).replace(/[^0-9.]/g, '')) || 0;
+        const amountVal = parseFloat(row.amount) || 0;
         total += amountVal;
         count++;
         
         return `
             <tr class="border-b border-slate-700 hover:bg-slate-700/50">
-                <td class="p-3 text-slate-400 text-xs font-mono">${row.Timestamp}</td>
-                <td class="p-3 font-bold text-white">${row['Agent Name']}</td>
+                <td class="p-3 text-slate-400 text-xs font-mono">${row.timestamp_str}</td>
+                <td class="p-3 font-bold text-white">${row.agent}</td>
                 <td class="p-3 text-slate-400 text-xs uppercase">${row.dept}</td>
                 <td class="p-3 text-slate-300">${row.client_name}</td>
                 <td class="p-3 text-right font-mono text-red-400">-$${amountVal.toFixed(2)}</td>
@@ -1408,7 +1560,7 @@ function renderCbAnalysis() {
 
 function updateCbFilterAgents() {
     const sel = document.getElementById('cbFilterAgent');
-    const agents = [...new Set(twhCbData.map(d => d['Agent Name']))].sort();
+    const agents = [...new Set(twhCbData.map(d => d.agent))].sort();
     const current = sel.value;
     sel.innerHTML = '<option value="all">All Agents</option>';
     agents.forEach(a => {
@@ -1509,10 +1661,10 @@ window.renderFinalTotal = function() {
         
         const data = allData[dept] || [];
         data.forEach(row => {
-            const agentName = row['Agent Name'] || row['agent'] || 'Unknown';
+            const agentName = row.agent || 'Unknown';
             agentsSet.add(agentName);
 
-            const t = new Date(row['Timestamp']);
+            const t = new Date(row.timestamp_str);
             const shiftDate = new Date(t.getTime() - 21600000); // Adjusting 8-6 shift (-6 hours)
 
             if (shiftDate >= dStart && shiftDate <= dEnd) {
@@ -1520,10 +1672,10 @@ window.renderFinalTotal = function() {
                     
                     let shouldCount = false;
                     if(dept === 'design' || dept === 'ebook') shouldCount = true;
-                    else if(row['Status'] === 'Charged') shouldCount = true;
+                    else if(row.status === 'Charged') shouldCount = true;
 
                     if(shouldCount) {
-                        const raw = String(row['Charge']).replace(/[^0-9.]/g, '');
+                        const raw = String(row.charge_str).replace(/[^0-9.]/g, '');
                         grossSales += (parseFloat(raw) || 0);
                     }
                 }
@@ -1553,12 +1705,12 @@ window.renderFinalTotal = function() {
         twhCbData.forEach(row => {
             if(deptVal !== 'all' && row['dept'] !== deptVal) return;
 
-            const t = new Date(row['Timestamp']); 
+            const t = new Date(row.timestamp_str); 
             const shiftDate = new Date(t.getTime() - 21600000); 
 
             if (shiftDate >= dStart && shiftDate <= dEnd) {
-                if (agentVal === 'all' || row['Agent Name'] === agentVal) {
-                    const amountVal = parseFloat(String(row.amount || row.Charge).replace(/[^0-9.]/g, '')) || 0;
+                if (agentVal === 'all' || row.agent === agentVal) {
+                    const amountVal = parseFloat(row.amount) || 0;
                     cbAmount += amountVal;
                     cbCount++;
                 }
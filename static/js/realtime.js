@@ -0,0 +1,59 @@
+/* =========================================
+   IN-PROCESS REALTIME HUB CLIENT
+   ========================================= */
+// Loaded instead of pusher.min.js when the server runs with REALTIME_BACKEND=hub
+// (api/hub.py). Provides the part of the Pusher client the pages use
+// (new Pusher(), subscribe, unsubscribe, channel.bind) over one EventSource,
+// which reconnects by itself after a network drop or a slow-client eviction.
+
+(function() {
+    function HubChannel(name) {
+        this.name = name;
+        this.handlers = {};
+    }
+    HubChannel.prototype.bind = function(event, fn) {
+        (this.handlers[event] = this.handlers[event] || []).push(fn);
+        return this;
+    };
+
+    function HubPusher() {
+        this.channels = {};
+        this.source = null;
+        this.connectTimer = null;
+    }
+    HubPusher.prototype.subscribe = function(name) {
+        if (!this.channels[name]) {
+            this.channels[name] = new HubChannel(name);
+            this.reconnect();
+        }
+        return this.channels[name];
+    };
+    HubPusher.prototype.unsubscribe = function(name) {
+        delete this.channels[name];
+        this.reconnect();
+    };
+    // Subscriptions made in the same tick share one connection
+    HubPusher.prototype.reconnect = function() {
+        clearTimeout(this.connectTimer);
+        this.connectTimer = setTimeout(() => this.connect(), 0);
+    };
+    HubPusher.prototype.connect = function() {
+        if (this.source) this.source.close();
+        this.source = null;
+        const names = Object.keys(this.channels);
+        if (!names.length) return;
+        this.source = new EventSource('/api/realtime/stream?' + new URLSearchParams({ channels: names.join(',') }));
+        this.source.onmessage = (e) => {
+            const msg = JSON.parse(e.data);
+            const channel = this.channels[msg.channel];
+            ((channel && channel.handlers[msg.event]) || []).forEach(fn => fn(msg.data));
+        };
+    };
+
+    window.Pusher = HubPusher;
+    // main.js / billing.js only connect when a key is set; the hub needs none.
+    // Registered before main.js's listener, so it runs first.
+    document.addEventListener('DOMContentLoaded', () => {
+        if (!window.PUSHER_KEY || window.PUSHER_KEY === 'None') window.PUSHER_KEY = 'hub';
+    });
+})();
@@ -0,0 +1,90 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The app reads these at import time
+os.environ.setdefault("AUTH_SECRET", "test-secret")
+os.environ["MONGO_DB"] = "twh_portal_test"
+for key in ["PUSHER_APP_ID", "PUSHER_KEY", "PUSHER_SECRET", "PUSHER_CLUSTER"]:
+    os.environ.setdefault(key, "1")
+
+
+def use_mongomock():
+    import mongomock
+    import pymongo
+    import mongomock.collection
+    pymongo.MongoClient = mongomock.MongoClient
+    # mongomock's bulk builder predates pymongo's UpdateOne / ReplaceOne(sort=...)
+    builder = mongomock.collection.BulkOperationBuilder
+    add_update, add_replace = builder.add_update, builder.add_replace
+    builder.add_update = lambda self, *a, sort=None, **k: add_update(self, *a, **k)
+    builder.add_replace = lambda self, *a, sort=None, **k: add_replace(self, *a, **k)
+
+use_mongomock()
+
+
+class FakePusher:
+    def __init__(self): self.events = []
+    def trigger(self, channels, event, data): self.events.append((channels, event, data))
+    def trigger_batch(self, batch): self.events.extend((b["channel"], b["name"], b["data"]) for b in batch)
+
+
+@pytest.fixture(autouse=True)
+def db():
+    """Empty scratch database for every test."""
+    from api.db import get_db
+    database = get_db()
+    for name in database.list_collection_names():
+        database[name].delete_many({})
+    return database
+
+
+@pytest.fixture
+def main():
+    from api import main as app_main
+    app_main.pusher_client = FakePusher()
+    app_main.get_gc = lambda: None
+    app_main.send_pushbullet = lambda title, body: None
+    return app_main
+
+
+@pytest.fixture
+def client(main):
+    from fastapi.testclient import TestClient
+    # Not entered as a context manager: no lifespan, so no background workers
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def token():
+    from api.auth import issue_token
+    return issue_token("tester")
+
+
+@pytest.fixture
+def in_shift():
+    """A moment one hour into the current shift."""
+    from api.shift_totals import TZ_KARACHI, shift_start_for
+    return shift_start_for(datetime.now(TZ_KARACHI)) + timedelta(hours=1)
+
+
+@pytest.fixture
+def make_lead(in_shift):
+    """Inserts a lead straight into its department collection and returns the stored document."""
+    from api.db import get_lead_collection
+    from api.pagination import utc_now
+
+    def make(dept="billing", created_at=None, **fields):
+        doc = {
+            "record_id": "R1", "agent": "Haziq", "client_name": "Client", "charge_amount": 100.0,
+            "charge_str": "$100.00", "status": "Pending", "created_at": created_at or in_shift,
+            "updated_at": utc_now(), **fields
+        }
+        col = get_lead_collection(dept).col
+        return col.find_one({"_id": col.insert_one(doc).inserted_id})
+    return make
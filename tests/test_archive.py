@@ -0,0 +1,50 @@
+from datetime import timedelta
+
+from api.archive import mark_archived, run_archive
+from api.db import get_archive_collection, get_collection, get_lead_collection
+from api.export import export_filter, export_stream
+from api.shift_totals import compute_from_leads, reconcile, shift_start_for
+
+
+def exported_ids(dept="billing"):
+    lines = b"".join(export_stream("leads", dept, "csv", export_filter())).decode().splitlines()
+    return [line.split(",")[0] for line in lines[1:]]
+
+
+def test_lead_in_both_tiers_counts_once(make_lead, in_shift):
+    created = in_shift - timedelta(days=5)
+    lead = make_lead(record_id="MOVING", status="Charged", created_at=created)
+    make_lead(record_id="HOT", status="Charged")
+    # The archiver copied it but has not deleted the hot copy yet
+    get_archive_collection("billing").col.insert_one(lead)
+    mark_archived("billing", shift_start_for(in_shift) - timedelta(days=1))
+
+    assert compute_from_leads("billing", shift_start_for(created))["total"] == 100
+    assert exported_ids() == ["MOVING", "HOT"]
+
+
+def test_run_archive_keeps_totals_and_exports(make_lead, in_shift):
+    for i in range(5):
+        make_lead(record_id=f"OLD{i}", status="Charged", created_at=in_shift - timedelta(days=10 + i))
+    make_lead(record_id="NEW", status="Charged")
+    reconcile(shifts=20, fix=True)
+    before = exported_ids()
+
+    cutoff, moved = run_archive(3)
+    assert moved["billing"] == 5
+    assert get_lead_collection("billing").col.count_documents({}) == 1
+    assert exported_ids() == before
+    assert reconcile(shifts=20) == []
+
+
+def test_chargeback_on_archived_lead(client, make_lead, in_shift):
+    lead = make_lead(record_id="OLD", status="Charged", created_at=in_shift - timedelta(days=10))
+    run_archive(3)
+    assert get_lead_collection("billing").col.count_documents({}) == 0
+
+    for record_id in ("OLD", str(lead["_id"])):
+        r = client.post("/api/manager/mark_twh_chargeback", data={"record_id": record_id, "dept": "billing", "cb_date": "2026-10-17T21:30"}).json()
+        assert r["status"] == "success", r
+    chargebacks = list(get_collection("twh_chargebacks").col.find())
+    assert [cb["original_record_id"] for cb in chargebacks] == ["OLD", "OLD"]
+    assert chargebacks[0]["amount"] == 100
@@ -0,0 +1,48 @@
+import pytest
+from api import auth
+
+
+def test_login_refused_without_secret(client, monkeypatch, token):
+    monkeypatch.setattr(auth, "AUTH_SECRET", None)
+    r = client.post("/api/manager/login", data={"user_id": "1", "password": "x"})
+    assert r.status_code == 503
+    assert "AUTH_SECRET" in r.json()["message"]
+    assert auth.verify_token(token) is None
+    with pytest.raises(RuntimeError):
+        auth.issue_token("1")
+
+
+def test_token_round_trip():
+    assert auth.verify_token(auth.issue_token("manager.7")) == "manager.7"
+
+
+def test_expired_token_is_rejected(monkeypatch):
+    token = auth.issue_token("1", ttl=60)
+    now = auth.time.time()
+    monkeypatch.setattr(auth.time, "time", lambda: now + 61)
+    assert auth.verify_token(token) is None
+
+
+def test_tampered_token_is_rejected():
+    user, expires, signature = auth.issue_token("1").split(".")
+    forged_user = auth._b64(b"admin")
+    assert auth.verify_token(f"{forged_user}.{expires}.{signature}") is None
+    assert auth.verify_token(f"{user}.{int(expires) + 3600}.{signature}") is None
+    assert auth.verify_token(f"{user}.{expires}.{signature[:-1]}x") is None
+    assert auth.verify_token("garbage") is None
+    assert auth.verify_token(None) is None
+
+
+def test_token_signed_with_another_secret_is_rejected(monkeypatch):
+    token = auth.issue_token("1")
+    monkeypatch.setattr(auth, "AUTH_SECRET", "rotated")
+    assert auth.verify_token(token) is None
+
+
+def test_password_formats():
+    stored = auth.hash_password("s3cret", iterations=1000)
+    assert auth.verify_password("s3cret", stored)
+    assert not auth.verify_password("wrong", stored)
+    assert auth.verify_password("legacy", auth.hashlib.sha256(b"legacy").hexdigest())
+    assert auth.verify_password("plain", "plain")
+    assert not auth.verify_password("x", "pbkdf2_sha256$broken")
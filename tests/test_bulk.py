@@ -0,0 +1,74 @@
+from datetime import timedelta
+from api.db import get_collection, get_lead_collection
+from api.pagination import DELETED_COLLECTION
+from api.shift_totals import TOTALS_COLLECTION, reconcile, shift_date_for
+
+
+def post(client, path, token, **body):
+    return client.post(path, json={"token": token, **body})
+
+def night_total(lead):
+    rollup = get_collection(TOTALS_COLLECTION).col.find_one({"_id": f"{shift_date_for(lead['created_at'])}:billing"})
+    return (rollup or {}).get("total", 0)
+
+
+def test_bulk_update_status(client, token, make_lead):
+    a, b = make_lead(record_id="A"), make_lead(record_id="B", charge_amount=50.0)
+    reconcile(fix=True)
+    r = post(client, "/api/manager/bulk_update_status", token, status="Charged", items=[
+        {"type": "billing", "row_index": str(a["_id"]), "llc": "TS"},
+        {"type": "billing", "row_index": str(b["_id"])},
+        {"type": "billing", "row_index": "000000000000000000000000"},
+        {"type": "nope", "row_index": str(a["_id"])},
+    ]).json()
+    assert r["counts"] == {"updated": 2, "not_found": 1, "error": 1}
+    col = get_lead_collection("billing").col
+    assert col.find_one({"_id": a["_id"]})["llc"] == "TS"
+    assert night_total(a) == 150
+    assert reconcile() == []
+
+
+def test_bulk_update_status_duplicate_items(client, token, make_lead):
+    lead = make_lead()
+    reconcile(fix=True)
+    item = {"type": "billing", "row_index": str(lead["_id"])}
+    r = post(client, "/api/manager/bulk_update_status", token, status="Charged", items=[item, dict(item)]).json()
+    assert r["counts"] == {"updated": 1, "duplicate": 1}
+    assert [x["status"] for x in r["results"]] == ["updated", "duplicate"]
+    assert night_total(lead) == 100
+    assert reconcile() == []
+
+
+def test_bulk_update_status_conflict(client, token, make_lead, monkeypatch, main):
+    lead = make_lead()
+    col = get_lead_collection("billing").col
+    real_find = main.get_lead_collection("billing").find
+
+    async def stale_find(*args, **kwargs):
+        # The lead is edited between the read and the conditional write
+        docs = await real_find(*args, **kwargs)
+        col.update_one({"_id": lead["_id"]}, {"$set": {"updated_at": main.utc_now() + timedelta(seconds=1), "client_name": "Edited"}})
+        return docs
+    monkeypatch.setattr(main.get_lead_collection("billing"), "find", stale_find)
+    r = post(client, "/api/manager/bulk_update_status", token, status="Charged", items=[{"type": "billing", "row_index": str(lead["_id"])}]).json()
+    assert r["counts"] == {"conflict": 1}
+    assert col.find_one({"_id": lead["_id"]})["status"] == "Pending"
+
+
+def test_bulk_delete_duplicate_items(client, token, make_lead):
+    lead = make_lead(status="Charged")
+    reconcile(fix=True)
+    item = {"type": "billing", "row_index": str(lead["_id"])}
+    r = post(client, "/api/manager/bulk_delete", token, items=[item, item]).json()
+    assert r["counts"] == {"deleted": 1, "duplicate": 1}
+    assert get_lead_collection("billing").col.count_documents({}) == 0
+    assert get_collection(DELETED_COLLECTION).col.count_documents({}) == 1
+    assert night_total(lead) == 0
+    assert reconcile() == []
+
+
+def test_bulk_requires_token(client, make_lead):
+    lead = make_lead()
+    r = post(client, "/api/manager/bulk_delete", "bad", items=[{"type": "billing", "row_index": str(lead["_id"])}])
+    assert r.status_code == 401
+    assert get_lead_collection("billing").col.count_documents({}) == 1
@@ -0,0 +1,46 @@
+import asyncio
+
+from api.cache import TTLCache
+
+
+def test_get_or_set_computes_once():
+    cache, calls = TTLCache(60), []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_set("k", compute) for _ in range(5)))
+    assert asyncio.run(run()) == ["value"] * 5
+    assert len(calls) == 1
+
+
+def test_invalidate_during_compute_is_not_overwritten():
+    for invalidate_all in (False, True):
+        cache = TTLCache(60)
+
+        async def run():
+            started = asyncio.Event()
+
+            async def stale():
+                started.set()
+                await asyncio.sleep(0.01)
+                return "before write"
+            task = asyncio.create_task(cache.get_or_set("k", stale))
+            await started.wait()
+            cache.invalidate(None if invalidate_all else "k")
+            assert await task == "before write"
+            assert cache.get("k") is None
+
+            async def fresh(): return "after write"
+            assert await cache.get_or_set("k", fresh) == "after write"
+            assert cache.get("k") == "after write"
+        asyncio.run(run())
+
+
+def test_entries_expire():
+    cache = TTLCache(0)
+    cache.set("k", 1)
+    assert cache.get("k") is None
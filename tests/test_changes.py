@@ -0,0 +1,152 @@
+import asyncio
+import json
+import queue
+
+from pymongo.errors import OperationFailure
+
+from api import changes
+
+
+def change(n, op="update", coll="billing_leads", doc=True):
+    c = {"_id": {"_data": f"t{n}"}, "operationType": op, "ns": {"coll": coll}, "documentKey": {"_id": f"id{n}"}}
+    if doc and op != "delete": c["fullDocument"] = {"_id": f"id{n}", "n": n}
+    return c
+
+
+class FakeStream:
+    """try_next polls `changes` briefly, like a getMore with max_await_time_ms."""
+    def __init__(self, resume_token):
+        self.changes, self.closed = queue.Queue(), False
+        self.resume_token = {"_data": resume_token or "t0"}
+    def try_next(self):
+        try:
+            item = self.changes.get(timeout=0.01)
+        except queue.Empty:
+            return None
+        if isinstance(item, Exception): raise item
+        return item
+    def close(self): self.closed = True
+
+
+class FakeOpener:
+    """Records the resume token of every open; `fail` makes the next open raise."""
+    def __init__(self, fail=None):
+        self.opened, self.streams, self.fail = [], [], fail
+    def __call__(self, resume_token):
+        self.opened.append(resume_token)
+        if self.fail: raise self.fail
+        self.streams.append(FakeStream(resume_token))
+        return self.streams[-1]
+
+
+class FakeRequest:
+    async def is_disconnected(self): return False
+
+
+def fmt(coll, doc): return {"n": doc["n"]}
+
+
+def parse(frame):
+    lines = dict(line.split(": ", 1) for line in frame.strip().split("\n"))
+    return lines["event"], lines.get("id"), json.loads(lines["data"])
+
+
+async def frames(events, n):
+    return [parse(await asyncio.wait_for(events.__anext__(), 2)) for _ in range(n)]
+
+
+async def settle(feed):
+    # Let the reader thread exit so it does not outlive the test's loop
+    while feed.thread: await asyncio.sleep(0.01)
+
+
+def test_to_delta_shapes():
+    assert changes.to_delta(change(1, "insert"), fmt) == {"op": "insert", "coll": "billing_leads", "id": "id1", "doc": {"n": 1}}
+    assert changes.to_delta(change(2, "replace"), fmt)["op"] == "update"
+    assert changes.to_delta(change(3, "delete"), fmt) == {"op": "delete", "coll": "billing_leads", "id": "id3"}
+    # updateLookup found nothing: the client still hears about the id
+    assert "doc" not in changes.to_delta(change(4, doc=False), fmt)
+
+
+def test_one_stream_fans_out_to_every_tab():
+    opener = FakeOpener()
+    feed = changes.ChangeFeed(open_stream=opener)
+
+    async def run():
+        a = changes.delta_events(FakeRequest(), None, fmt, feed=feed)
+        assert await frames(a, 1) == [("ready", "t0", {"token": "t0"})]
+        b = changes.delta_events(FakeRequest(), None, fmt, feed=feed)
+        assert await frames(b, 1) == [("ready", "t0", {"token": "t0"})]
+        opener.streams[0].changes.put(change(1))
+        expected = [("delta", "t1", {"op": "update", "coll": "billing_leads", "id": "id1", "doc": {"n": 1}})]
+        assert await frames(a, 1) == expected
+        assert await frames(b, 1) == expected
+        await a.aclose()
+        await b.aclose()
+        await settle(feed)
+
+    asyncio.run(run())
+    assert opener.opened == [None]
+    assert opener.streams[0].closed
+
+
+def test_resume_replays_buffered_changes_or_resets():
+    opener = FakeOpener()
+    feed = changes.ChangeFeed(open_stream=opener)
+
+    async def run():
+        a = changes.delta_events(FakeRequest(), None, fmt, feed=feed)
+        await frames(a, 1)
+        for n in (1, 2, 3): opener.streams[0].changes.put(change(n))
+        await frames(a, 3)
+        # A tab that saw t1 gets t2 and t3 from the buffer, not from a second stream
+        b = changes.delta_events(FakeRequest(), "t1", fmt, feed=feed)
+        assert [(e, i) for e, i, _ in await frames(b, 3)] == [("ready", "t3"), ("delta", "t2"), ("delta", "t3")]
+        c = changes.delta_events(FakeRequest(), "gone", fmt, feed=feed)
+        assert (await frames(c, 1))[0][0] == "reset"
+        for events in (a, b, c): await events.aclose()
+        await settle(feed)
+
+    asyncio.run(run())
+    assert opener.opened == [None]
+
+
+def test_first_tab_opens_the_stream_at_its_resume_token():
+    opener = FakeOpener()
+    feed = changes.ChangeFeed(open_stream=opener)
+
+    async def run():
+        a = changes.delta_events(FakeRequest(), "t7", fmt, feed=feed)
+        assert await frames(a, 1) == [("ready", "t7", {"token": "t7"})]
+        await a.aclose()
+        await settle(feed)
+
+    asyncio.run(run())
+    assert opener.opened == ["t7"]
+
+
+def test_open_failure_is_unavailable_or_reset():
+    async def first_frame(resume_token):
+        feed = changes.ChangeFeed(open_stream=FakeOpener(fail=OperationFailure("not a replica set")))
+        events = changes.delta_events(FakeRequest(), resume_token, fmt, feed=feed)
+        event = (await frames(events, 1))[0][0]
+        await events.aclose()
+        return event
+
+    assert asyncio.run(first_frame(None)) == "unavailable"
+    assert asyncio.run(first_frame("t1")) == "reset"
+
+
+def test_lost_history_resets_every_tab():
+    opener = FakeOpener()
+    feed = changes.ChangeFeed(open_stream=opener)
+
+    async def run():
+        a = changes.delta_events(FakeRequest(), None, fmt, feed=feed)
+        await frames(a, 1)
+        opener.streams[0].changes.put(OperationFailure("ChangeStreamHistoryLost"))
+        assert (await frames(a, 1))[0][0] == "reset"
+        await a.aclose()
+
+    asyncio.run(run())
+    assert feed.thread is None and opener.streams[0].closed
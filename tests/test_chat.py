@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+from pymongo.errors import CollectionInvalid
+
+from api import chat
+
+
+class FakeCollection:
+    def __init__(self, capped): self.capped, self.inserted = capped, []
+    def options(self): return {"capped": True} if self.capped else {}
+    def create_index(self, key): pass
+
+
+class FakeDb:
+    """Records the setup calls MongoChatStore makes; `existing` is chat_messages as found."""
+    def __init__(self, existing=None):
+        self.existing, self.commands, self.created = existing, [], []
+    def create_collection(self, name, **options):
+        if self.existing: raise CollectionInvalid(name)
+        self.created.append(options)
+        self.existing = FakeCollection(capped=True)
+    def command(self, *args, **kwargs): self.commands.append((args, kwargs))
+    def __getitem__(self, name): return self.existing
+
+
+@pytest.fixture
+def store(monkeypatch):
+    def make(db):
+        monkeypatch.setattr(chat, "get_db", lambda: db)
+        return chat.MongoChatStore()
+    return make
+
+
+def test_first_append_waits_for_the_capped_collection(store):
+    db = FakeDb()
+    s = store(db)
+    asyncio.run(s.append({"sender": "a", "message": "hi"}))
+    assert db.created == [{"capped": True, "size": chat.CHAT_CAPPED_BYTES, "max": chat.CHAT_CAPPED_MAX}]
+    s.ensure_collection()
+    assert len(db.created) == 1
+
+
+def test_uncapped_collection_is_converted(store):
+    db = FakeDb(existing=FakeCollection(capped=False))
+    store(db).ensure_collection()
+    assert db.commands == [(("convertToCapped", chat.MESSAGES_COLLECTION), {"size": chat.CHAT_CAPPED_BYTES})]
+
+
+def test_capped_collection_is_left_alone(store):
+    db = FakeDb(existing=FakeCollection(capped=True))
+    store(db).ensure_collection()
+    assert db.commands == []
+
+
+def test_failed_setup_does_not_block_chat_and_is_retried_after_a_while(store, monkeypatch):
+    class DownDb(FakeDb):
+        def create_collection(self, name, **options):
+            self.attempts = getattr(self, "attempts", 0) + 1
+            raise RuntimeError("not authorized")
+    now = [1000.0]
+    monkeypatch.setattr(chat.time, "time", lambda: now[0])
+    db = DownDb()
+    s = store(db)
+    msg = asyncio.run(s.append({"sender": "a", "message": "hi"}))
+    assert msg["seq"] == 1 and not s.ready
+    # Not again on every message while setup keeps failing
+    asyncio.run(s.append({"sender": "a", "message": "again"}))
+    assert db.attempts == 1
+    db.__class__ = FakeDb
+    now[0] += chat.CHAT_SETUP_RETRY_SECONDS
+    asyncio.run(s.append({"sender": "a", "message": "later"}))
+    assert s.ready
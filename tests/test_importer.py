@@ -0,0 +1,63 @@
+import io
+from datetime import timedelta
+
+from api.archive import mark_archived
+from api.db import get_archive_collection, get_lead_collection
+from api.importer import import_leads
+
+HEADER = "record_id,agent,client_name,charge_amount,timestamp_str\n"
+
+
+def run(rows, **kwargs):
+    return import_leads("billing", io.StringIO(HEADER + "".join(r + "\n" for r in rows)), **kwargs)
+
+
+def record_ids():
+    return sorted(d["record_id"] for d in get_lead_collection("billing").col.find())
+
+
+def test_imports_rows(db):
+    report = run(["A1,Haziq,Client,1250.50,2024-01-02 10:00:00", "A2,Haziq,Client,10,2024-01-02"])
+    assert (report["rows"], report["inserted"], report["error_count"]) == (2, 2, 0)
+    lead = get_lead_collection("billing").col.find_one({"record_id": "A1"})
+    assert (lead["charge_amount"], lead["charge_str"], lead["timestamp_str"]) == (1250.5, "$1250.50", "2024-01-02 10:00:00")
+
+
+def test_duplicates_are_skipped(make_lead):
+    make_lead(record_id="A1")
+    report = run(["A1,Haziq,Client,10,2024-01-02", "A2,Haziq,Client,10,2024-01-02", "A2,Haziq,Client,10,2024-01-02"])
+    assert report["inserted"] == 1 and report["duplicate_count"] == 2
+    assert [(d["record_id"], d["existing"]) for d in report["duplicates"]] == [("A1", True), ("A2", False)]
+    assert record_ids() == ["A1", "A2"]
+
+
+def test_duplicates_inserted_on_request(make_lead):
+    make_lead(record_id="A1")
+    report = run(["A1,Haziq,Client,10,2024-01-02"], on_duplicate="insert")
+    assert report["inserted"] == 1 and report["duplicate_count"] == 1
+    assert record_ids() == ["A1", "A1"]
+
+
+def test_archived_record_id_is_a_duplicate(make_lead, in_shift):
+    lead = make_lead(record_id="OLD", created_at=in_shift - timedelta(days=30))
+    get_archive_collection("billing").col.insert_one(lead)
+    get_lead_collection("billing").col.delete_one({"_id": lead["_id"]})
+    mark_archived("billing", in_shift - timedelta(days=10))
+
+    report = run(["OLD,Haziq,Client,10,2024-01-02"])
+    assert report["inserted"] == 0 and report["duplicates"] == [{"line": 2, "record_id": "OLD", "existing": True}]
+
+
+def test_dry_run_writes_nothing(db):
+    report = run(["A1,Haziq,Client,10,2024-01-02"], dry_run=True)
+    assert report["dry_run"] and report["error_count"] == 0
+    assert record_ids() == []
+
+
+def test_bad_rows_are_reported(db):
+    report = run(["A1,Haziq,Client,ten,2024-01-02", "A2,Haziq,Client,10,02/01/2024", "A3,Haziq,Client,10,2024-01-02"])
+    assert report["inserted"] == 1
+    assert report["errors"] == [
+        {"line": 2, "message": "Invalid charge: ten"},
+        {"line": 3, "message": "Invalid timestamp: 02/01/2024"},
+    ]
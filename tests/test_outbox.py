@@ -0,0 +1,85 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+from api import outbox
+from api.db import get_collection
+from api.pagination import utc_now
+
+
+@pytest.fixture
+def handlers(monkeypatch):
+    """Isolated handler registries; yields the list of delivered payloads."""
+    monkeypatch.setattr(outbox, "HANDLERS", {})
+    monkeypatch.setattr(outbox, "BATCH_HANDLERS", {})
+    delivered = []
+
+    @outbox.handler("ok")
+    def ok(payload): delivered.append(payload)
+
+    @outbox.handler("fail")
+    def fail(payload): raise RuntimeError("down")
+
+    @outbox.batch_handler("batch", max_size=3, max_wait_seconds=0)
+    def batch(payloads): delivered.append(payloads)
+    return delivered
+
+
+def messages():
+    return list(get_collection(outbox.OUTBOX_COLLECTION).col.find().sort("created_at", 1))
+
+def make_due():
+    get_collection(outbox.OUTBOX_COLLECTION).col.update_many({"status": "pending"}, {"$set": {"next_attempt_at": utc_now()}})
+
+
+def test_delivers_and_marks_done(handlers):
+    asyncio.run(outbox.enqueue("ok", {"n": 1}))
+    assert asyncio.run(outbox.drain()) == 1
+    assert handlers == [{"n": 1}]
+    assert [m["status"] for m in messages()] == ["done"]
+    assert asyncio.run(outbox.drain()) == 0
+
+
+def test_failure_backs_off_then_dead_letters(handlers):
+    asyncio.run(outbox.enqueue("fail", {}))
+    before = utc_now()
+    asyncio.run(outbox.drain())
+    msg = messages()[0]
+    assert (msg["status"], msg["attempts"], msg["last_error"]) == ("pending", 1, "down")
+    # Not due again until the backoff passes
+    assert msg["next_attempt_at"].replace(tzinfo=before.tzinfo) >= before + timedelta(seconds=outbox.backoff_for(1) - 1)
+    assert asyncio.run(outbox.drain()) == 0
+
+    for _ in range(outbox.MAX_ATTEMPTS - 1):
+        make_due()
+        asyncio.run(outbox.drain())
+    msg = messages()[0]
+    assert (msg["status"], msg["attempts"]) == ("dead", outbox.MAX_ATTEMPTS)
+
+    assert asyncio.run(outbox.requeue_dead()) == 1
+    assert (messages()[0]["status"], messages()[0]["attempts"]) == ("pending", 0)
+
+
+def test_backoff_is_capped():
+    assert [outbox.backoff_for(a) for a in (1, 2, 3)] == [2, 4, 8]
+    assert outbox.backoff_for(20) == outbox.BACKOFF_MAX_SECONDS
+
+
+def test_batch_groups_are_delivered_together(handlers):
+    for i in range(4):
+        asyncio.run(outbox.enqueue("batch", f"a{i}", group="a"))
+    asyncio.run(outbox.enqueue("batch", "b0", group="b"))
+    make_due()
+    assert asyncio.run(outbox.drain()) == 5
+    assert sorted(handlers) == [["a0", "a1", "a2"], ["a3"], ["b0"]]
+    assert {m["status"] for m in messages()} == {"done"}
+
+
+def test_expired_lock_is_reclaimed(handlers):
+    asyncio.run(outbox.enqueue("ok", {"n": 1}))
+    col = get_collection(outbox.OUTBOX_COLLECTION).col
+    # A worker claimed it and died
+    col.update_many({}, {"$set": {"status": "processing", "locked_until": utc_now() - timedelta(seconds=1)}})
+    assert asyncio.run(outbox.drain()) == 1
+    assert messages()[0]["status"] == "done"
@@ -0,0 +1,11 @@
+def test_outbox_metrics_requires_token(client, token):
+    assert client.get("/api/outbox/metrics").status_code == 422
+    assert client.get("/api/outbox/metrics", params={"token": "bad"}).status_code == 401
+    r = client.get("/api/outbox/metrics", params={"token": token}).json()
+    assert r["status"] == "success"
+
+
+def test_requeue_dead_requires_token(client, token):
+    assert client.post("/api/outbox/requeue-dead", data={"token": "bad"}).status_code == 401
+    r = client.post("/api/outbox/requeue-dead", data={"token": token}).json()
+    assert r == {"status": "success", "requeued": 0}
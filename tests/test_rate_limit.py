@@ -0,0 +1,40 @@
+import asyncio
+
+from pymongo.errors import DuplicateKeyError
+
+from api import chat
+from api.chat import MemoryRateLimiter, MongoRateLimiter, allow_message
+
+
+def test_sliding_window(monkeypatch):
+    limiter, now = MemoryRateLimiter(), [1000.0]
+    monkeypatch.setattr(chat.time, "time", lambda: now[0])
+    hits = [asyncio.run(limiter.hit("k", 2, 60)) for _ in range(3)]
+    assert hits == [True, True, False]
+    now[0] += 61
+    assert asyncio.run(limiter.hit("k", 2, 60))
+    assert asyncio.run(limiter.hit("other", 2, 60))
+
+
+def test_allow_message_checks_sender_then_global(monkeypatch):
+    monkeypatch.setattr(chat, "CHAT_SENDER_LIMIT", (1, 60))
+    monkeypatch.setattr(chat, "CHAT_GLOBAL_LIMIT", (2, 60))
+    limiter = MemoryRateLimiter()
+    assert asyncio.run(allow_message(limiter, "a")) is None
+    assert asyncio.run(allow_message(limiter, "a")) == "You are sending messages too fast."
+    assert asyncio.run(allow_message(limiter, "b")) is None
+    assert asyncio.run(allow_message(limiter, "c")) == "Global chat limit reached."
+
+
+def test_mongo_hit_retries_a_lost_upsert_race():
+    class RacingCollection:
+        """The first upsert loses to a concurrent one on the same _id."""
+        def __init__(self): self.calls = 0
+        async def find_one_and_update(self, *args, **kwargs):
+            self.calls += 1
+            if self.calls == 1: raise DuplicateKeyError("E11000 duplicate key error")
+            return {"_id": "k", "allowed": True}
+    limiter = MongoRateLimiter()
+    limiter.col = RacingCollection()
+    assert asyncio.run(limiter.hit("k", 2, 60))
+    assert limiter.col.calls == 2
@@ -0,0 +1,120 @@
+from datetime import timedelta
+
+from api import shift_totals
+from api.db import get_collection
+from api.shift_totals import TOTALS_COLLECTION, _inc_ops, rollup_ops, backfill, finalize_closed_shifts, reconcile, shift_date_for
+
+
+def rollups():
+    return {d["_id"]: d for d in get_collection(TOTALS_COLLECTION).col.find()}
+
+
+def test_history_totals_does_not_write(client, make_lead, in_shift):
+    make_lead(status="Charged", created_at=in_shift - timedelta(days=2))
+    r = client.get("/api/manager/history-totals").json()
+    assert r == {"status": "success", "data": []}
+    assert rollups() == {}
+
+
+def test_backfill_writes_missing_closed_shifts_once(make_lead, in_shift):
+    old = make_lead(status="Charged", created_at=in_shift - timedelta(days=3))
+    make_lead(record_id="R2", status="Charged", created_at=in_shift)
+    assert backfill() == 1
+    key = f"{shift_date_for(old['created_at'])}:billing"
+    assert list(rollups()) == [key]
+    assert rollups()[key]["total"] == 100 and rollups()[key]["finalized_at"]
+    assert backfill() == 0
+
+
+def test_finalize_stamps_closed_shifts_once(make_lead, in_shift):
+    make_lead(status="Charged", created_at=in_shift - timedelta(days=1))
+    reconcile(shifts=2, fix=True)
+    get_collection(TOTALS_COLLECTION).col.update_many({}, {"$unset": {"finalized_at": ""}, "$set": {"total": 5}})
+    assert finalize_closed_shifts() == 1
+    assert finalize_closed_shifts() == 0
+    assert [d["total"] for d in rollups().values()] == [100]
+
+
+def test_finalize_keeps_a_write_that_lands_mid_recompute(make_lead, in_shift, monkeypatch):
+    closed = in_shift - timedelta(days=1)
+    make_lead(status="Charged", created_at=closed)
+    reconcile(shifts=2, fix=True)
+    get_collection(TOTALS_COLLECTION).col.update_many({}, {"$unset": {"finalized_at": ""}})
+    compute = shift_totals.compute_from_leads
+    calls = []
+
+    def racing_compute(dept, shift_start):
+        expected = compute(dept, shift_start)
+        if not calls:
+            # A lead write commits and moves the rollup after the leads were read
+            late = make_lead(record_id="R2", status="Charged", created_at=closed)
+            get_collection(TOTALS_COLLECTION).col.bulk_write(rollup_ops("billing", [(None, late)]))
+        calls.append(dept)
+        return expected
+
+    monkeypatch.setattr(shift_totals, "compute_from_leads", racing_compute)
+    assert finalize_closed_shifts() == 1
+    assert len(calls) == 2
+    assert [d["total"] for d in rollups().values()] == [200]
+
+
+# --- $inc deltas ---
+
+
+def test_inc_ops_insert_and_delete_are_opposite(in_shift):
+    lead = {"created_at": in_shift, "agent": "Haziq", "status": "Charged", "charge_amount": 40.0}
+    shift = shift_date_for(in_shift)
+    inserted = _inc_ops("billing", None, lead)
+    assert inserted == {shift: {"statuses.Charged.count": 1, "statuses.Charged.amount": 40.0,
+                                "total": 40.0, "count": 1, "agents.Haziq": 40.0}}
+    assert _inc_ops("billing", lead, None) == {shift: {k: -v for k, v in inserted[shift].items()}}
+
+
+def test_inc_ops_status_change_moves_counted_total(in_shift):
+    pending = {"created_at": in_shift, "agent": "Haziq", "status": "Pending", "charge_amount": 40.0}
+    charged = {**pending, "status": "Charged"}
+    assert _inc_ops("billing", pending, charged) == {shift_date_for(in_shift): {
+        "statuses.Pending.count": -1, "statuses.Pending.amount": -40.0,
+        "statuses.Charged.count": 1, "statuses.Charged.amount": 40.0,
+        "total": 40.0, "count": 1, "agents.Haziq": 40.0
+    }}
+    # Design counts every status
+    assert _inc_ops("design", pending, {**pending, "charge_amount": 55.0})[shift_date_for(in_shift)] == {
+        "statuses.Pending.amount": 15.0, "total": 15.0, "agents.Haziq": 15.0
+    }
+
+
+def test_inc_ops_unchanged_or_outside_shift(in_shift):
+    lead = {"created_at": in_shift, "agent": "A.B", "status": "Charged", "charge_amount": 10.0}
+    assert _inc_ops("billing", lead, dict(lead)) == {shift_date_for(in_shift): {}}
+    assert "agents.A_B" in _inc_ops("billing", None, lead)[shift_date_for(in_shift)]
+    daytime = {**lead, "created_at": in_shift + timedelta(hours=12)}
+    assert _inc_ops("billing", None, daytime) == {}
+    # Moving a lead between shifts takes it out of one and into the other
+    moved = _inc_ops("billing", lead, {**lead, "created_at": in_shift - timedelta(days=1)})
+    assert moved[shift_date_for(in_shift)]["total"] == -10.0
+    assert moved[shift_date_for(in_shift - timedelta(days=1))]["total"] == 10.0
+
+
+# --- reconcile after route writes ---
+
+def test_no_drift_after_insert_edit_delete(client, main, monkeypatch, in_shift):
+    monkeypatch.setattr(main, "get_timestamp", lambda: (in_shift.strftime("%Y-%m-%d"), in_shift.strftime("%Y-%m-%d %H:%M:%S"), in_shift))
+    for i, amount in enumerate(["$100", "250.50", "$30"]):
+        r = client.post("/api/save-lead", data={"type": "billing", "agent": "Haziq", "client_name": f"C{i}", "charge_amt": amount, "order_id": f"R{i}"})
+        assert r.json()["status"] == "success"
+    client.post("/api/save-lead", data={"type": "design", "agent": "Taha", "client_name": "D", "charge_amt": "70", "record_id": "D1"})
+    assert reconcile() == []
+
+    assert client.post("/api/manager/update_status", data={"type": "billing", "id": "R0", "status": "Charged"}).json()["status"] == "success"
+    assert client.post("/api/manager/update_status", data={"type": "billing", "id": "R1", "status": "Charged"}).json()["status"] == "success"
+    assert client.post("/api/update_field", data={"type": "billing", "id": "R1", "field": "Charge", "value": "$200"}).json()["status"] == "success"
+    assert client.post("/api/update_field", data={"type": "design", "id": "D1", "field": "Charge", "value": "90"}).json()["status"] == "success"
+    assert reconcile() == []
+    totals = rollups()
+    assert totals[f"{shift_date_for(in_shift)}:billing"]["total"] == 300
+    assert totals[f"{shift_date_for(in_shift)}:design"]["total"] == 90
+
+    assert client.post("/api/delete-lead", data={"type": "billing", "id": "R0"}).json()["status"] == "success"
+    assert reconcile() == []
+    assert rollups()[f"{shift_date_for(in_shift)}:billing"]["total"] == 200
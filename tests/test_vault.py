@@ -0,0 +1,26 @@
+from api.db import get_collection, get_lead_collection
+from api.vault import VAULT_COLLECTION
+
+
+def update(client, dept, field, value, lead):
+    return client.post("/api/update_field", data={"type": dept, "id": lead["record_id"], "field": field, "value": value, "row_index": str(lead["_id"])}).json()
+
+
+def test_card_field_edit_goes_to_the_vault(client, make_lead):
+    # Stored before the split: card fields still inline
+    lead = make_lead("billing", card_number="4111", cvc="123")
+    assert update(client, "billing", "cvc", "999", lead)["status"] == "success"
+
+    stored = get_lead_collection("billing").col.find_one({"_id": lead["_id"]})
+    assert "card_number" not in stored and "cvc" not in stored
+    secrets = get_collection(VAULT_COLLECTION).col.find_one({"_id": lead["_id"]})
+    assert (secrets["card_number"], secrets["cvc"]) == ("4111", "999")
+
+
+def test_same_field_stays_inline_outside_card_departments(client, make_lead):
+    lead = make_lead("design", account_number="ACC1", pin_code="1")
+    assert update(client, "design", "account_number", "ACC2", lead)["status"] == "success"
+
+    stored = get_lead_collection("design").col.find_one({"_id": lead["_id"]})
+    assert (stored["account_number"], stored["pin_code"]) == ("ACC2", "1")
+    assert get_collection(VAULT_COLLECTION).col.count_documents({}) == 0